@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+Synthesizes docker.out/kubelet.out journals for benchmarking the parser.
+
+Matching lines are built from the example log lines in the comments above
+each LogLine in MasterFile.patterns, so new patterns automatically show up in
+the generated data once their example is documented. The rest of the lines
+are filler in the same journal format that matches no pattern.
+
+    $ python3 bench/journal_generator.py /tmp/case --nodes 30 --size-mb 200 --density 0.01
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+import uuid
+
+PARSER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "parser")
+sys.path.insert(0, PARSER_DIR)
+import masterfile
+
+EXAMPLE_RE = re.compile(r"^\s*#\s*(?P<line>\w{3} \d{2} \d{2}:\d{2}:\d{2} \S+ \S+ .*)$")
+LOGLINE_RE = re.compile(r"^\s*LogLine\(.*\b(?P<logfile>PX_LOG|KUBECTL_LOG)\b")
+SYSLOG_PREFIX_RE = re.compile(r"^\w{3} \d{2} \d{2}:\d{2}:\d{2} \S+ ")
+UUID_RE = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}")
+EMBEDDED_TIME_RE = re.compile(r'time="[^"]*"')
+KLOG_HEADER_RE = re.compile(r"^(?P<header>\S+ [IWEF]\d{4} \S+\s+\d+ \S+\] )(?P<message>.*)$")
+JOURNAL_END_DAYS = 300
+
+# Lines that no pattern matches
+FILLER = {
+    masterfile.MasterFile.PX_LOG: [
+        'portworx[{pid}]: time="{iso}" level=info msg="Volume {vol} is healthy" file="health.go:{n}" component=porx/px/health',
+        'portworx[{pid}]: time="{iso}" level=debug msg="Heartbeat from node {uuid}" file="gossip.go:{n}" component=porx/gossip',
+        'portworx[{pid}]: time="{iso}" level=info msg="Attempting to reconcile volume {vol}" file="reconcile.go:{n}" component=porx/px/volume',
+        'portworx[{pid}]: {date} INFO spawned: \'pxcontroller\' with pid {n}',
+    ],
+    masterfile.MasterFile.KUBECTL_LOG: [
+        'k3s[{pid}]: I{md} {hms}.{us}    {pid} reconciler.go:{n}] "Volume detached for volume \\"pvc-{uuid}\\" DevicePath \\"\\""',
+        'k3s[{pid}]: I{md} {hms}.{us}    {pid} kubelet.go:{n}] "SyncLoop (PLEG): event for pod" pod="default/app-{n}" event={{ID:{uuid}}}',
+        'k3s[{pid}]: E{md} {hms}.{us}    {pid} pod_workers.go:{n}] "Error syncing pod, skipping" err="context deadline exceeded" podUID={uuid}',
+    ],
+}
+
+
+def load_examples(source: str = None) -> dict:
+    """Example lines documented above the LogLines, keyed by their logfile."""
+    if source is None:
+        source = os.path.join(PARSER_DIR, "masterfile.py")
+    logfiles = {"PX_LOG": masterfile.MasterFile.PX_LOG, "KUBECTL_LOG": masterfile.MasterFile.KUBECTL_LOG}
+    examples = {logfile: [] for logfile in logfiles.values()}
+    pending = []
+    with open(source, "r") as f:
+        for line in f:
+            m = EXAMPLE_RE.match(line)
+            if m is not None:
+                pending.append(m.group("line"))
+                continue
+            m = LOGLINE_RE.match(line)
+            if m is not None:
+                examples[logfiles[m.group("logfile")]].extend(pending)
+                pending = []
+    return examples
+
+
+def escape_klog(body: str) -> str:
+    # The kubelet patterns expect a backslash before every quote of the klog
+    # message: \\" around the object names and \" around the message
+    m = KLOG_HEADER_RE.match(body)
+    if m is None:
+        return body
+    return m.group("header") + m.group("message").replace('"', '\\"')
+
+
+def to_template(example: str, logfile: str) -> str:
+    # Keeps the message, everything that identifies a node or a time is re-filled
+    body = SYSLOG_PREFIX_RE.sub("", example)
+    if logfile == masterfile.MasterFile.KUBECTL_LOG:
+        body = escape_klog(body)
+    body = body.replace("{", "{{").replace("}", "}}")
+    body = EMBEDDED_TIME_RE.sub('time="{iso}"', body)
+    return UUID_RE.sub("{uuid}", body)
+
+
+class NodeJournal:
+    def __init__(self, hostname: str, logfile: str, examples: list, density: float,
+                 start: float, rng: random.Random):
+        self.hostname = hostname
+        self.matching = [to_template(e, logfile) for e in examples]
+        self.filler = FILLER[logfile]
+        self.density = density if self.matching else 0.0
+        self.now = start
+        self.rng = rng
+        self.uuids = [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(64)]
+        self.pid = rng.randint(1000, 30000)
+
+    def header(self, end: float) -> str:
+        fmt = "%a %Y-%m-%d %H:%M:%S UTC"
+        return "-- Logs begin at " + time.strftime(fmt, time.gmtime(self.now)) + \
+               ", end at " + time.strftime(fmt, time.gmtime(end)) + ". --\n"
+
+    def line(self) -> str:
+        self.now += self.rng.expovariate(50.0)
+        t = time.gmtime(self.now)
+        template = self.rng.choice(self.matching if self.rng.random() < self.density else self.filler)
+        body = template.format(
+            pid=self.pid, n=self.rng.randint(1, 9999), uuid=self.rng.choice(self.uuids),
+            vol=self.rng.getrandbits(60), iso=time.strftime("%Y-%m-%dT%H:%M:%SZ", t),
+            date=time.strftime("%Y-%m-%d %H:%M:%S", t) + ",%03d" % self.rng.randint(0, 999),
+            md=time.strftime("%m%d", t), hms=time.strftime("%H:%M:%S", t),
+            us="%06d" % self.rng.randint(0, 999999))
+        return time.strftime("%b %d %H:%M:%S ", t) + self.hostname + " " + body + "\n"
+
+
+def generate(out_dir: str, nodes: int = 3, size_mb: float = 10, density: float = 0.01,
+             seed: int = 0, start: float = 1662336000.0) -> dict:
+    """
+    Writes <out_dir>/node-<i>/{docker.out,kubelet.out} of about size_mb each.
+    Returns {path: (lines, bytes)}.
+    """
+    rng = random.Random(seed)
+    examples = load_examples()
+    target = int(size_mb * 1024 * 1024)
+    written = {}
+    for i in range(nodes):
+        hostname = "ip-10-13-%d-%d.pwx.dev.purestorage.com" % (i // 250, i % 250 + 1)
+        node_dir = os.path.join(out_dir, "node-%d" % i)
+        os.makedirs(node_dir, exist_ok=True)
+        for logfile, node_examples in examples.items():
+            journal = NodeJournal(hostname, logfile, node_examples, density, start, rng)
+            path = os.path.join(node_dir, logfile)
+            lines = 0
+            size = 0
+            with open(path, "w") as f:
+                # The journal spans a few days at most. An end well after that,
+                # but within a year, keeps the parser's year inference right.
+                header = journal.header(start + JOURNAL_END_DAYS * 86400)
+                f.write(header)
+                size += len(header)
+                batch = []
+                while size < target:
+                    line = journal.line()
+                    batch.append(line)
+                    size += len(line)
+                    lines += 1
+                    if len(batch) == 10000:
+                        f.write("".join(batch))
+                        batch = []
+                f.write("".join(batch))
+            written[path] = (lines, os.path.getsize(path))
+    return written
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Generate synthetic docker.out/kubelet.out journals")
+    arg_parser.add_argument("out_dir", help="Directory to write node-<i>/ sub directories to")
+    arg_parser.add_argument("--nodes", type=int, default=3)
+    arg_parser.add_argument("--size-mb", type=float, default=10, help="Approximate size of every log file")
+    arg_parser.add_argument("--density", type=float, default=0.01, help="Fraction of lines matching a pattern")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    args = arg_parser.parse_args()
+    written = generate(args.out_dir, args.nodes, args.size_mb, args.density, args.seed)
+    for path, (lines, size) in written.items():
+        print(path, lines, "lines", size, "bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+End-to-end throughput benchmark for parser/parser.py.
+
+Generates a synthetic case with journal_generator, runs the parser on it in
+a child process once per --jobs value and reports lines/sec, MB/sec, peak RSS
+and the row count of every table. Results are appended as JSON lines to
+--output, tagged with the git revision, so runs of different versions can be
+compared.
+
+    $ python3 bench/parser_bench.py --nodes 10 --size-mb 100 --jobs 1,4 --output bench/results.jsonl
+"""
+
+import argparse
+import csv
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import journal_generator
+# parser/ is on sys.path once journal_generator is imported
+import store
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PARSER = os.path.join(journal_generator.PARSER_DIR, "parser.py")
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "describe", "--always", "--dirty"], cwd=BENCH_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def table_rows(db_dir: str, storage: str = store.CSV) -> dict:
+    rows = {}
+    if storage != store.CSV:
+        # The sqlite backend writes no index.csv nor table_*.csv
+        db = store.Database(db_dir)
+        try:
+            for filename, table in db.index()[["filename", "table_name"]].itertuples(index=False):
+                rows[filename] = db.row_count(table)
+        finally:
+            db.close()
+        return rows
+    index = os.path.join(db_dir, "index.csv")
+    if not os.path.exists(index):
+        return rows
+    with open(index, "r") as f:
+        for entry in csv.DictReader(f):
+            with open(os.path.join(db_dir, entry["filename"]), "r") as table:
+                rows[entry["filename"]] = sum(1 for _ in csv.reader(table)) - 1
+    return rows
+
+
+def run_parser(case_dir: str, parser_args: list) -> dict:
+    # A child process per run: its peak RSS (and the one of its --jobs
+    # workers) is reported by wait4() without the generator's memory
+    cmd = [sys.executable, PARSER, "--full"] + parser_args + [case_dir]
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL)
+    _, status, rusage = os.wait4(proc.pid, 0)
+    elapsed = time.perf_counter() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    if proc.returncode != 0:
+        raise RuntimeError(" ".join(cmd) + " exited with " + str(proc.returncode))
+    # ru_maxrss is in KB on Linux
+    return {"seconds": elapsed, "peak_rss_mb": rusage.ru_maxrss / 1024.0}
+
+
+def run(args) -> list:
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="hawkeye-bench-")
+    case_dir = os.path.join(work_dir, "case")
+    try:
+        written = journal_generator.generate(case_dir, args.nodes, args.size_mb, args.density, args.seed)
+        lines = sum(l for l, _ in written.values())
+        size = sum(b for _, b in written.values())
+        results = []
+        for jobs in args.jobs:
+            for repeat in range(args.repeat):
+                parser_args = ["--jobs", str(jobs), "--storage", args.storage]
+                measured = run_parser(case_dir, parser_args)
+                result = {
+                    "revision": git_revision(),
+                    "time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                    "python": sys.version.split()[0],
+                    "nodes": args.nodes,
+                    "size_mb_per_file": args.size_mb,
+                    "density": args.density,
+                    "seed": args.seed,
+                    "jobs": jobs,
+                    "storage": args.storage,
+                    "repeat": repeat,
+                    "files": len(written),
+                    "lines": lines,
+                    "bytes": size,
+                    "seconds": round(measured["seconds"], 3),
+                    "lines_per_sec": round(lines / measured["seconds"]),
+                    "mb_per_sec": round(size / 1024.0 / 1024.0 / measured["seconds"], 2),
+                    "peak_rss_mb": round(measured["peak_rss_mb"], 1),
+                    "tables": table_rows(os.path.join(case_dir, "database"), args.storage),
+                }
+                results.append(result)
+                print("jobs=%d: %d lines in %.2fs, %d lines/s, %.1f MB/s, peak RSS %.0f MB" % (
+                    jobs, lines, result["seconds"], result["lines_per_sec"], result["mb_per_sec"],
+                    result["peak_rss_mb"]))
+        return results
+    finally:
+        if not args.keep and not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Benchmark parser/parser.py on synthetic journals")
+    arg_parser.add_argument("--nodes", type=int, default=3)
+    arg_parser.add_argument("--size-mb", type=float, default=20, help="Approximate size of every log file")
+    arg_parser.add_argument("--density", type=float, default=0.01, help="Fraction of lines matching a pattern")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--jobs", type=lambda v: [int(j) for j in v.split(",")], default=[1],
+                            help="Comma separated --jobs values to run, e.g. 1,4")
+    arg_parser.add_argument("--storage", default=store.CSV, choices=store.STORAGE_CHOICES)
+    arg_parser.add_argument("--repeat", type=int, default=1)
+    arg_parser.add_argument("--work-dir", help="Keep the generated case in this directory")
+    arg_parser.add_argument("--keep", action="store_true", help="Do not delete the generated case")
+    arg_parser.add_argument("--output", help="Append the results as JSON lines to this file")
+    args = arg_parser.parse_args()
+
+    results = run(args)
+    if args.output:
+        with open(args.output, "a") as f:
+            for result in results:
+                f.write(json.dumps(result, sort_keys=True) + "\n")
+    else:
+        print(json.dumps(results, indent=2, sort_keys=True))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,23 @@
 import sys
 import os
+import re
 import shutil
+import html
+import time
+import concurrent.futures
+import urllib.parse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "parser"))
+import bundle
+import fingerprints
+import heatmap
+
+# Command outputs longer than this are cut in the page and linked in full
+MAX_OUTPUT_CHARS = 64 * 1024
+READ_THREADS = 8
+# Full copies of truncated outputs read from archives, under the output dir
+FULL_OUTPUTS_DIR = "outputs"
+
 
 class Report:
 
@@ -9,14 +26,80 @@ class Report:
       <div data-role="collapsible">
       """
 
+    cluster_files = {
+        "pxctl status" : "px-status.out",
+        "Bootstrap entries" : "px-boostrap-list.out",
+        "pxctl status" : 'pxctl_status.out',
+        "pxctl cd list-drives" : 'pxctl_cd_list_drive.out',
+        "pxctl sv kvdb members" : 'pxctl_sv_kvdb_members.out',
+        "pxctl volume list" : 'pxctl_v_l.out',
+        "pxctl alerts show" : 'pxctl_alerts_show.out',
+        #"PX volumes" : 'px-volumes.out'
+        }
+
+    node_files = {
+        "Node name" : "uname.out",
+        "PX version": "px-version.out",
+        "lsblk" : "lsblk.out",
+        "blkid" : "blkid.out",
+        "System restarts" : "last.out",
+        "pxctl sv pool show" : 'pxctl_sv_pool_show.out',
+        }
+
     def __init__(self, read_dir):
         self.read_dir = read_dir
+        self.bundle = bundle.open_bundle(read_dir)
+        self.out_dir = bundle.output_dir(read_dir)
+        # [(member name, content, link to the full output or None)], see scan()
+        self.outputs = None
+
 
+    def scan(self):
+        # One pass over the bundle reads every command output of the page.
+        # Files of a directory are read by a thread pool, archive members in
+        # archive order.
+        if self.outputs is not None:
+            return self.outputs
+        suffixes = tuple(set(self.cluster_files.values()) | set(self.node_files.values()))
+        if isinstance(self.bundle, bundle.DirBundle):
+            with concurrent.futures.ThreadPoolExecutor(READ_THREADS) as pool:
+                self.outputs = list(pool.map(self.read_path, self.bundle.iter_paths(suffixes)))
+        else:
+            self.outputs = [self.read_output(name, stream) for name, stream in self.bundle.iter_members(suffixes)]
+        return self.outputs
 
-    def get_command_html(self, title, content):
+    def read_path(self, path):
+        with self.bundle.open_member(path) as (name, stream):
+            return self.read_output(name, stream)
+
+    def read_output(self, name, stream):
+        content = stream.read(MAX_OUTPUT_CHARS + 1)
+        if len(content) <= MAX_OUTPUT_CHARS:
+            return name, content, None
+        return name, content[:MAX_OUTPUT_CHARS], self.full_output(name, content, stream)
+
+    def full_output(self, name, head, stream):
+        # Link to the whole output: the file itself when it is on disk,
+        # otherwise a copy of the member written next to index.html
+        if os.path.isfile(name):
+            path = name
+        else:
+            path = os.path.join(self.out_dir, FULL_OUTPUTS_DIR, re.sub(r"[^\w.-]+", "_", name.strip("/")))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as f:
+                f.write(head)
+                shutil.copyfileobj(stream, f)
+        return os.path.relpath(path, self.out_dir)
+
+    def get_command_html(self, title, content, full_link=None):
+        more = ""
+        if full_link is not None:
+            size = os.path.getsize(os.path.join(self.out_dir, full_link))
+            more = '<a href="%s" target="_blank" rel="external">Truncated, show full output (%.1f MB)</a>' % (
+                urllib.parse.quote(full_link), size / 1024.0 / 1024.0)
         return """<div data-role="collapsible">
         <h1>""" + title + """</h1>
-        <pre>""" + content + """</pre>
+        <pre>""" + content + """</pre>""" + more + """
       </div>"""
 
     def get_single_node(self, nodename, nested_collapse):
@@ -28,6 +111,9 @@ class Report:
         return top + nested_collapse + bottom
 
     def get_section(self, title, content):
+        return "".join(self.iter_section(title, [content]))
+
+    def iter_section(self, title, contents):
         section_start = """<div data-role="header">
         <h1>"""
         header_end = """</h1>
@@ -35,119 +121,99 @@ class Report:
 
       <div data-role="main" class="ui-content">"""
         section_end = "</div>"
-        return section_start + title + header_end + content  + section_end
+        yield section_start + title + header_end
+        yield from contents
+        yield section_end
 
     def get_timeline_graph(self):
-        #TODO
-        return """<pre>
-            ||||||||||||||||||||||||||||||||||
-            ||||||||||||||||||||||||||||||||||
-            \\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\
-                \\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\\
-                    \\\\\\\\\\\\\\\\\\\\\\\\\\\\
-            |||||||||||||||||||||||||||||||||||
-            |||||||||||||||||||||||||||||||||||
-                        </pre>
-    """
+        return heatmap.render_html(heatmap.compute(os.path.join(self.out_dir, "database")))
+
+    def get_fingerprint_results(self, failure_on_match):
+        # title -> details of the fingerprints parser.py matched
+        rows = fingerprints.read_results(os.path.join(bundle.output_dir(self.read_dir), "database"))
+        if rows is None:
+            return {"No fingerprint results": "Run parser/parser.py on " + html.escape(self.read_dir) + " first"}
+        results = {}
+        for row in rows:
+            if fingerprints.parse_bool(row["failure_on_match"]) != failure_on_match:
+                continue
+            title = html.escape(row["title"])
+            if title not in results:
+                results[title] = html.escape(row["action"]) + "\n\n"
+            results[title] += "%s: %s matches in %s, first %s, last %s\n" % (
+                html.escape(row["node_name"]), row["count"], html.escape(row["logfile"]),
+                self.format_time(row["first_timestamp"]), self.format_time(row["last_timestamp"]))
+        return results
+
+    def format_time(self, timestamp):
+        return time.strftime("%Y-%m-%d %H:%M:%S UTC", time.gmtime(fingerprints.to_number(timestamp)))
 
     def get_must_fix(self):
-        #TODO
-        return {
-            "Must fix 1": "More details",
-            "Must fix 2": "More details"}
+        return self.get_fingerprint_results(True)
+
     def get_recommended_fix(self):
-        #TODO
-        return {
-            "Recommendation 1": "More details",
-            "Recommendation 2": "More details"}
+        return self.get_fingerprint_results(False)
+
+    def get_title(self, name, files):
+        # Outputs may have a prefix, e.g. node1_uname.out or <pod>_px-status.out
+        for title, suffix in files.items():
+            if name.endswith(suffix):
+                return title
+        return None
 
     def get_cluster_command_output(self):
-        cluster_files = {
-            "pxctl status" : "px-status.out",
-            "Bootstrap entries" : "px-boostrap-list.out",
-            "pxctl status" : 'pxctl_status.out',
-            "pxctl cd list-drives" : 'pxctl_cd_list_drive.out',
-            "pxctl sv kvdb members" : 'pxctl_sv_kvdb_members.out',
-            "pxctl volume list" : 'pxctl_v_l.out',
-            "pxctl alerts show" : 'pxctl_alerts_show.out',
-            #"PX volumes" : 'px-volumes.out'
-            }
-        files_to_parse = {}
-        for path, subdirs, files in os.walk(self.read_dir):
-            for name in files:
-                for key, value in cluster_files.items():
-                    if name.endswith(value):
-                        filename = os.path.join(path, name)
-                        files_to_parse[key] = filename
-        result = ""
-        for key, value in files_to_parse.items():
-            content = open(value, "r").read()
-            result += self.get_command_html(key, content)
-        return result
+        # The cluster outputs are the same on every node, one section per
+        # title: the last file found wins, as it always did
+        result = {}
+        for name, content, full_link in self.scan():
+            title = self.get_title(name, self.cluster_files)
+            if title is not None:
+                result[title] = self.get_command_html(title, html.escape(content, quote=False), full_link)
+        return "".join(result.values())
 
     def get_nodes_command_output(self):
-        node_files = {
-            "Node name" : "uname.out",
-            "PX version": "px-version.out",
-            "lsblk" : "lsblk.out",
-            "blkid" : "blkid.out",
-            "System restarts" : "last.out",
-            "pxctl sv pool show" : 'pxctl_sv_pool_show.out',
-            }
         result = {}
         hostnames = {}
-        for path, subdirs, files in os.walk(self.read_dir):
-            for name in files:
-                for key, value in node_files.items():
-                    if name.endswith(value):
-                        filename = os.path.join(path, name)
-                        f = open(filename, "r")
-                        content = f.read()
-                        f.close()
-                        html = self.get_command_html(key, content)
-                        dict_content = result.get(path, "")
-                        dict_content += html
-                        result[path] = dict_content
-                        if name.endswith("uname.out"):
-                            s = content.split()
-                            hostnames[path] = s[1]
+        for name, content, full_link in self.scan():
+            title = self.get_title(name, self.node_files)
+            if title is None:
+                continue
+            path = os.path.dirname(name)
+            result.setdefault(path, []).append(self.get_command_html(title, html.escape(content, quote=False),
+                                                                     full_link))
+            if title == "Node name":
+                s = content.split()
+                hostnames[path] = s[1]
 
         output = []
         for key, value in result.items():
-            output.append([hostnames[key], value])
+            output.append([hostnames.get(key, os.path.basename(key)), "".join(value)])
         return output
 
+    def iter_information_section(self):
+        contents = [self.get_single_node("Cluster", self.get_cluster_command_output())]
+        contents += [self.get_single_node(hostname, commands) for hostname, commands in self.get_nodes_command_output()]
+        return self.iter_section("Information", contents)
+
     def get_information_section(self):
-        content = ""
-        command_collapse = self.get_cluster_command_output()
-        content += self.get_single_node("Cluster", command_collapse)
-        command_collapse =""
-        cmds = self.get_nodes_command_output()
-        for each in cmds:
-             content += self.get_single_node(each[0], each[1])
-        return self.get_section("Information", content)
+        return "".join(self.iter_information_section())
 
     def get_timeline_section(self):
         content = ""
-        content += self.get_single_node("Volume Timeline", self.get_timeline_graph())
+        content += self.get_single_node("Pattern frequency", self.get_timeline_graph())
         content += self.get_single_node("Another Timeline", "")
         return self.get_section("Timeline", content)
 
     def get_fngerprint_section(self):
-        content = ""
-        command_collapse = ""
         must_fix = self.get_must_fix()
-        for key in must_fix.keys():
-            command_collapse += self.get_command_html(key, must_fix[key])
-        content += self.get_single_node("Know Issues", command_collapse)
-        command_collapse = ""
+        command_collapse = "".join(self.get_command_html(key, value) for key, value in must_fix.items())
+        content = self.get_single_node("Know Issues", command_collapse)
         reco = self.get_recommended_fix()
-        for key in reco.keys():
-            command_collapse += self.get_command_html(key, reco[key])
+        command_collapse = "".join(self.get_command_html(key, value) for key, value in reco.items())
         content += self.get_single_node("Recommended fixes", command_collapse)
         return self.get_section("Fingerprints", content)
 
-    def get_page(self):
+    def iter_page(self):
         page_start = """<!DOCTYPE html>
     <html>
     <head>
@@ -195,7 +261,20 @@ class Report:
 </body>
 </html>"""
 
-        return page_start + self.get_information_section() + self.get_timeline_section() + self.get_fngerprint_section() + page_end
+        yield page_start
+        yield from self.iter_information_section()
+        yield self.get_timeline_section()
+        yield self.get_fngerprint_section()
+        yield page_end
+
+    def get_page(self):
+        return "".join(self.iter_page())
+
+    def write_page(self, path):
+        # Streams the page, sections are written as soon as they are built
+        with open(path, "w") as f:
+            for part in self.iter_page():
+                f.write(part)
 
 
 
@@ -203,12 +282,9 @@ def main():
     if len(sys.argv) != 2:
         print("Error: Specify the directory to parse")
         exit(1)
-    root_dir = sys.argv[1]
-    parser = Report(root_dir)
-    html = parser.get_page()
-    f = open(os.path.join(root_dir, "index.html"), "w")
-    f.write(html)
-    f.close()
+    parser = Report(sys.argv[1])
+    root_dir = parser.out_dir
+    parser.write_page(os.path.join(root_dir, "index.html"))
     src = "./logo.jpeg"
     shutil.copyfile(src, os.path.join(root_dir, "logo.jpeg"))
 
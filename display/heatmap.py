@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Per node and pattern frequency heatmap of a parsed database.
+
+The matches of every (node, pattern) pair are counted in time buckets with
+one np.bincount over all the rows. The bucket width adapts to the time span
+of the case so the heatmap has at most MAX_BUCKETS columns. Timestamps come
+from focus_index.npz, which keeps them per node and table. It is built from
+the table_*.csv files listed in index.csv when the database has none yet.
+
+render_html() draws the counts on a canvas, with the cell color on a log
+scale and the count of a cell shown on hover.
+"""
+
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "parser"))
+import focus
+
+MAX_BUCKETS = 120
+# Bucket widths to pick from, in seconds
+BUCKET_WIDTHS = [1, 5, 10, 30, 60, 300, 600, 1800, 3600, 3 * 3600, 6 * 3600, 12 * 3600, 86400, 7 * 86400]
+CELL_WIDTH = 6
+ROW_HEIGHT = 14
+LABEL_WIDTH = 460
+
+
+def pattern_name(filename: str) -> str:
+    # Databases parsed before index.csv had a pattern_name column:
+    # table_PX_Daemon_Exited.csv -> PX Daemon Exited
+    return filename[len("table_"):-len(".csv")].replace("_", " ")
+
+
+def script_json(data) -> str:
+    # JSON that cannot end the <script> element it is embedded in, node and
+    # pattern names come from the logs
+    return json.dumps(data).replace("<", "\\u003c").replace(">", "\\u003e").replace("&", "\\u0026")
+
+
+def load_series(db_dir: str) -> list:
+    """[(node, pattern, timestamps)] of every table listed in index.csv."""
+    index_path = os.path.join(db_dir, "index.csv")
+    if not os.path.exists(index_path):
+        return []
+    index_df = pd.read_csv(index_path, dtype=str, keep_default_na=False)
+    filenames = index_df["filename"].tolist()
+    if "pattern_name" in index_df:
+        names = dict(zip(filenames, index_df["pattern_name"]))
+    else:
+        names = {filename: pattern_name(filename) for filename in filenames}
+    index = focus.read_index(db_dir, kinds={"node"})
+    if index is None or any(index["tables"].get(f) != os.path.getsize(os.path.join(db_dir, f))
+                            for f in filenames):
+        # Databases parsed before the focus index, or changed since: index
+        # them once, the next heatmaps only load the per node timestamps
+        focus.build_index(db_dir, filenames)
+        index = focus.read_index(db_dir, kinds={"node"})
+    series = []
+    for node, by_table in index["objects"].items():
+        for filename, (ts, _) in by_table.items():
+            if filename in filenames:
+                series.append((node, names[filename], ts))
+    return series
+
+
+def bucket_width(span: float) -> int:
+    for width in BUCKET_WIDTHS:
+        if span / width < MAX_BUCKETS:
+            return width
+    return int(np.ceil(span / (MAX_BUCKETS - 1)))
+
+
+def compute(db_dir: str):
+    """
+    Returns {"rows": [[node, pattern]], "start", "width", "counts": 2D array}
+    with counts[row, bucket] matches, or None when nothing was parsed.
+    """
+    series = sorted((s for s in load_series(db_dir) if len(s[2])), key=lambda s: (s[0], s[1]))
+    if not series:
+        return None
+    lengths = np.array([len(ts) for _, _, ts in series])
+    ts = np.concatenate([ts for _, _, ts in series])
+    lo, hi = ts.min(), ts.max()
+    width = bucket_width(hi - lo)
+    start = np.floor(lo / width) * width
+    buckets = int((hi - start) // width) + 1
+    bins = ((ts - start) // width).astype("int64")
+    rows = np.repeat(np.arange(len(series)), lengths)
+    counts = np.bincount(rows * buckets + bins, minlength=len(series) * buckets).reshape(len(series), buckets)
+    return {"rows": [[node, pattern] for node, pattern, _ in series], "start": float(start), "width": width,
+            "counts": counts}
+
+
+def render_html(heatmap, element_id: str = "heatmap") -> str:
+    if heatmap is None:
+        return "<pre>No parsed tables, run parser/parser.py first</pre>"
+    counts = heatmap["counts"]
+    data = {
+        "rows": heatmap["rows"],
+        "start": heatmap["start"],
+        "width": heatmap["width"],
+        "buckets": counts.shape[1],
+        "counts": counts.ravel().tolist(),
+        "max": int(counts.max()),
+    }
+    width = LABEL_WIDTH + CELL_WIDTH * counts.shape[1]
+    height = ROW_HEIGHT * (counts.shape[0] + 2)
+    return """<div style="overflow-x:auto">
+      <canvas id=\"""" + element_id + """\" width=\"""" + str(width) + """\" height=\"""" + str(height) + """\"></canvas>
+      </div>
+      <script>
+      (function() {
+        var hm = """ + script_json(data) + """;
+        var canvas = document.getElementById(\"""" + element_id + """\");
+        var ctx = canvas.getContext("2d");
+        var cw = """ + str(CELL_WIDTH) + """, rh = """ + str(ROW_HEIGHT) + """, lw = """ + str(LABEL_WIDTH) + """;
+        var logMax = Math.log(1 + hm.max);
+        ctx.font = "11px sans-serif";
+        ctx.textBaseline = "middle";
+        for (var r = 0; r < hm.rows.length; r++) {
+          var node = hm.rows[r][0], label = hm.rows[r][1];
+          if (r == 0 || hm.rows[r - 1][0] != node) {
+            label = node + "  " + label;
+            ctx.fillStyle = "#ccc";
+            ctx.fillRect(0, r * rh, canvas.width, 1);
+          }
+          ctx.fillStyle = "#333";
+          ctx.fillText(label, 2, r * rh + rh / 2, lw - 6);
+          for (var b = 0; b < hm.buckets; b++) {
+            var c = hm.counts[r * hm.buckets + b];
+            if (c == 0) continue;
+            ctx.fillStyle = "rgba(200, 30, 30, " + (0.15 + 0.85 * Math.log(1 + c) / logMax) + ")";
+            ctx.fillRect(lw + b * cw, r * rh + 1, cw - 1, rh - 2);
+          }
+        }
+        function utc(t) { return new Date(t * 1000).toISOString().replace("T", " ").slice(0, 19); }
+        ctx.fillStyle = "#333";
+        var y = hm.rows.length * rh + rh;
+        ctx.fillText(utc(hm.start) + " UTC", lw, y);
+        ctx.fillText("buckets of " + hm.width + "s", lw + (hm.buckets * cw) / 2, y);
+        canvas.onmousemove = function(e) {
+          var rect = canvas.getBoundingClientRect();
+          var r = Math.floor((e.clientY - rect.top) / rh), b = Math.floor((e.clientX - rect.left - lw) / cw);
+          if (r < 0 || r >= hm.rows.length || b < 0 || b >= hm.buckets) { canvas.title = ""; return; }
+          var t = hm.start + b * hm.width;
+          canvas.title = hm.rows[r][0] + "\\n" + hm.rows[r][1] + "\\n" + utc(t) + " - " + utc(t + hm.width) +
+                         " UTC: " + hm.counts[r * hm.buckets + b];
+        };
+      })();
+      </script>"""
@@ -1,90 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+Renders the events of `hawk-eye events` as a Gantt chart.
+
+build_frame() turns the events JSON into one DataFrame, column by column,
+with one row per event and the node it happened on. render() draws every
+node as its own row of subplots sharing the time axis, all in one HTML
+file. A node with more than max_events events is down-sampled first: its
+events are merged per event source, severity and name into time buckets,
+so the browser only ever draws a bounded number of bars.
+
+    $ python3 timeline_generator.py events.out --output timeline.html
+"""
+
+import argparse
 import json
-import time
-import plotly.express as px  
-import datetime
+
+import numpy as np
 import pandas as pd
-import plotly.graph_objs as go
-
-class Events:
-    def __init__(self, node, start, finish, eventName, eventSeverity, eventObject):
-        self.node = node
-        self.start = start
-        self.finish = finish
-        self.eventName=eventName
-        self.eventSeverity=eventSeverity
-        self.eventObject=eventObject
-    def __init__(self):
-        self.node = ""
-        self.start = ""
-        self.finish = ""
-        self.eventName= ""
-        self.eventSeverity= ""
-        self.eventObject= ""
-    def to_dict(self):
-        start = datetime.datetime.fromtimestamp(int(self.start)).strftime('%Y-%m-%d %H:%M:%S')
-        end = datetime.datetime.fromtimestamp(int(self.finish)).strftime('%Y-%m-%d %H:%M:%S')
-        return {
-            'node': self.node,
-            'start': start ,
-            'finish': end,
-            'eventName': self.eventName,
-            'eventSeverity': self.eventSeverity,
-            'Event Source': self.eventObject
-        }
-
-# Opening JSON file
-f = open('events.out')
-  
-# Returns JSON object as a dictionary
-data = json.load(f)
-for event in data:
-    print(event)
-  
-# Create an event list to be used as dataframe
-eventList = []
-
-totalNodes = set()
-for events in data:
-    e = Events()        
-    e.start=events['start']
-    e.finish=events['finish']
-    e.eventName=events['eventName']
-    e.eventSeverity=events['eventSeverity']
-    
-    objects = events['objects']
-    #objectList = []
-    objectString = ""
-    for obj in objects:
-        # Update node type to separate graphs
-        if obj['objectType'] == "node":
-            e.node = obj['objectFullName']
-            totalNodes.add(e.node )
-        else:
-            #objectList.append(obj['objectType'] + ":" + obj['objectName'])
-            objectString +=  " " + obj['objectType'] + ":" + obj['objectName']
-    e.eventObject =  objectString
-    eventList.append(e.to_dict())
-
-print(eventList)
-
-df = pd.DataFrame(eventList)
-df.head(5)
-
-for name, group in df.groupby('node'):
-    heading = "Cluster Node:" + name
-    group.head()
-    fig= px.timeline(group, x_start="start", x_end="finish", y="Event Source", color="eventSeverity", text="eventName")
-    fig.update_layout(title_text=heading,
-                  title_font_size=30)
-    fig.update_xaxes(showgrid=True)
-
-    fig.update_traces(textposition='inside')
-    fig.update_traces(textposition='inside', hovertemplate = "EventSeverity:")
-
-    #fig.update_yaxes(autorange="reversed") # otherwise tasks are listed from the bottom up
-    fig.show()
-
-fig.write_html("./timeline.html")
-fig.write_html("./timeline.png")
-f.close()
 
+try:
+    import plotly.express as px
+    from plotly.subplots import make_subplots
+except ImportError:
+    px = None
+
+MAX_EVENTS_PER_NODE = 2000
+ROW_HEIGHT = 300
+GROUP_COLUMNS = ["node", "Event Source", "eventSeverity", "eventName"]
+
+
+def load_events(path: str) -> list:
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def build_frame(events: list) -> pd.DataFrame:
+    nodes = []
+    sources = []
+    for event in events:
+        node = ""
+        source = ""
+        for obj in event.get("objects") or []:
+            # Node objects pick the subplot, the rest label the bar
+            if obj["objectType"] == "node":
+                node = obj["objectFullName"]
+            else:
+                source += " " + obj["objectType"] + ":" + obj["objectName"]
+        nodes.append(node)
+        sources.append(source)
+
+    df = pd.DataFrame({
+        "node": nodes,
+        "start": pd.to_datetime(np.array([e["start"] for e in events], dtype="int64"), unit="s"),
+        "finish": pd.to_datetime(np.array([e["finish"] for e in events], dtype="int64"), unit="s"),
+        "eventName": [e["eventName"] for e in events],
+        "eventSeverity": [e["eventSeverity"] for e in events],
+        "Event Source": sources,
+    })
+    df["count"] = 1
+    return df
+
+
+def downsample(df: pd.DataFrame, max_events: int = MAX_EVENTS_PER_NODE) -> pd.DataFrame:
+    """
+    Merges the events of every node with more than max_events events into
+    time buckets, doubling the bucket width until the node fits. A merged
+    row spans its first start to its last finish and counts its events.
+    """
+    parts = []
+    for node, group in df.groupby("node", sort=True):
+        if len(group) <= max_events:
+            parts.append(group)
+            continue
+        start = group["start"].values.astype("int64")
+        span = max(int(start.max() - start.min()), 1)
+        width = max(span // max_events, 1)
+        while True:
+            buckets = (start - start.min()) // width
+            merged = group.assign(bucket=buckets).groupby(GROUP_COLUMNS + ["bucket"], sort=False).agg(
+                start=("start", "min"), finish=("finish", "max"), count=("count", "sum")).reset_index()
+            if len(merged) <= max_events or width > span:
+                break
+            width *= 2
+        parts.append(merged.drop(columns="bucket"))
+    if not parts:
+        return df
+    return pd.concat(parts, ignore_index=True)
+
+
+def render(df: pd.DataFrame, path: str, title: str = "Timeline") -> None:
+    if px is None:
+        raise RuntimeError("Rendering the timeline needs the plotly package: pip install plotly")
+    nodes = sorted(df["node"].unique())
+    fig = make_subplots(rows=max(len(nodes), 1), cols=1, shared_xaxes=True, subplot_titles=nodes,
+                        vertical_spacing=min(0.05, 1.0 / max(len(nodes), 1)))
+    severities = set()
+    for row, node in enumerate(nodes, start=1):
+        group = df[df["node"] == node]
+        timeline = px.timeline(group, x_start="start", x_end="finish", y="Event Source", color="eventSeverity",
+                               text="eventName", hover_data=["eventName", "count"])
+        for trace in timeline.data:
+            # One legend entry per severity across all the subplots
+            trace.legendgroup = trace.name
+            trace.showlegend = trace.name not in severities
+            severities.add(trace.name)
+            trace.textposition = "inside"
+            fig.add_trace(trace, row=row, col=1)
+        fig.update_yaxes(title_text="", row=row, col=1)
+    fig.update_xaxes(type="date", showgrid=True)
+    fig.update_layout(title_text=title, title_font_size=30, barmode="overlay",
+                      height=ROW_HEIGHT * max(len(nodes), 1) + 150)
+    fig.write_html(path, include_plotlyjs="cdn")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Render hawk-eye events as one timeline per node")
+    arg_parser.add_argument("events", nargs="?", default="events.out", help="Output of hawk-eye events")
+    arg_parser.add_argument("--output", default="timeline.html")
+    arg_parser.add_argument("--max-events", type=int, default=MAX_EVENTS_PER_NODE,
+                            help="Events per node above which they are merged into time buckets")
+    args = arg_parser.parse_args()
+
+    df = downsample(build_frame(load_events(args.events)), args.max_events)
+    render(df, args.output)
+    print("Wrote " + str(len(df)) + " events of " + str(df["node"].nunique()) + " nodes to " + args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+Collects the command outputs of a live cluster for hawkeye_report.Report.
+
+Runs the node commands in every portworx pod and the cluster commands in the
+first one, all concurrently but at most --concurrency at a time. A command
+that times out or fails is retried. Every output is written to
+<out_dir>/<pod>/<file>.out, the layout the report reads, and the latency of
+every command is printed and saved to <out_dir>/collection.csv.
+
+A command holds one of the --concurrency slots only while it runs, not
+while it waits to be retried. The latency of every attempt is recorded, the
+seconds of a command are those of its last attempt.
+
+kubectl is looked up in --kubectl (or $KUBECTL), so a stub script can stand
+in for a cluster. live/fake-kubectl replays a collection, with injected
+delays, failures and hangs:
+
+    $ FAKE_KUBECTL_FAIL_RATE=0.3 python3 live/collector.py /tmp/case --kubectl live/fake-kubectl --concurrency 32
+"""
+
+import argparse
+import asyncio
+import csv
+import os
+import signal
+import sys
+import time
+import uuid
+
+NAMESPACE = "kube-system"
+SELECTOR = "name=portworx"
+CONTAINER = "portworx"
+NSENTER = ["nsenter", "--mount=/host_proc/1/ns/mnt"]
+STATS_FILE = "collection.csv"
+
+# Run in every portworx pod
+NODE_COMMANDS = [
+    ("pxctl_sv_pool_show.out", ["pxctl", "sv", "pool", "show"]),
+    ("blkid.out", ["blkid"]),
+    ("lsblk.out", ["lsblk", "-f"]),
+    ("uname.out", ["uname", "-a"]),
+]
+# Run in the first pod only
+CLUSTER_COMMANDS = [
+    ("pxctl_cd_list_drive.out", ["pxctl", "cd", "list-drives"]),
+    ("pxctl_sv_kvdb_members.out", ["pxctl", "sv", "kvdb", "members"]),
+    ("pxctl_status.out", ["pxctl", "status"]),
+    ("pxctl_v_l.out", ["pxctl", "v", "l"]),
+    ("pxctl_alerts_show.out", ["pxctl", "alerts", "show"]),
+]
+
+
+class Result:
+    def __init__(self, pod: str, filename: str):
+        self.pod = pod
+        self.filename = filename
+        self.returncode = None
+        self.attempts = 0
+        # Seconds of every attempt, waits for a slot and backoffs excluded
+        self.attempt_seconds = []
+        self.error = ""
+
+    @property
+    def seconds(self) -> float:
+        return self.attempt_seconds[-1] if self.attempt_seconds else 0.0
+
+    def row(self) -> dict:
+        return {"pod": self.pod, "file": self.filename, "returncode": self.returncode,
+                "attempts": self.attempts, "seconds": round(self.seconds, 3), "error": self.error,
+                "attempt_seconds": " ".join("%.3f" % s for s in self.attempt_seconds)}
+
+
+class Collector:
+    def __init__(self, out_dir: str, kubectl: str = "kubectl", namespace: str = NAMESPACE,
+                 selector: str = SELECTOR, container: str = CONTAINER, concurrency: int = 16,
+                 timeout: float = 60, retries: int = 2):
+        self.out_dir = out_dir
+        self.kubectl = kubectl
+        self.namespace = namespace
+        self.selector = selector
+        self.container = container
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.retries = retries
+
+    async def run(self, args: list, timeout: float) -> tuple:
+        # (returncode, stdout) of kubectl args. After timeout its whole process
+        # group is killed, children holding stdout included.
+        proc = await asyncio.create_subprocess_exec(self.kubectl, *args, stdout=asyncio.subprocess.PIPE,
+                                                    stderr=asyncio.subprocess.DEVNULL, start_new_session=True)
+        try:
+            stdout, _ = await asyncio.wait_for(proc.communicate(), timeout)
+        except asyncio.TimeoutError:
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            await proc.wait()
+            raise
+        return proc.returncode, stdout
+
+    async def list_pods(self) -> list:
+        returncode, stdout = await self.run(["-n", self.namespace, "get", "pods", "--no-headers",
+                                             "-l", self.selector, "-o", "wide"], self.timeout)
+        if returncode != 0:
+            raise RuntimeError("kubectl get pods exited with " + str(returncode))
+        return [line.split()[0] for line in stdout.decode().splitlines() if line.strip()]
+
+    async def collect_one(self, semaphore, pod: str, filename: str, command: list) -> Result:
+        result = Result(pod, filename)
+        args = ["-n", self.namespace, "exec", pod, "-c", self.container, "--"] + NSENTER + command
+        stdout = b""
+        while result.attempts <= self.retries:
+            if result.attempts > 0:
+                # Backing off does not hold a slot
+                await asyncio.sleep(min(2 ** (result.attempts - 1), 10))
+            result.attempts += 1
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    result.returncode, stdout = await self.run(args, self.timeout)
+                    result.error = ""
+                except asyncio.TimeoutError:
+                    result.returncode = None
+                    result.error = "timeout after %gs" % self.timeout
+                    continue
+                finally:
+                    result.attempt_seconds.append(time.perf_counter() - start)
+            if result.returncode == 0:
+                break
+            result.error = "exit code " + str(result.returncode)
+        # Like the shell redirect, the file is written even if the command failed
+        with open(os.path.join(self.out_dir, pod, filename), "wb") as f:
+            f.write(stdout)
+        return result
+
+    async def collect(self) -> list:
+        pods = await self.list_pods()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        tasks = []
+        for i, pod in enumerate(pods):
+            os.makedirs(os.path.join(self.out_dir, pod), exist_ok=True)
+            commands = NODE_COMMANDS + (CLUSTER_COMMANDS if i == 0 else [])
+            for filename, command in commands:
+                tasks.append(self.collect_one(semaphore, pod, filename, command))
+        return await asyncio.gather(*tasks)
+
+    def save_stats(self, results: list) -> None:
+        with open(os.path.join(self.out_dir, STATS_FILE), "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=["pod", "file", "returncode", "attempts", "seconds", "error",
+                                                   "attempt_seconds"])
+            writer.writeheader()
+            writer.writerows(r.row() for r in results)
+        print("%-45s %-28s %8s %8s %s" % ("pod", "file", "attempts", "seconds", "error"), file=sys.stderr)
+        for r in sorted(results, key=lambda r: r.seconds, reverse=True):
+            print("%-45s %-28s %8d %8.2f %s" % (r.pod[:45], r.filename, r.attempts, r.seconds, r.error),
+                  file=sys.stderr)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Collect portworx command outputs from a live cluster")
+    arg_parser.add_argument("out_dir", nargs="?", help="Directory to write <pod>/<cmd>.out to (default: a new uuid)")
+    arg_parser.add_argument("--kubectl", default=os.environ.get("KUBECTL", "kubectl"))
+    arg_parser.add_argument("--namespace", default=NAMESPACE)
+    arg_parser.add_argument("--selector", default=SELECTOR)
+    arg_parser.add_argument("--container", default=CONTAINER)
+    arg_parser.add_argument("--concurrency", type=int, default=16, help="Commands running at the same time")
+    arg_parser.add_argument("--timeout", type=float, default=60, help="Seconds before a command is killed")
+    arg_parser.add_argument("--retries", type=int, default=2, help="Retries of a failed or timed out command")
+    args = arg_parser.parse_args()
+
+    out_dir = args.out_dir or str(uuid.uuid4())
+    os.makedirs(out_dir, exist_ok=True)
+    collector = Collector(out_dir, args.kubectl, args.namespace, args.selector, args.container,
+                          args.concurrency, args.timeout, args.retries)
+    start = time.perf_counter()
+    results = asyncio.run(collector.collect())
+    collector.save_stats(results)
+    failed = [r for r in results if r.returncode != 0]
+    print("Collected %d outputs in %.1fs, %d failed" % (len(results), time.perf_counter() - start, len(failed)),
+          file=sys.stderr)
+    print(out_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+Read diag bundles without extracting them.
+
+A bundle is either an extracted directory, a tarball (.tar, .tar.gz, .tgz,
+.tar.zst) or a single compressed log (.gz, .zst). iter_members() streams the
+members whose name ends with one of the requested suffixes, decompressing
+lazily, so only the logs and command outputs we care about are ever read.
+"""
+
+import contextlib
+import gzip
+import io
+import os
+import tarfile
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+TAR_EXTENSIONS = (".tar", ".tar.gz", ".tgz", ".tar.zst", ".tzst")
+COMPRESSED_EXTENSIONS = (".gz", ".zst")
+
+
+def is_archive(path: str) -> bool:
+    return os.path.isfile(path) and path.endswith(TAR_EXTENSIONS + COMPRESSED_EXTENSIONS)
+
+
+def strip_extension(path: str) -> str:
+    for ext in TAR_EXTENSIONS + COMPRESSED_EXTENSIONS:
+        if path.endswith(ext):
+            return path[:-len(ext)]
+    return path
+
+
+def plain_name(name: str) -> str:
+    # Member name without its .gz/.zst compression extension
+    for ext in COMPRESSED_EXTENSIONS:
+        if name.endswith(ext):
+            return name[:-len(ext)]
+    return name
+
+
+def output_dir(path: str) -> str:
+    # Where the database and report of a bundle go. For an archive this is a
+    # directory named after it, e.g. case.tar.gz -> case/. A single compressed
+    # log gets a .d suffix, docker.out.gz -> docker.out.d/, as the uncompressed
+    # docker.out may sit next to it.
+    if not is_archive(path):
+        return path
+    out = strip_extension(path)
+    if not path.endswith(TAR_EXTENSIONS):
+        out += ".d"
+    if not os.path.exists(out):
+        os.mkdir(out, 0o777)
+    return out
+
+
+def zstd_reader(fileobj):
+    if zstandard is None:
+        raise RuntimeError("Reading .zst bundles needs the zstandard package: pip install zstandard")
+    return zstandard.ZstdDecompressor().stream_reader(fileobj)
+
+
+class _ForwardOnly(io.RawIOBase):
+    # Streaming tar members and decompressors cannot seek, which TextIOWrapper
+    # probes for. Expose them as a plain forward-only raw stream, optionally
+    # limited to the next limit bytes.
+    def __init__(self, fileobj, limit=None):
+        self.fileobj = fileobj
+        self.limit = limit
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        size = len(b)
+        if self.limit is not None:
+            size = min(size, self.limit)
+        data = self.fileobj.read(size)
+        b[:len(data)] = data
+        if self.limit is not None:
+            self.limit -= len(data)
+        return len(data)
+
+    def close(self) -> None:
+        self.fileobj.close()
+        super().close()
+
+
+def text_stream(fileobj, limit=None):
+    return io.TextIOWrapper(io.BufferedReader(_ForwardOnly(fileobj, limit)))
+
+
+def open_range(path: str, start: int, end: int):
+    # Text stream over bytes [start, end) of path, decoded like open(path, "r")
+    f = open(path, "rb")
+    f.seek(start)
+    return text_stream(f, end - start)
+
+
+def decompressed(name: str, fileobj):
+    # Returns (name without compression extension, binary stream)
+    if name.endswith(".gz"):
+        return name[:-len(".gz")], gzip.GzipFile(fileobj=fileobj)
+    if name.endswith(".zst"):
+        return name[:-len(".zst")], zstd_reader(fileobj)
+    return name, fileobj
+
+
+def is_compressed(path: str) -> bool:
+    # A .gz/.zst file can only be read from its start
+    return plain_name(path) != path
+
+
+@contextlib.contextmanager
+def open_file(path: str):
+    # Yields (name without compression extension, text stream)
+    if not is_compressed(path):
+        with open(path, "r") as f:
+            yield path, f
+    else:
+        with open(path, "rb") as raw:
+            member_name, stream = decompressed(path, raw)
+            yield member_name, text_stream(stream)
+
+
+class DirBundle:
+    def __init__(self, root_dir: str):
+        self.root_dir = root_dir
+
+    def iter_paths(self, suffixes: tuple):
+        for path, subdirs, files in os.walk(self.root_dir):
+            for name in files:
+                if plain_name(name).endswith(suffixes):
+                    yield os.path.join(path, name)
+
+    def open_member(self, full_path: str):
+        # Unlike tar members, files can be opened in any order, e.g. from threads
+        return open_file(full_path)
+
+    def iter_members(self, suffixes: tuple):
+        for full_path in self.iter_paths(suffixes):
+            with self.open_member(full_path) as member:
+                yield member
+
+
+class TarBundle:
+    def __init__(self, path: str):
+        self.path = path
+
+    def open_tar(self, raw):
+        if self.path.endswith((".tar.zst", ".tzst")):
+            return tarfile.open(fileobj=zstd_reader(raw), mode="r|")
+        # Stream mode: members are decompressed once, in archive order
+        return tarfile.open(fileobj=raw, mode="r|*")
+
+    def iter_members(self, suffixes: tuple):
+        with open(self.path, "rb") as raw:
+            with self.open_tar(raw) as tar:
+                for member in tar:
+                    if not member.isfile():
+                        continue
+                    if not plain_name(member.name).endswith(suffixes):
+                        continue
+                    member_name, stream = decompressed(member.name, tar.extractfile(member))
+                    yield member_name, text_stream(stream)
+
+
+class CompressedFileBundle:
+    # A single compressed file, e.g. docker.out.gz
+    def __init__(self, path: str):
+        self.path = path
+
+    def iter_members(self, suffixes: tuple):
+        if not plain_name(self.path).endswith(suffixes):
+            return
+        with open(self.path, "rb") as raw:
+            member_name, stream = decompressed(self.path, raw)
+            yield member_name, text_stream(stream)
+
+
+def open_bundle(path: str):
+    if os.path.isdir(path):
+        return DirBundle(path)
+    if path.endswith(TAR_EXTENSIONS):
+        return TarBundle(path)
+    if path.endswith(COMPRESSED_EXTENSIONS):
+        return CompressedFileBundle(path)
+    raise ValueError("Unsupported bundle: " + path)
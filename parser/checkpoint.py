@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+Per-file byte-offset checkpoints for incremental re-parses.
+
+The checkpoint in DB_DIR remembers, for every parsed log file (by its path
+relative to DB_DIR), how far it was parsed and enough of its content to
+recognise it again, plus a hash of every LogLine that was applied. Files
+are parsed up to their last newline, a line still being written is parsed
+by the next run. On the next run only the appended bytes of known files
+are parsed and their rows appended to the existing tables. A
+LogLine that was not part of the previous run is scanned over the already
+parsed bytes as well, and only that LogLine, and so is a LogLine whose
+table on disk has other columns than it writes now. If a known file was
+rewritten, truncated or removed, a known .gz/.zst file changed at all, or
+the options (storage backend, --subsecond, ...) changed, the whole
+database is rebuilt.
+
+parser.py --follow appends rows parsed from a stream, which no log file can
+give back. Its batches mark the checkpoint as followed, and a normal run
+then refuses to touch the database unless told to rebuild it.
+"""
+
+import hashlib
+import json
+import os
+
+import bundle
+
+CHECKPOINT_FILE = "checkpoint.json"
+# Bytes hashed at the head of a file and right before its offset
+FINGERPRINT_SIZE = 4096
+
+
+def pattern_hash(logline_obj) -> str:
+    # Everything that changes which lines a LogLine matches or the columns of
+    # its table: a change scans the logs for it again
+    level = sorted(logline_obj.level) if logline_obj.level is not None else None
+    key = "\0".join([logline_obj.pattern_name, logline_obj.pattern, logline_obj.logfile,
+                     json.dumps([logline_obj.field, level, logline_obj.component,
+                                 list(logline_obj.field_columns)])])
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def hash_range(path: str, start: int, end: int) -> str:
+    with open(path, "rb") as f:
+        f.seek(start)
+        return hashlib.sha256(f.read(end - start)).hexdigest()
+
+
+def lines_end(path: str, size: int) -> int:
+    # Offset just past the last newline in the first size bytes. A last line
+    # without its newline yet (a log being written) is left for the next run.
+    if bundle.is_compressed(path):
+        return size
+    with open(path, "rb") as f:
+        end = size
+        while end > 0:
+            start = max(0, end - FINGERPRINT_SIZE)
+            f.seek(start)
+            cut = f.read(end - start).rfind(b"\n")
+            if cut != -1:
+                return start + cut + 1
+            end = start
+    return 0
+
+
+class Checkpoint:
+    def __init__(self, db_dir: str, options: dict = None):
+        # options that change the table contents, a change forces a rebuild
+        self.options = options or {}
+        self.db_dir = os.path.abspath(db_dir)
+        self.path = os.path.join(db_dir, CHECKPOINT_FILE)
+        self.data = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r") as f:
+                self.data = json.load(f)
+        # logfile -> offset the planned tasks parse it up to
+        self.ends = {}
+        # Whether the last plan() starts the database over
+        self.rebuild = True
+
+    @property
+    def followed(self) -> bool:
+        return bool(self.data.get("follow"))
+
+    def file_key(self, logfile: str) -> str:
+        # Files are known by their path relative to the database, whatever
+        # the directory parser.py runs from
+        return os.path.relpath(os.path.abspath(logfile), self.db_dir)
+
+    def file_unchanged(self, logfile: str, state: dict) -> bool:
+        # The bytes we parsed last time must still be there, unmodified
+        size = os.path.getsize(logfile)
+        if size < state["offset"]:
+            return False
+        if bundle.is_compressed(logfile) and size != state["offset"]:
+            # Compressed logs cannot be resumed at an offset, only parsed again
+            return False
+        if hash_range(logfile, 0, state["head_len"]) != state["head"]:
+            return False
+        tail_start = max(0, state["offset"] - FINGERPRINT_SIZE)
+        return hash_range(logfile, tail_start, state["offset"]) == state["tail"]
+
+    def plan(self, files_to_parse: list, patterns: list, full: bool = False, stale=()):
+        """
+        Returns (tasks, append_patterns). Each task is (logfile, start, end,
+        pattern_ids) where pattern_ids is None for all patterns. Rows of the
+        patterns in append_patterns are appended to their existing tables.
+        The patterns in stale are scanned again like new ones.
+        """
+        self.ends = {logfile: lines_end(logfile, os.path.getsize(logfile)) for logfile in files_to_parse}
+        known_files = self.data.get("files", {})
+        known_patterns = set(self.data.get("patterns", []))
+
+        if not full and known_files:
+            full = self.data.get("options", {}) != self.options
+            full = full or bool(set(known_files) - {self.file_key(logfile) for logfile in files_to_parse})
+            for logfile in files_to_parse:
+                if full:
+                    break
+                if self.file_key(logfile) in known_files:
+                    full = not self.file_unchanged(logfile, known_files[self.file_key(logfile)])
+        self.rebuild = full or not known_files
+        if self.rebuild:
+            return [(f, 0, self.ends[f], None) for f in files_to_parse], set()
+
+        new_ids = [i for i, p in enumerate(patterns) if pattern_hash(p) not in known_patterns or p in stale]
+        append_patterns = {p for i, p in enumerate(patterns) if i not in new_ids}
+        tasks = []
+        for logfile in files_to_parse:
+            end = self.ends[logfile]
+            offset = known_files.get(self.file_key(logfile), {}).get("offset", 0)
+            if new_ids and offset > 0:
+                tasks.append((logfile, 0, offset, tuple(new_ids)))
+            if end > offset:
+                tasks.append((logfile, offset, end, None))
+        return tasks, append_patterns
+
+    def save(self, patterns: list) -> None:
+        files = {}
+        for logfile, end in self.ends.items():
+            head_len = min(end, FINGERPRINT_SIZE)
+            files[self.file_key(logfile)] = {
+                "offset": end,
+                "head_len": head_len,
+                "head": hash_range(logfile, 0, head_len),
+                "tail": hash_range(logfile, max(0, end - FINGERPRINT_SIZE), end),
+            }
+        self.data = {
+            "patterns": [pattern_hash(p) for p in patterns],
+            "options": self.options,
+            "files": files,
+        }
+        with open(self.path, "w") as f:
+            json.dump(self.data, f, indent=2)
+
+    def save_follow(self, patterns: list) -> None:
+        # The files parsed before, if any, stay known
+        self.data["follow"] = True
+        self.data["patterns"] = [pattern_hash(p) for p in patterns]
+        self.data["options"] = self.options
+        self.data.setdefault("files", {})
+        with open(self.path, "w") as f:
+            json.dump(self.data, f, indent=2)
+
+    def remove(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
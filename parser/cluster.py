@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+"""
+One cluster database from the diag bundles of many nodes.
+
+Every bundle is parsed into its own database as by parser.py (incremental
+runs included) and its tables are sorted by timestamp, with an external
+merge sort of SORT_RUN_ROWS rows at a time. The tables of the
+same pattern are then merged into <cluster_dir>/database with a streaming
+k-way merge: only the current row of every bundle is held in memory. The
+merged tables are in global time order and rows with the same timestamp
+keep the bundle order. The tables keep the columns of a node database, so
+the Go readers (pkg/hawkeye) read them unchanged. The bundle every row came
+from is kept beside them in <cluster_dir>/database/bundles:
+- names.json          the bundle names
+- <table>.npy         per row of table_<...>.csv, the position of its bundle
+
+    $ python3 parser/cluster.py cluster/ node1.tar.gz node2.tar.gz node3/
+"""
+
+import argparse
+import array
+import csv
+import heapq
+import json
+import os
+import tempfile
+
+import numpy as np
+
+import bundle
+import fingerprints
+import focus
+import parser
+
+BUNDLES_DIR = "bundles"
+BUNDLE_NAMES_FILE = "names.json"
+TIMESTAMP = "timestamp"
+INDEX_FILE = "index.csv"
+# Rows of a table sorted in memory at a time, see sort_table()
+SORT_RUN_ROWS = 500000
+
+
+def bundle_name(path: str) -> str:
+    return os.path.basename(os.path.normpath(bundle.strip_extension(path)))
+
+
+def partition_names(paths: list) -> list:
+    # Bundle names, with the position of the bundle added to the names
+    # several bundles share (e.g. node1/diags.tar.gz and node2/diags.tar.gz)
+    names = [bundle_name(path) for path in paths]
+    return [name if names.count(name) == 1 else name + "_" + str(i) for i, name in enumerate(names)]
+
+
+def table_is_sorted(path: str) -> bool:
+    with open(path, "r", newline="") as f:
+        reader = csv.reader(f)
+        ts_col = next(reader).index(TIMESTAMP)
+        last = float("-inf")
+        for row in reader:
+            ts = float(row[ts_col])
+            if ts < last:
+                return False
+            last = ts
+    return True
+
+
+def write_run(rows: list, run_dir: str) -> str:
+    rows.sort(key=lambda entry: entry[0])
+    path = os.path.join(run_dir, "run_%d.csv" % len(os.listdir(run_dir)))
+    with open(path, "w", newline="") as f:
+        csv.writer(f, lineterminator="\n").writerows(row for _, row in rows)
+    return path
+
+
+def iter_run(path: str, ts_col: int):
+    with open(path, "r", newline="") as f:
+        for row in csv.reader(f):
+            yield float(row[ts_col]), row
+
+
+def sort_table(path: str) -> bool:
+    # Sorts a table of one bundle by timestamp in place, lines with equal
+    # timestamps keep their order. Runs of SORT_RUN_ROWS rows are sorted in
+    # memory and spilled next to the table, then merged in run order.
+    # Returns whether it had to be rewritten.
+    if table_is_sorted(path):
+        return False
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(path)) as run_dir:
+        runs = []
+        with open(path, "r", newline="") as f:
+            reader = csv.reader(f)
+            header = next(reader)
+            ts_col = header.index(TIMESTAMP)
+            rows = []
+            for row in reader:
+                rows.append((float(row[ts_col]), row))
+                if len(rows) == SORT_RUN_ROWS:
+                    runs.append(write_run(rows, run_dir))
+                    rows = []
+            if rows:
+                runs.append(write_run(rows, run_dir))
+        sorted_path = os.path.join(run_dir, "sorted.csv")
+        with open(sorted_path, "w", newline="") as f:
+            writer = csv.writer(f, lineterminator="\n")
+            writer.writerow(header)
+            sources = [iter_run(run, ts_col) for run in runs]
+            writer.writerows(row for _, row in heapq.merge(*sources, key=lambda entry: entry[0]))
+        os.replace(sorted_path, path)
+    return True
+
+
+def read_index(db_dir: str) -> list:
+    path = os.path.join(db_dir, INDEX_FILE)
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", newline="") as f:
+        return list(csv.DictReader(f))
+
+
+def iter_rows(path: str, header: list, partition: int):
+    # Rows of a table as (timestamp, partition, row in header order)
+    with open(path, "r", newline="") as f:
+        reader = csv.reader(f)
+        columns = next(reader)
+        positions = [columns.index(col) if col in columns else None for col in header]
+        ts_col = columns.index(TIMESTAMP)
+        for row in reader:
+            yield float(row[ts_col]), partition, [row[i] if i is not None else "" for i in positions]
+
+
+def table_header(paths: list) -> list:
+    # Union of the table columns, in the order they first appear
+    header = []
+    for path in paths:
+        with open(path, "r", newline="") as f:
+            for col in next(csv.reader(f)):
+                if col not in header:
+                    header.append(col)
+    return header
+
+
+def bundles_path(db_dir: str, filename: str) -> str:
+    return os.path.join(db_dir, BUNDLES_DIR, os.path.splitext(filename)[0] + ".npy")
+
+
+def merge_table(paths: list, partitions: list, out_path: str) -> array.array:
+    # Returns the partition of every row written
+    header = table_header(paths)
+    row_partitions = array.array("H")
+    with open(out_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        sources = [iter_rows(path, header, partition) for path, partition in zip(paths, partitions)]
+        for _, partition, row in heapq.merge(*sources, key=lambda entry: entry[0]):
+            writer.writerow(row)
+            row_partitions.append(partition)
+    return row_partitions
+
+
+def row_bundles(db_dir: str, filename: str) -> np.ndarray:
+    """Name of the bundle of every row of a cluster table, in row order."""
+    with open(os.path.join(db_dir, BUNDLES_DIR, BUNDLE_NAMES_FILE), "r") as f:
+        names = np.array(json.load(f), dtype=object)
+    return names[np.load(bundles_path(db_dir, filename))]
+
+
+class Cluster:
+    def __init__(self, cluster_dir: str, bundles: list, jobs: int = 1, full: bool = False,
+                 subsecond: bool = False, memory_limit_mb: int = parser.MEMORY_LIMIT_MB,
+                 fingerprint_dir=fingerprints.DEFAULT_DIR):
+        self.cluster_dir = cluster_dir
+        self.bundles = bundles
+        self.jobs = jobs
+        self.full = full
+        self.subsecond = subsecond
+        self.memory_limit_mb = memory_limit_mb
+        self.fingerprint_dir = fingerprint_dir
+        self.DB_DIR = os.path.join(cluster_dir, "database")
+        os.makedirs(self.DB_DIR, exist_ok=True)
+
+    def parse_bundle(self, path: str) -> str:
+        # The merge reads the csv tables, whatever the storage of the cluster
+        bundle_parser = parser.Parser(path, self.jobs, self.full, subsecond=self.subsecond,
+                                      memory_limit_mb=self.memory_limit_mb, fingerprint_dir=self.fingerprint_dir)
+        bundle_parser.start()
+        db_dir = bundle_parser.DB_DIR
+        filenames = [entry["filename"] for entry in read_index(db_dir)]
+        resorted = [filename for filename in filenames if sort_table(os.path.join(db_dir, filename))]
+        if resorted:
+            # Row offsets changed, the focus index of the bundle starts over
+            focus.build_index(db_dir, filenames)
+        return db_dir
+
+    def start(self) -> None:
+        db_dirs = [self.parse_bundle(path) for path in self.bundles]
+        partitions = partition_names(self.bundles)
+
+        # filename -> index.csv entry and the bundles (by position) that have the table
+        tables = {}
+        for i, db_dir in enumerate(db_dirs):
+            for entry in read_index(db_dir):
+                table = tables.setdefault(entry["filename"], (entry, [], []))
+                table[1].append(os.path.join(db_dir, entry["filename"]))
+                table[2].append(i)
+
+        bundles_dir = os.path.join(self.DB_DIR, BUNDLES_DIR)
+        os.makedirs(bundles_dir, exist_ok=True)
+        with open(os.path.join(bundles_dir, BUNDLE_NAMES_FILE), "w") as f:
+            json.dump(partitions, f)
+        for filename, (entry, paths, table_partitions) in tables.items():
+            row_partitions = merge_table(paths, table_partitions, os.path.join(self.DB_DIR, filename))
+            np.save(bundles_path(self.DB_DIR, filename), np.frombuffer(row_partitions, dtype="uint16"))
+            print(filename + ": " + str(len(row_partitions)) + " rows from " + str(len(paths)) + " bundles")
+        with open(os.path.join(self.DB_DIR, INDEX_FILE), "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=["logfile", "pattern", "filename", "pattern_name"])
+            writer.writeheader()
+            writer.writerows({k: entry.get(k) for k in writer.fieldnames} for entry, _, _ in tables.values())
+        focus.build_index(self.DB_DIR, list(tables))
+        self.merge_fingerprints(db_dirs)
+
+    def merge_fingerprints(self, db_dirs: list) -> None:
+        rows = []
+        for db_dir in db_dirs:
+            rows += fingerprints.read_results(db_dir) or []
+        rows.sort(key=lambda row: row["title"])
+        with open(os.path.join(self.DB_DIR, fingerprints.RESULTS_FILE), "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fingerprints.RESULT_COLUMNS)
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Parse the diag bundles of many nodes into one database")
+    arg_parser.add_argument("cluster_dir", help="Directory to create the cluster database in")
+    arg_parser.add_argument("bundles", nargs="+", help="Directories or diag bundles, one per node")
+    arg_parser.add_argument("-j", "--jobs", type=int, default=1,
+                            help="Number of worker processes per bundle (default: 1)")
+    arg_parser.add_argument("--full", action="store_true",
+                            help="Ignore the checkpoints and re-parse every file from the start")
+    arg_parser.add_argument("--subsecond", action="store_true",
+                            help="Add the sub-second part of time=\"...\"/klog times to the timestamps")
+    arg_parser.add_argument("--memory-limit", type=int, default=parser.MEMORY_LIMIT_MB, metavar="MB",
+                            help="Flush buffered rows to the tables above this size (default: %(default)s)")
+    arg_parser.add_argument("--fingerprints", default=fingerprints.DEFAULT_DIR, metavar="DIR",
+                            help="Directory of fingerprint *.json files (default: %(default)s)")
+    arg_parser.add_argument("--no-fingerprints", dest="fingerprints", action="store_const", const=None,
+                            help="Do not evaluate fingerprints")
+    args = arg_parser.parse_args()
+    Cluster(args.cluster_dir, args.bundles, args.jobs, args.full, args.subsecond, args.memory_limit,
+            args.fingerprints).start()
+
+
+if __name__ == "__main__":
+    main()
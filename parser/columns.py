@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Compact column buffers for the LogLine tables.
+
+- timestamps live in an array of int64, promoted to doubles the first time a
+  sub-second timestamp shows up
+- node/pod/pv names are interned, every row of a node shares one string
+- everything else stays a list of str
+
+The byte estimates below drive MasterFile's memory ceiling.
+"""
+
+import array
+import sys
+
+TIMESTAMP = "timestamp"
+# Columns holding object names, few distinct values repeated on many rows
+NAME_COLUMNS = {"node_name", "pod_name", "pod_full_name", "pv_name", "UID", "unique_name"}
+
+POINTER_SIZE = 8
+STR_OVERHEAD = sys.getsizeof("")
+
+
+class TimestampColumn:
+    def __init__(self):
+        self.values = array.array("q")
+
+    def append(self, val) -> None:
+        try:
+            self.values.append(val)
+        except TypeError:
+            self.values = array.array("d", self.values)
+            self.values.append(val)
+
+    def extend(self, vals) -> None:
+        if isinstance(vals, TimestampColumn):
+            vals = vals.values
+        if self.values.typecode == "q" and getattr(vals, "typecode", "q") == "d":
+            self.values = array.array("d", self.values)
+        for val in vals:
+            self.append(val)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __iter__(self):
+        return iter(self.values)
+
+    def nbytes(self) -> int:
+        return self.values.itemsize * len(self.values)
+
+
+class NameColumn(list):
+    def append(self, val) -> None:
+        super().append(sys.intern(val) if isinstance(val, str) else val)
+
+    def extend(self, vals) -> None:
+        for val in vals:
+            self.append(val)
+
+    def nbytes(self) -> int:
+        # The interned strings are shared and not counted
+        return POINTER_SIZE * len(self)
+
+
+class TextColumn(list):
+    def nbytes(self) -> int:
+        return sum(value_size(v) for v in self)
+
+
+def value_size(val) -> int:
+    if isinstance(val, str):
+        return POINTER_SIZE + STR_OVERHEAD + len(val)
+    return POINTER_SIZE
+
+
+def new_column(col: str):
+    if col == TIMESTAMP:
+        return TimestampColumn()
+    if col in NAME_COLUMNS:
+        return NameColumn()
+    return TextColumn()
+
+
+def as_data(column):
+    # What pandas gets to build a DataFrame from
+    if isinstance(column, TimestampColumn):
+        return column.values
+    return column
+
+
+def table_bytes(df: dict) -> int:
+    return sum(column.nbytes() for column in df.values())
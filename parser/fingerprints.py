@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+Fingerprint engine.
+
+A fingerprint is a JSON file in the fingerprints directory, see
+fingerprints/fingerprint_template:
+
+    {
+        "Title": "...",
+        "Action text": "...",
+        "Regex": "...",
+        "FailureOnMatch": "True",
+        "Logfile": "kubelet.out",
+        "Example": "..."
+    }
+
+Example is not read, it holds a real log line the Regex was written
+against, like the comments above MasterFile.patterns.
+
+Fingerprints are LogLines too: MasterFile compiles them into the same
+matcher as its patterns, so they are evaluated in the same scan of every
+log. A fingerprint with a Logfile only runs on the lines of that log, without
+one it runs on every log. Instead of a table, a fingerprint keeps per node
+the number of matches and the first and last timestamp. The results are
+written to fingerprints.csv next to index.csv, where hawkeye_report.Report
+picks them up.
+"""
+
+import csv
+import glob
+import json
+import os
+import re
+
+import masterfile
+
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fingerprints")
+RESULTS_FILE = "fingerprints.csv"
+RESULT_COLUMNS = ["title", "failure_on_match", "logfile", "node_name", "count",
+                  "first_timestamp", "last_timestamp", "action", "source"]
+
+
+class Fingerprint(masterfile.LogLine):
+    def __init__(self, title: str, action: str, regex: str, failure_on_match: bool, logfile: str,
+                 source: str = ""):
+        super().__init__(title, regex, logfile)
+        self.action = action
+        self.failure_on_match = failure_on_match
+        self.source = source
+        # node_name -> [count, first timestamp, last timestamp]
+        self.hits = {}
+
+    def found_a_pattern(self, line: str, decoder) -> int:
+        grp = masterfile.HEADER_RE.match(line)
+        if grp is None:
+            return 0
+        node_name = grp.group(self.NODE_NAME)
+        timestamp = decoder.decode(grp.group(self.TIMESTAMP), grp.group(self.REST))
+        self.add_hit(node_name, 1, timestamp, timestamp)
+        return 0
+
+    def add_hit(self, node_name: str, count: int, first, last) -> None:
+        hit = self.hits.get(node_name)
+        if hit is None:
+            self.hits[node_name] = [count, first, last]
+            return
+        hit[0] += count
+        hit[1] = min(hit[1], first)
+        hit[2] = max(hit[2], last)
+
+
+def parse_bool(value) -> bool:
+    return str(value).strip().lower() == "true"
+
+
+def read_definition(path: str):
+    # Returns the constructor arguments of a fingerprint file, None if it is unusable
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+        regex = data["Regex"]
+        re.compile(regex)
+    except (OSError, ValueError, KeyError, re.error) as e:
+        print("Skipping fingerprint " + path + ": " + str(e))
+        return None
+    if not regex:
+        print("Skipping fingerprint " + path + ": empty Regex")
+        return None
+    title = data.get("Title") or os.path.splitext(os.path.basename(path))[0]
+    return {
+        "title": title,
+        "action": data.get("Action text", ""),
+        "regex": regex,
+        "failure_on_match": parse_bool(data.get("FailureOnMatch", "True")),
+        "logfile": data.get("Logfile", ""),
+        "source": os.path.basename(path),
+    }
+
+
+def load_fingerprints(fingerprint_dir: str = DEFAULT_DIR) -> list:
+    files = sorted(glob.glob(os.path.join(fingerprint_dir, "*.json")))
+    definitions = [d for d in (read_definition(f) for f in files) if d is not None]
+    return [Fingerprint(d["title"], d["action"], d["regex"], d["failure_on_match"], d["logfile"], d["source"])
+            for d in definitions]
+
+
+def read_results(db_dir: str) -> list:
+    path = os.path.join(db_dir, RESULTS_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", newline="") as f:
+        return list(csv.DictReader(f))
+
+
+def to_number(value: str):
+    return float(value) if "." in value else int(value)
+
+
+def save_results(db_dir: str, fingerprints: list, append_fingerprints=()) -> None:
+    """
+    Writes one row per fingerprint and node. Fingerprints in
+    append_fingerprints add their hits to the ones of the previous run.
+    """
+    previous = {}
+    for row in read_results(db_dir) or []:
+        previous.setdefault(row["title"], []).append(row)
+
+    rows = []
+    for fp in fingerprints:
+        if fp in append_fingerprints:
+            for row in previous.get(fp.pattern_name, []):
+                fp.add_hit(row["node_name"], int(row["count"]), to_number(row["first_timestamp"]),
+                           to_number(row["last_timestamp"]))
+        for node_name, (count, first, last) in sorted(fp.hits.items()):
+            rows.append({
+                "title": fp.pattern_name,
+                "failure_on_match": fp.failure_on_match,
+                "logfile": fp.logfile,
+                "node_name": node_name,
+                "count": count,
+                "first_timestamp": first,
+                "last_timestamp": last,
+                "action": fp.action,
+                "source": fp.source,
+            })
+    with open(os.path.join(db_dir, RESULTS_FILE), "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
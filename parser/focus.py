@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+"""
+Secondary indexes over the table_*.csv files for focus object lookups.
+
+For every value of an object column (pod UID, pod name, PV name, volume id,
+node) the index keeps, per table, the timestamps and byte offsets of the
+rows holding it, sorted by timestamp. The pod UID and PV name inside the
+target_path of NodePublishVolume are indexed too, parsed like pkg/hawkeye
+does for --focus. A lookup is then a binary search on the time range and
+one seek per matching row, instead of a scan of every table.
+
+MasterFile.save_db_files() builds focus_index.npz next to index.csv. It only
+holds plain arrays and is loaded without pickle, so a database directory
+cannot run code. Tables that were only appended to by an incremental run
+are indexed from where the previous index stopped.
+
+    import focus
+    index = focus.FocusIndex("test_data/PWX-26783/database")
+    index.records("0454503f-4399-46fc-ac26-7ada4ecaaa70", start=1662386894, end=1662387300)
+"""
+
+import argparse
+import csv
+import io
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+INDEX_FILE = "focus_index.npz"
+INDEX_VERSION = 2
+TIMESTAMP = "timestamp"
+# Indexed columns and the kind of object they hold
+FOCUS_COLUMNS = {
+    "UID": "pod_uid",
+    "pod_name": "pod",
+    "pod_full_name": "pod",
+    "pv_name": "pv",
+    "unique_name": "volume",
+    "vol_id": "volume",
+    "node_name": "node",
+}
+# Same expression as NewNodePublishVolumeRec in pkg/hawkeye/hawkeye.go
+TARGET_PATH_RE = re.compile(r"^/var/lib/kubelet/pods/(.*)/volumes/kubernetes.io~csi/(.*)$")
+
+
+def target_path_objects(value: str) -> list:
+    m = TARGET_PATH_RE.match(value)
+    if m is None:
+        return []
+    # Tables parsed before the msg field was used keep a trailing quote
+    pv_name = m.group(2)
+    if pv_name.endswith('"'):
+        pv_name = pv_name[:-1]
+    if pv_name.endswith("/mount"):
+        pv_name = pv_name[:-len("/mount")]
+    return [(m.group(1), "pod_uid"), (pv_name, "pv")]
+
+
+# Columns holding objects inside a longer value: column -> value -> [(object, kind)]
+PATH_COLUMNS = {
+    "target_path": target_path_objects,
+}
+
+
+def column_objects(col: str):
+    if col in PATH_COLUMNS:
+        return PATH_COLUMNS[col]
+    kind = FOCUS_COLUMNS[col]
+    return lambda value: [(value, kind)]
+
+
+def scan_table(path: str, start: int = 0) -> dict:
+    """
+    {value: (kind, [timestamps], [offsets])} of the rows of a table from byte
+    offset start on (0 skips the header).
+    """
+    found = {}
+    with open(path, "rb") as f:
+        header = next(csv.reader([f.readline().decode()]))
+        indexed = [(i, column_objects(col)) for i, col in enumerate(header)
+                   if col in FOCUS_COLUMNS or col in PATH_COLUMNS]
+        if not indexed or TIMESTAMP not in header:
+            return found
+        ts_col = header.index(TIMESTAMP)
+        offset = max(start, f.tell())
+        f.seek(offset)
+        for line in f:
+            row = next(csv.reader([line.decode()]))
+            timestamp = float(row[ts_col])
+            for i, objects in indexed:
+                if i >= len(row) or row[i] == "":
+                    continue
+                for value, kind in objects(row[i]):
+                    entry = found.get(value)
+                    if entry is None:
+                        entry = found[value] = (kind, [], [])
+                    entry[1].append(timestamp)
+                    entry[2].append(offset)
+            offset += len(line)
+    return found
+
+
+def read_index(db_dir: str, kinds=None):
+    """
+    {"tables": {filename: size}, "objects": {value: {filename: (timestamps,
+    offsets)}}, "kinds": {value: kind}}, or None without a current index.
+    With kinds, only the objects of these kinds are loaded.
+    """
+    path = os.path.join(db_dir, INDEX_FILE)
+    if not os.path.exists(path):
+        return None
+    with np.load(path, allow_pickle=False) as npz:
+        if int(npz["version"]) != INDEX_VERSION:
+            return None
+        arrays = {name: npz[name] for name in npz.files}
+    tables = arrays["tables"].tolist()
+    loaded = np.ones(len(arrays["values"]), dtype=bool)
+    if kinds is not None:
+        loaded = np.isin(arrays["kinds"], list(kinds))
+    entries = np.flatnonzero(loaded[arrays["entry_values"]])
+    values = arrays["values"][arrays["entry_values"][entries]].tolist()
+    starts = arrays["entry_starts"]
+    objects = {}
+    for i, value, table_id in zip(entries.tolist(), values, arrays["entry_tables"][entries].tolist()):
+        rows = slice(starts[i], starts[i + 1])
+        objects.setdefault(value, {})[tables[table_id]] = (arrays["timestamps"][rows], arrays["offsets"][rows])
+    return {
+        "tables": dict(zip(tables, arrays["table_sizes"].tolist())),
+        "objects": objects,
+        "kinds": dict(zip(arrays["values"][loaded].tolist(), arrays["kinds"][loaded].tolist())),
+    }
+
+
+def write_index(db_dir: str, tables: dict, objects: dict, kinds: dict) -> None:
+    # One row range of timestamps/offsets per (value, table) entry
+    table_ids = {filename: i for i, filename in enumerate(tables)}
+    values = list(objects)
+    entry_values, entry_tables, timestamps, offsets = [], [], [], []
+    for value_id, value in enumerate(values):
+        for filename, (ts, off) in objects[value].items():
+            entry_values.append(value_id)
+            entry_tables.append(table_ids[filename])
+            timestamps.append(ts)
+            offsets.append(off)
+    lengths = [len(ts) for ts in timestamps]
+    np.savez(os.path.join(db_dir, INDEX_FILE),
+             version=np.array(INDEX_VERSION),
+             tables=np.array(list(tables), dtype=str),
+             table_sizes=np.array(list(tables.values()), dtype="int64"),
+             values=np.array(values, dtype=str),
+             kinds=np.array([kinds[value] for value in values], dtype=str),
+             entry_values=np.array(entry_values, dtype="int64"),
+             entry_tables=np.array(entry_tables, dtype="int64"),
+             entry_starts=np.concatenate([[0], np.cumsum(lengths, dtype="int64")]).astype("int64"),
+             timestamps=np.concatenate(timestamps) if timestamps else np.empty(0),
+             offsets=np.concatenate(offsets) if offsets else np.empty(0, dtype="int64"))
+
+
+def build_index(db_dir: str, filenames: list, append_filenames=()) -> None:
+    """
+    Indexes the tables in filenames. Tables in append_filenames only had rows
+    appended since the previous index, which is reused up to the size it had
+    recorded for them.
+    """
+    previous = read_index(db_dir) or {"tables": {}, "objects": {}, "kinds": {}}
+    tables = {}
+    objects = {}
+    kinds = {}
+    for filename in filenames:
+        path = os.path.join(db_dir, filename)
+        size = os.path.getsize(path)
+        start = 0
+        old_size = previous["tables"].get(filename)
+        if filename in append_filenames and old_size is not None and old_size <= size:
+            start = old_size
+            for value, by_table in previous["objects"].items():
+                if filename in by_table:
+                    objects.setdefault(value, {})[filename] = by_table[filename]
+                    kinds[value] = previous["kinds"][value]
+        tables[filename] = size
+        for value, (kind, timestamps, offsets) in scan_table(path, start).items():
+            kinds[value] = kind
+            by_table = objects.setdefault(value, {})
+            old_ts, old_offsets = by_table.get(filename, (np.empty(0), np.empty(0, dtype="int64")))
+            ts = np.concatenate([old_ts, np.array(timestamps, dtype="float64")])
+            off = np.concatenate([old_offsets, np.array(offsets, dtype="int64")])
+            order = np.argsort(ts, kind="stable")
+            by_table[filename] = (ts[order], off[order])
+
+    write_index(db_dir, tables, objects, kinds)
+
+
+class FocusIndex:
+    """Reader for focus_index.npz, answers which rows mention an object."""
+
+    def __init__(self, db_dir: str):
+        self.db_dir = db_dir
+        index = read_index(db_dir)
+        if index is None:
+            raise FileNotFoundError("No " + INDEX_FILE + " in " + db_dir + ", run parser.py first")
+        self.objects = index["objects"]
+        self.kinds = index["kinds"]
+
+    def list_objects(self, kind: str = None) -> list:
+        return sorted(v for v, k in self.kinds.items() if kind is None or k == kind)
+
+    def lookup(self, obj: str, start=None, end=None) -> dict:
+        # {table filename: byte offsets} of the rows with start <= timestamp < end
+        found = {}
+        for filename, (ts, offsets) in self.objects.get(obj, {}).items():
+            lo = 0 if start is None else np.searchsorted(ts, start, "left")
+            hi = len(ts) if end is None else np.searchsorted(ts, end, "left")
+            if lo < hi:
+                found[filename] = offsets[lo:hi]
+        return found
+
+    def read_rows(self, filename: str, offsets) -> pd.DataFrame:
+        lines = []
+        with open(os.path.join(self.db_dir, filename), "rb") as f:
+            header = f.readline().decode()
+            for offset in offsets:
+                f.seek(offset)
+                lines.append(f.readline().decode())
+        # Ids stay strings, e.g. volume ids are not turned into numbers
+        df = pd.read_csv(io.StringIO(header + "".join(lines)), dtype=str, keep_default_na=False)
+        df[TIMESTAMP] = pd.to_numeric(df[TIMESTAMP])
+        df.insert(0, "table", filename)
+        return df
+
+    def records(self, obj: str, start=None, end=None) -> pd.DataFrame:
+        """All rows of every table mentioning obj with start <= timestamp < end, by timestamp."""
+        frames = [self.read_rows(filename, offsets) for filename, offsets in self.lookup(obj, start, end).items()]
+        if not frames:
+            return pd.DataFrame(columns=["table", TIMESTAMP])
+        return pd.concat(frames, ignore_index=True).sort_values(TIMESTAMP, kind="stable", ignore_index=True)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Look up the rows of the parsed tables mentioning an object")
+    arg_parser.add_argument("db_dir", help="database directory written by parser.py")
+    arg_parser.add_argument("objects", nargs="*", help="pod UIDs, pod names, PV names, volume ids or nodes")
+    arg_parser.add_argument("--start", type=float, help="Only rows at or after this epoch time")
+    arg_parser.add_argument("--end", type=float, help="Only rows before this epoch time")
+    arg_parser.add_argument("--list", metavar="KIND", nargs="?", const="",
+                            help="List the indexed objects, optionally of one kind: " +
+                                 ", ".join(sorted(set(FOCUS_COLUMNS.values()))))
+    args = arg_parser.parse_args()
+
+    index = FocusIndex(args.db_dir)
+    if args.list is not None:
+        for obj in index.list_objects(args.list or None):
+            print(index.kinds[obj], obj)
+    for obj in args.objects:
+        print(index.records(obj, args.start, args.end).to_string())
+
+
+if __name__ == "__main__":
+    main()
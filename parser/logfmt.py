@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""
+Tokenizer for the logfmt payload of the portworx lines in docker.out:
+
+    time="2022-09-05T15:11:25Z" level=info msg="Storage is ready" file="driver.go:2150" component=porx/storage/driver/volume
+
+fields() splits a line into its key=value pairs in one regex scan, with the
+quotes and escapes of the values removed. A quoted value missing its closing
+quote, e.g. a message wrapped over two journal lines, runs to the end of
+the line. A LogLine with a field scopes its regex to that value (usually
+msg), so the pattern is written against the message as it was logged,
+without the escaping of the raw line.
+
+Several LogLines of a line share one tokenization: the fields of the last
+line are kept until another line comes.
+"""
+
+import re
+
+# Fields most portworx lines have
+TIME = "time"
+LEVEL = "level"
+MSG = "msg"
+FILE = "file"
+COMPONENT = "component"
+
+PAIR_RE = re.compile(r'([\w.\-]+)=(?:"((?:[^"\\\n]|\\.)*)"?|(\S*))')
+ESCAPE_RE = re.compile(r"\\(.)")
+
+_last_line = None
+_last_fields = None
+
+
+def parse(text: str) -> dict:
+    fields = {}
+    for key, quoted, bare in PAIR_RE.findall(text):
+        if key in fields:
+            continue
+        if "\\" in quoted:
+            quoted = ESCAPE_RE.sub(r"\1", quoted)
+        fields[key] = quoted or bare
+    return fields
+
+
+def fields(line: str) -> dict:
+    global _last_line, _last_fields
+    if line is not _last_line:
+        _last_fields = parse(line)
+        _last_line = line
+    return _last_fields
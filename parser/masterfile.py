@@ -6,52 +6,115 @@ Created on Sat Sep 24 12:06:12 2022
 @author: nrevanna
 """
 
-import calendar
+import csv
 import hashlib
 import re
 import time
-import datetime
 import pandas as pd
 import os
 
+import columns
+import focus
+import logfmt
+import matcher
+import profiling
+import store
+import templates
+import timestamps
+
+HEADER_RE = re.compile(r"""(?P<timestamp>\w{3} \d{2} \d{2}:\d{2}:\d{2}) (?P<node_name>\S+) (?P<portworx_process>\S+) (?P<rest>.*)""")
+
 class LogLine:
     TIMESTAMP = "timestamp"
     NODE_NAME = "node_name"    
     REST = "rest"
     
-    def __init__(self, pattern_name: str, pattern: str, logfile: str):
+    def __init__(self, pattern_name: str, pattern: str, logfile: str, field: str = None, level=None,
+                 component: str = None, field_columns: tuple = ()):
         self.pattern = pattern
         self.pattern_name = pattern_name
-        self.column_names = list(re.compile(pattern).groupindex.keys())
+        self.regex = re.compile(pattern)
+        self.column_names = list(self.regex.groupindex.keys())
         self.logfile = logfile
         self.df = {}
         self.all_sections = {}
+        # The regex only runs on this logfmt field (see logfmt.py) of the lines
+        # whose level is one of level and whose component starts with component
+        self.field = field
+        self.level = {level} if isinstance(level, str) else level
+        self.component = component
+        # logfmt fields added to the table after the regex groups. Empty by
+        # default: the Go readers (pkg/hawkeye) expect an exact column count.
+        self.field_columns = tuple(field_columns)
+        self.uses_fields = field is not None or level is not None or component is not None or bool(field_columns)
+
+    def search(self, line: str):
+        if not self.uses_fields:
+            return self.regex.search(line)
+        fields = logfmt.fields(line)
+        if self.level is not None and fields.get(logfmt.LEVEL) not in self.level:
+            return None
+        if self.component is not None and not fields.get(logfmt.COMPONENT, "").startswith(self.component):
+            return None
+        text = line if self.field is None else fields.get(self.field)
+        if text is None:
+            return None
+        return self.regex.search(text)
     
         
+    def table_columns(self) -> list:
+        # Header of the table, in the order found_a_pattern adds the columns
+        return [self.TIMESTAMP, self.NODE_NAME] + self.column_names + list(self.field_columns)
+
     def get_table_name(self) -> str:
         p = self.pattern_name.replace(r'[<>:"/\\|?*]', '').replace(' ', '_')
         return "table_" + p + ".csv"
 
-    def found_a_pattern(self, line: str) -> None:
-        grp = re.match(r"""(?P<timestamp>\w{3} \d{2} \d{2}:\d{2}:\d{2}) (?P<node_name>\S+) (?P<portworx_process>\S+) (?P<rest>.*)""",line)            
+    def found_a_pattern(self, line: str, decoder: timestamps.TimestampDecoder) -> int:
+        # Returns roughly how many bytes the new row takes in the column buffers
+        grp = HEADER_RE.match(line)
+        if grp is None:
+            # Not a journal line, e.g. a line the journal wrapped: no row
+            return 0
         timestamp = grp.group(self.TIMESTAMP)
         node_name = grp.group(self.NODE_NAME)
         rest = grp.group(self.REST)
-        timestamp = calendar.timegm(datetime.datetime.strptime("2022 "+timestamp, "%Y %b %d %H:%M:%S").timetuple())
+        timestamp = decoder.decode(timestamp, rest)
         self.add_to_dict(self.TIMESTAMP, timestamp)
         self.add_to_dict(self.NODE_NAME, node_name)
-        f = re.finditer(self.pattern, rest)
+        size = 2 * columns.POINTER_SIZE
+        if self.field is not None:
+            rest = logfmt.fields(line).get(self.field, "")
+        f = self.regex.finditer(rest)
         group_lst = [m.groupdict() for m in f]
         for each in group_lst:   
             for key in each.keys():
                 self.add_to_dict(key, each[key])  
+                if key in columns.NAME_COLUMNS:
+                    size += columns.POINTER_SIZE
+                else:
+                    size += columns.value_size(each[key])
+        for col in self.field_columns:
+            val = logfmt.fields(line).get(col)
+            self.add_to_dict(col, val)
+            size += columns.value_size(val)
+        return size
 
+    def add_to_dict(self, col: str, val: str):
+        column = self.df.get(col)
+        if column is None:
+            column = self.df[col] = columns.new_column(col)
+        column.append(val)
 
+    def extend_column(self, col: str, vals) -> None:
+        column = self.df.get(col)
+        if column is None:
+            column = self.df[col] = columns.new_column(col)
+        column.extend(vals)
 
-    def add_to_dict(self, col: str, val: str):
-        lst = self.df.get(col, [])
-        lst.append(val)
-        self.df[col] = lst
+    def get_dataframe(self) -> pd.DataFrame:
+        data = {col: columns.as_data(column) for col, column in self.df.items()}
+        return pd.DataFrame(data, columns=list(self.df.keys()))
             
     
 
@@ -65,91 +128,272 @@ class MasterFile:
         #Cheatsheet
         # if the original string contains " -> \\\"
         # if the original string contains \" -> \\\\\"
+        # Patterns with field=logfmt.MSG run on the unquoted, unescaped msg="..." of
+        # the line and need none of the above. level=/component= only run them on
+        # lines of that level/component, field_columns= adds fields as columns.
         LogLine("PX Started", r"Started px with pid (?P<pid>\d+)", PX_LOG),
 
         # Sep 05 15:09:35 ip-10-13-112-170.pwx.dev.purestorage.com portworx[1300]: PXPROCS[INFO]: px-storage exited with code: 9
         LogLine("PX Storage Exited", r"px-storage exited with code: (?P<exit_code>\d+)", PX_LOG),
 
         # Sep 05 15:11:25 ip-10-13-112-170.pwx.dev.purestorage.com portworx[1300]: time="2022-09-05T15:11:25Z" level=info msg="Storage is ready" file="driver.go:2150" Driver=pxd Function=NodeStart component=porx/storage/driver/volume
-        LogLine("Storage is ready", r"Storage is ready", PX_LOG),
+        LogLine("Storage is ready", r"Storage is ready", PX_LOG, field=logfmt.MSG),
 
         # Sep 05 15:11:33 ip-10-13-112-170.pwx.dev.purestorage.com portworx[1300]: time="2022-09-05T15:11:33Z" level=info msg="PX is ready on Node: 4acd1fe2-6615-4b1f-95ff-75ef8d135faa. CLI accessible at /opt/pwx/bin/pxctl." file="px.go:758" component=porx/px
-        LogLine("PX Daemon Ready", r"PX is ready on Node: (?P<node_id>\S+)\. CLI accessible", PX_LOG),
+        LogLine("PX Daemon Ready", r"PX is ready on Node: (?P<node_id>\S+)\. CLI accessible", PX_LOG, field=logfmt.MSG),
 
         # Sep 01 21:41:31 nthakur-k8s-1-node4 portworx[1351]: 2022-09-01 21:41:31,402 INFO stopped: pxdaemon (exit status 0)
         # Sep 05 15:09:38 ip-10-13-112-170.pwx.dev.purestorage.com portworx[1300]: 2022-09-05 15:09:38,407 INFO exited: pxdaemon (exit status 9; not expected)
         LogLine("PX Daemon Exited", r"INFO (?P<service_status>\S+): pxdaemon.*exit status (?P<exit_code>\d+)(?P<exit_descr>.*)", PX_LOG),
 
-        LogLine("KVDB Setup Failed", r"""failed to setup internal kvdb: (?P<error_msg>[^"]+)""", PX_LOG),
+        LogLine("KVDB Setup Failed", r"""failed to setup internal kvdb: (?P<error_msg>.+)""", PX_LOG, field=logfmt.MSG),
 
         #Sep 05 15:11:40 ip-10-13-112-170.pwx.dev.purestorage.com portworx[1300]: time="2022-09-05T15:11:40Z" level=info msg="csi.NodePublishVolume request received. VolumeID: 920849628428829313, TargetPath: /var/lib/kubelet/pods/5a21d20f-cacd-43fe-be3e-194c34c673cd/volumes/kubernetes.io~csi/pvc-0d81053d-6952-404d-b213-2adea82bc609/mount" component=csi-driver correlation-id=b150fe93-d7ca-4293-9e55-9bc4fef2adf3 origin=csi-driver
-        LogLine("NodePublishVolume Request", r"""csi.NodePublishVolume request received. VolumeID: (?P<vol_id>\d+), TargetPath: (?P<target_path>\S+)""", PX_LOG),
+        LogLine("NodePublishVolume Request", r"""csi.NodePublishVolume request received. VolumeID: (?P<vol_id>\d+), TargetPath: (?P<target_path>\S+)""", PX_LOG, field=logfmt.MSG),
 
         #################################### kubelet.out #####################################
 
-        #Sep 05 14:08:40 ip-10-13-112-170.pwx.dev.purestorage.com k3s[6839]: I0905 14:08:40.126274   6839 operation_generator.go:658] "MountVolume.MountDevice succeeded for volume \"pvc-251d77bd-f5ac-4c82-9aca-f767058167e4\" (UniqueName: \"kubernetes.io/csi/pxd.portworx.com^555410506377584416\") pod \"nginx-6b5d97d5cb-vfp6l\" (UID: \"6441dfed-9989-4d74-abfd-0e5d3ae66995\") device mount path \"/var/lib/kubelet/plugins/   kubernetes.io/csi/pxd.portworx.com/fb7a950c5cc4988077f9656465ac58fc546cc96dd2792fedd3bbc32e0193ee19/globalmount\"" pod="nginx-sharedv4-setupteardown-0-09-05-14h07m47s/nginx-6b5d97d5cb-vfp6l"
+        #Sep 05 14:08:40 ip-10-13-112-170.pwx.dev.purestorage.com k3s[6839]: I0905 14:08:40.126274   6839 operation_generator.go:658] "MountVolume.MountDevice succeeded for volume \"pvc-251d77bd-f5ac-4c82-9aca-f767058167e4\" (UniqueName: \"kubernetes.io/csi/pxd.portworx.com^555410506377584416\") pod \"nginx-6b5d97d5cb-vfp6l\" (UID: \"6441dfed-9989-4d74-abfd-0e5d3ae66995\") device mount path \"/var/lib/kubelet/plugins/kubernetes.io/csi/pxd.portworx.com/fb7a950c5cc4988077f9656465ac58fc546cc96dd2792fedd3bbc32e0193ee19/globalmount\"" pod="nginx-sharedv4-setupteardown-0-09-05-14h07m47s/nginx-6b5d97d5cb-vfp6l"
         LogLine("MountDevice Succeeded", r"""MountVolume.MountDevice succeeded for volume \\\\\"(?P<pv_name>\S+)\\\\\" .*UID\: \\\\\"(?P<UID>[\w\-]+).* device mount path \\\\\"(?P<device_path>\S+)\\\\\"\\\".* pod=\\\"(?P<pod_name>\S+)\\\"""", KUBECTL_LOG),
 
+        #Sep 05 14:00:44 ip-10-13-112-170.pwx.dev.purestorage.com k3s[6839]: I0905 14:00:44.109079    6839 reconciler.go:342] "operationExecutor.VerifyControllerAttachedVolume started for volume \"kube-api-access-g6hlc\" (UniqueName: \"kubernetes.io/projected/18599dbc-cab3-44aa-9ab2-cf11b0f481f8-kube-api-access-g6hlc\") pod \"stork-7ff877c64-4ddf8\" (UID: \"18599dbc-cab3-44aa-9ab2-cf11b0f481f8\") " pod="kube-system/stork-7ff877c64-4ddf8"
         #LogLine('operationExecutor.VerifyControllerAttachedVolume started for volume.*UniqueName:.*\\\\\"(?P<unique_name>\S+)\\\\\".*pod.*\\\\\"(?P<pod_name>\S+)\\\\\".*\(UID: \\\\\"(?P<UID>\S+)\\\\\".*pod=\\\"(?P<pod_full_name>\S+)\\\"',[], KUBECTL_LOG),
         LogLine("VerifyControllerAttachedVolume Started", r'operationExecutor.VerifyControllerAttachedVolume started for volume.*UniqueName:.*\\\\\"(?P<unique_name>\S+)\\\\\".*pod.*\\\\\"(?P<pod_name>\S+)\\\\\".*\(UID: \\\\\"(?P<UID>\S+)\\\\\".*pod=\\\"(?P<pod_full_name>\S+)\\\"',KUBECTL_LOG),
 
         # Clouddrive Logs
         #Sep 27 03:40:36 ip-192-168-85-22.ec2.internal portworx[28442]: time="2022-09-27T03:40:36Z" level=warning msg="Failed to find locally attached drive set: drive set not found" file="clouddrive.go:141" component=porx/px/config/identity
-        LogLine("No Locally Attached Drive Set", r"""Failed to find locally attached drive set: drive set not found""", PX_LOG),
+        LogLine("No Locally Attached Drive Set", r"""Failed to find locally attached drive set: drive set not found""", PX_LOG, field=logfmt.MSG),
         #Sep 27 03:40:37 ip-192-168-85-22.ec2.internal portworx[28442]: time="2022-09-27T03:40:37Z" level=warning msg="Unable to start as a storage node: Limit for maximum storage nodes (1) in the zone (us-east-1c) reached" file="cloud_drive.go:1633" component=porx/storage/hal/provider
-        LogLine("Maximum Storage Nodes Reached", r"""Unable to start as a storage node: Limit for maximum storage nodes""", PX_LOG),
+        LogLine("Maximum Storage Nodes Reached", r"""Unable to start as a storage node: Limit for maximum storage nodes""", PX_LOG, field=logfmt.MSG),
         #Sep 27 03:40:37 ip-192-168-11-60.ec2.internal portworx[28922]: time="2022-09-27T03:40:37Z" level=info msg="Created drive vol-028b1ebe6572d7322" file="aws_storage.go:310" component=porx/storage/hal/provider/aws
-        LogLine("Cloud Drive Created", r"""Created drive (?P<drive_id>\S+)\\\"""", PX_LOG),
+        LogLine("Cloud Drive Created", r"""^Created drive (?P<drive_id>\S+)$""", PX_LOG, field=logfmt.MSG),
         #Sep 27 03:40:42 ip-192-168-11-60.ec2.internal portworx[28922]: time="2022-09-27T03:40:42Z" level=info msg="Successfully attached the Drive Set" file="cloud_drive.go:2463" component=porx/storage/hal/provider
-        LogLine("Drive Set Attached Successfully", r"""Successfully attached the Drive Set""", PX_LOG),
+        LogLine("Drive Set Attached Successfully", r"""Successfully attached the Drive Set""", PX_LOG, field=logfmt.MSG),
         #Sep 27 03:40:38 ip-192-168-85-22.ec2.internal portworx[28442]: time="2022-09-27T03:40:38Z" level=info msg="Cloud driver provider indicated that node cannot contribute storage as: cannot create more drives as max count limit for drive sets reached.. Starting node as storage less." file="clouddrive.go:209" component=porx/px/config/identity
-        LogLine("Maximum Drive Sets Reached", r"""Cloud driver provider indicated that node cannot contribute storage as: cannot create more drives as max count limit for drive sets reached.. Starting node as storage less.""", PX_LOG),
+        LogLine("Maximum Drive Sets Reached", r"""Cloud driver provider indicated that node cannot contribute storage as: cannot create more drives as max count limit for drive sets reached.. Starting node as storage less.""", PX_LOG, field=logfmt.MSG),
 
         # KVDB Logs
         #Sep 27 06:08:35 ip-192-168-11-60.ec2.internal portworx[4245]: time="2022-09-27T06:08:35Z" level=info msg="Bootstraping internal kvdb service." file="kvstore.go:156" component=porx/px/kvstore fn=kv-store.New id=16a99325-4507-431b-b3cc-f01f7f819f96
-        LogLine("KVDB Bootstrapping", r"""Bootstraping internal kvdb service.""", PX_LOG),
+        LogLine("KVDB Bootstrapping", r"""Bootstraping internal kvdb service.""", PX_LOG, field=logfmt.MSG),
         #Sep 27 16:12:09 ip-192-168-93-84.ec2.internal portworx[6902]: time="2022-09-27T16:12:09Z" level=info msg="initialized internal kvdb" file="boot.go:772" component=porx/px/boot fields.func=init func= package=boot
-        LogLine("Initialized Internal KVDB", r"""initialized internal kvdb""", PX_LOG),
+        LogLine("Initialized Internal KVDB", r"""initialized internal kvdb""", PX_LOG, field=logfmt.MSG),
         #Sep 27 06:08:39 ip-192-168-85-22.ec2.internal portworx[22149]: time="2022-09-27T06:08:39Z" level=info msg="Kvdb rule storage-rule instructed to not proceed with provisioning: Storage less node detected. Node cannot act as a kvdb node. Waiting for other nodes to start kvdb. To start kvdb on this storage less node, label this node as a metadata node and restart Portworx." file="kvprovision.go:339" component=porx/px/kvstore fn=kvdb-provisioner.CanProvisionKvdb id=7250b84e-bd3b-4a64-9b48-20b1233efaa2
-        LogLine("KVDB Not Provisioning On Storageless", r"""Kvdb rule storage-rule instructed to not proceed with provisioning: : Storage less node detected""", PX_LOG),
+        LogLine("KVDB Not Provisioning On Storageless", r"""Kvdb rule storage-rule instructed to not proceed with provisioning: : Storage less node detected""", PX_LOG, field=logfmt.MSG),
         #Sep 27 06:09:15 ip-192-168-85-22.ec2.internal portworx[22149]: time="2022-09-27T06:09:15Z" level=info msg="Kvdb operating at maximum capacity. Not starting kvdb on this node." file="kvlistener.go:176" component=porx/px/kvstore fn=kv-listener.JoinComplete id=7250b84e-bd3b-4a64-9b48-20b1233efaa2
-        LogLine("KVDB At Capacity", r"""Kvdb operating at maximum capacity. Not starting kvdb on this node.""", PX_LOG),
+        LogLine("KVDB At Capacity", r"""Kvdb operating at maximum capacity. Not starting kvdb on this node.""", PX_LOG, field=logfmt.MSG),
         #Sep 27 06:08:36 ip-192-168-11-60.ec2.internal portworx[4245]: time="2022-09-27T06:08:36Z" level=info msg="Mounting kvdb device /dev/nvme2n1 at /var/.px_kvdb" file="util.go:41" component=porx/px/kvstore/datadir
-        LogLine("Mounting KVDB Device", r""" Mounting kvdb device""", PX_LOG),
+        LogLine("Mounting KVDB Device", r"""^Mounting kvdb device""", PX_LOG, field=logfmt.MSG),
 
         #Sep 05 15:11:30 ip-10-13-112-170.pwx.dev.purestorage.com k3s[6839]: E0905 15:11:30.204689    6839 nestedpendingoperations.go:335] Operation for "{volumeName:kubernetes.io/csi/pxd.portworx.com^1128534796363700257 podName: nodeName:}" failed. No retries permitted until 2022-09-05 15:11:30.704658565 +0000 UTC m=+4382.3 79734991 (durationBeforeRetry 500ms). Error: MountVolume.SetUp failed for volume "pvc-9c1df276-bdc1-4044-b78c-a2aaff3fd03a" (UniqueName: "kubernetes.io/csi/pxd.portworx.com^1128534796363700257") pod "vdbench-sv4-svc-57678cbc89-prrhl" (UID: "0454503f-4399-46fc-ac26-7ada4ecaaa70") : kubernetes.io/csi: mounter.SetUpAt failed to check for STAGE_UNSTAGE_VOLUME capability: rpc error: code = Unavailable desc = connection error: desc = "transport: Error while dialing dial unix /var/lib/kubelet/plugins/pxd.portworx.com/csi.sock: connect: connection refused"
         LogLine("MountVolume Failed", r"""MountVolume.SetUp failed for volume \\\"(?P<pv_name>\S+)\\\" .*pod \\\"(?P<pod_name>\S+)\\\" .*UID\: \\\"(?P<UID>[\w\-]+)\\\"""", KUBECTL_LOG),
     ]
-    def __init__(self, db_dir: str):
+    def __init__(self, db_dir: str, storage: str = store.CSV, subsecond: bool = False,
+                 memory_limit: int = None, profile: bool = False, fingerprints: list = (),
+                 mine_templates: bool = False):
         self.DB_DIR = db_dir
+        # Fingerprints are matched in the same scan as the patterns but keep
+        # hit counts instead of tables (see fingerprints.py). pattern_ids
+        # index into patterns followed by fingerprints.
+        self.fingerprints = list(fingerprints)
+        self.matchables = list(self.patterns) + self.fingerprints
+        self.storage = storage
+        self.timestamps = timestamps.TimestampDecoder(subsecond)
+        # Per pattern cost, only collected with profile (see profiling.py)
+        self.profile = profile
+        self.stats = {}
+        # Buffered rows are flushed to the tables once they take more than
+        # memory_limit bytes (None: everything is written by save_db_files)
+        self.memory_limit = memory_limit
+        self.buffered_bytes = 0
+        # Patterns whose rows go after the tables of a previous run
+        self.append_patterns = set()
+        # Patterns that already wrote a batch during this run
+        self.flushed = set()
+        self.sqlite_store = None
+        # Compiled once for the whole pattern set, see matcher.py
+        self.matcher = self.new_matcher(self.matchables)
+        self.subset_matchers = {}
+        # Indexes into matchables of the fingerprints of other logs than the
+        # one being parsed, see use_logfile()
+        self.skipped_ids = ()
+        self.logfile_matchers = {(): self.matcher}
+        # Lines no pattern matches are mined into templates (see templates.py),
+        # a fingerprint hit alone does not keep a line from being mined
+        self.miner = templates.TemplateMiner() if mine_templates else None
+        self.table_patterns = set(self.patterns)
         
-    def check_if_exists(self, line) -> None:
-        for idx, logline_obj in enumerate(self.patterns):
-            m = re.findall(logline_obj.pattern, line)
-            '''
-            if "operationExecutor.VerifyControllerAttachedVolume" in line and "operationExecutor.VerifyControllerAttachedVolume" in logline_obj.pattern:
-                print(line)
-                print(logline_obj.pattern)
-                print(m)
-                print("_____")
-            '''
-            if len(m) != 0:
-                self.patterns[idx].found_a_pattern(line)
+    def check_if_exists(self, line, pattern_ids=None) -> None:
+        # pattern_ids restricts the scan to some of the patterns (by index)
+        pattern_matcher = self.matcher
+        if pattern_ids is not None:
+            key = (pattern_ids, self.skipped_ids)
+            pattern_matcher = self.subset_matchers.get(key)
+            if pattern_matcher is None:
+                pattern_matcher = self.new_matcher([self.matchables[i] for i in pattern_ids
+                                                    if i not in self.skipped_ids])
+                self.subset_matchers[key] = pattern_matcher
+        matched = False
+        for logline_obj in pattern_matcher.match(line):
+            matched = matched or logline_obj in self.table_patterns
+            if self.profile:
+                start = time.perf_counter_ns()
+                self.buffered_bytes += logline_obj.found_a_pattern(line, self.timestamps)
+                profiling.get_stats(self.stats, logline_obj.pattern_name).extract_ns += time.perf_counter_ns() - start
+            else:
+                self.buffered_bytes += logline_obj.found_a_pattern(line, self.timestamps)
+        if not matched and self.miner is not None and pattern_ids is None:
+            # A scan for new patterns only goes over lines mined by a previous run
+            self.buffered_bytes += self.miner.add_line(line, self.timestamps)
+        if self.memory_limit is not None and self.buffered_bytes > self.memory_limit:
+            self.flush_tables()
+
+    def use_logfile(self, path: str) -> None:
+        # The lines that follow come from path (without .gz/.zst): a fingerprint
+        # with a Logfile only runs on the lines of that log, the patterns run
+        # on every log
+        skipped = tuple(i for i, fp in enumerate(self.matchables)
+                        if fp not in self.table_patterns and fp.logfile and not path.endswith(fp.logfile))
+        self.skipped_ids = skipped
+        self.matcher = self.logfile_matchers.get(skipped)
+        if self.matcher is None:
+            self.matcher = self.new_matcher([l for i, l in enumerate(self.matchables) if i not in skipped])
+            self.logfile_matchers[skipped] = self.matcher
+
+    def new_matcher(self, loglines: list):
+        if self.profile:
+            return profiling.ProfilingMatcher(loglines, self.stats)
+        return matcher.PatternMatcher(loglines)
+
+    def take_stats(self) -> dict:
+        stats = dict(self.stats)
+        self.stats.clear()
+        return stats
+
+    def take_fingerprints(self) -> list:
+        hits = []
+        for fp in self.fingerprints:
+            hits.append(fp.hits)
+            fp.hits = {}
+        return hits
+
+    def merge_fingerprints(self, hits: list) -> None:
+        for fp, fp_hits in zip(self.fingerprints, hits):
+            for node_name, (count, first, last) in fp_hits.items():
+                fp.add_hit(node_name, count, first, last)
+
+    def take_templates(self):
+        return self.miner.take() if self.miner is not None else None
+
+    def merge_templates(self, state) -> None:
+        if state is not None:
+            self.buffered_bytes += self.miner.merge(state)
+
+    def take_tables(self) -> list:
+        # Column buffers of every pattern, in patterns order. The buffers are
+        # reset so a worker process can reuse this MasterFile for its next chunk.
+        tables = []
+        for logline_obj in self.patterns:
+            tables.append(logline_obj.df)
+            logline_obj.df = {}
+        return tables
+
+    def merge_tables(self, tables: list) -> None:
+        for logline_obj, df in zip(self.patterns, tables):
+            for col, vals in df.items():
+                logline_obj.extend_column(col, vals)
+            self.buffered_bytes += columns.table_bytes(df)
+        if self.memory_limit is not None and self.buffered_bytes > self.memory_limit:
+            self.flush_tables()
+
+    def flush_tables(self) -> None:
+        # Writes the buffered rows of every pattern as one batch and frees them
+        for logline_obj in self.patterns:
+            if len(logline_obj.df) == 0:
+                continue
+            if self.storage in (store.CSV, store.BOTH):
+                self.write_csv_batch(logline_obj)
+            if self.storage in (store.SQLITE, store.BOTH):
+                if self.sqlite_store is None:
+                    self.sqlite_store = store.SQLiteStore(self.DB_DIR, self.timestamps.subsecond)
+                append = logline_obj in self.flushed or (
+                    logline_obj in self.append_patterns and self.sqlite_store.table_exists(store.sql_table_name(logline_obj)))
+                self.sqlite_store.write(logline_obj, append)
+            self.flushed.add(logline_obj)
+            logline_obj.df = {}
+        if self.miner is not None:
+            self.miner.flush(self.DB_DIR)
+        self.buffered_bytes = 0
+
+    def stale_tables(self) -> set:
+        # Patterns whose table from a previous run has other columns (or
+        # column types) than the pattern writes now. Appending would corrupt
+        # them, they are rebuilt.
+        stale = set()
+        sqlite_store = None
+        if self.storage in (store.SQLITE, store.BOTH) and os.path.exists(os.path.join(self.DB_DIR, store.DB_FILE)):
+            sqlite_store = store.SQLiteStore(self.DB_DIR, self.timestamps.subsecond)
+        for logline_obj in self.patterns:
+            expected = logline_obj.table_columns()
+            if self.storage in (store.CSV, store.BOTH):
+                path = os.path.join(self.DB_DIR, logline_obj.get_table_name())
+                if os.path.exists(path):
+                    with open(path, "r", newline="") as f:
+                        header = next(csv.reader(f), [])
+                    if header != expected:
+                        stale.add(logline_obj)
+            if sqlite_store is not None:
+                table = store.sql_table_name(logline_obj)
+                types = [(col, store.column_type(logline_obj, col, self.timestamps.subsecond)) for col in expected]
+                if sqlite_store.table_exists(table) and sqlite_store.table_types(table) != types:
+                    stale.add(logline_obj)
+        if sqlite_store is not None:
+            sqlite_store.close()
+        return stale
+
+    def write_csv_batch(self, logline_obj) -> None:
+        path = os.path.join(self.DB_DIR, logline_obj.get_table_name())
+        append = logline_obj in self.flushed or (logline_obj in self.append_patterns and os.path.exists(path))
+        df = logline_obj.get_dataframe()
+        if append:
+            df.to_csv(path, mode="a", index = False, header=False)
+        else:
+            df.to_csv(path, index = False, header=True)
 
     
-    def save_db_files(self) -> None:
+    def save_db_files(self, append_patterns=None) -> None:
+        # Rows of the patterns in append_patterns are appended to the tables
+        # of a previous run instead of replacing them (incremental re-parse)
+        if append_patterns is not None:
+            self.append_patterns = set(append_patterns)
+        self.flush_tables()
+        if self.profile:
+            profiling.save_stats(self.DB_DIR, self.stats, self.patterns)
+        if self.miner is not None:
+            self.miner.save(self.DB_DIR)
+        if self.storage in (store.CSV, store.BOTH):
+            filenames = self.save_csv_index()
+            focus.build_index(self.DB_DIR, filenames, {l.get_table_name() for l in self.append_patterns})
+        if self.storage in (store.SQLITE, store.BOTH):
+            if self.sqlite_store is None:
+                self.sqlite_store = store.SQLiteStore(self.DB_DIR, self.timestamps.subsecond)
+            self.sqlite_store.finish(self.patterns, self.flushed, self.append_patterns)
+            self.sqlite_store = None
+
+    def save_csv_index(self) -> None:
         #Creating db files
         index = LogLine("", "", "")
         for logline_obj in self.patterns:
             #print(logline_obj.pattern)
-            if len(logline_obj.df) == 0:
-                continue
             filename = logline_obj.get_table_name()
-            df = pd.DataFrame(logline_obj.df, columns=list(logline_obj.df.keys()))
-            df.to_csv(os.path.join(self.DB_DIR, filename),index = False, header=True)
+            path = os.path.join(self.DB_DIR, filename)
+            if logline_obj not in self.flushed:
+                if not (logline_obj in self.append_patterns and os.path.exists(path)):
+                    continue
             index.add_to_dict("logfile", logline_obj.logfile)
             index.add_to_dict("pattern", logline_obj.pattern)
             index.add_to_dict("filename", filename)
+            index.add_to_dict("pattern_name", logline_obj.pattern_name)
 
-        df = pd.DataFrame(index.df, columns=list(index.df.keys()))
+        df = index.get_dataframe()
         df.to_csv(os.path.join(self.DB_DIR, "index.csv"), index = False, header=True)
+        return index.df.get("filename", [])
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+Single-pass matching engine for the MasterFile patterns.
+
+Every pattern is compiled once. For each pattern we extract the longest
+literal run that any match must contain (its "anchor") and fold all the
+anchors into one alternation. A line that does not contain any anchor is
+rejected with a single scan; only the patterns whose anchor is present in
+the line get their full regex evaluated.
+"""
+
+import re
+
+try:
+    from re import _parser as sre_parse
+    from re import _constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_constants
+
+
+def required_literals(pattern: str) -> list:
+    """Literal runs that every match of pattern has to contain."""
+    try:
+        parsed = sre_parse.parse(pattern)
+    except re.error:
+        return []
+    if parsed.state.flags & (re.IGNORECASE | re.VERBOSE):
+        return []
+    runs = []
+    _collect_runs(parsed, runs)
+    return [r for r in runs if r]
+
+
+def _collect_runs(parsed, runs: list) -> None:
+    current = []
+    for op, av in parsed:
+        if op is sre_constants.LITERAL:
+            current.append(chr(av))
+            continue
+        runs.append("".join(current))
+        current = []
+        if op is sre_constants.SUBPATTERN:
+            # Plain groups are mandatory, their literals are required too
+            if not av[1] & re.IGNORECASE:
+                _collect_runs(av[-1], runs)
+    runs.append("".join(current))
+
+
+def digit_groups(pattern: str) -> set:
+    """Named groups of pattern that only ever match digits, e.g. (?P<pid>\\d+)."""
+    try:
+        parsed = sre_parse.parse(pattern)
+    except re.error:
+        return set()
+    names = {index: name for name, index in parsed.state.groupdict.items()}
+    found = set()
+    _collect_digit_groups(parsed, names, found)
+    return found
+
+
+def _only_digits(parsed) -> bool:
+    for op, av in parsed:
+        if op is sre_constants.LITERAL:
+            if not chr(av).isdigit():
+                return False
+        elif op is sre_constants.IN:
+            if not all(o is sre_constants.CATEGORY and a is sre_constants.CATEGORY_DIGIT or
+                       o is sre_constants.RANGE and a == (ord("0"), ord("9")) for o, a in av):
+                return False
+        elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT):
+            if av[0] < 1 or not _only_digits(av[2]):
+                return False
+        else:
+            return False
+    return len(parsed) > 0
+
+
+def _collect_digit_groups(parsed, names: dict, found: set) -> None:
+    for op, av in parsed:
+        if op is sre_constants.SUBPATTERN:
+            if av[0] in names and _only_digits(av[-1]):
+                found.add(names[av[0]])
+            _collect_digit_groups(av[-1], names, found)
+        elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT):
+            _collect_digit_groups(av[2], names, found)
+        elif op is sre_constants.BRANCH:
+            for branch in av[1]:
+                _collect_digit_groups(branch, names, found)
+
+
+# pattern -> anchor
+ANCHORS = {}
+
+
+def anchor_for(pattern: str):
+    if pattern in ANCHORS:
+        return ANCHORS[pattern]
+    literals = required_literals(pattern)
+    anchor = max(literals, key=len) if literals else None
+    ANCHORS[pattern] = anchor
+    return anchor
+
+
+def field_anchor(pattern: str):
+    # Anchor of a pattern run on a logfmt field. The raw line has the field
+    # value quoted and escaped, so the anchor must not span quotes or escapes.
+    pieces = [p for r in required_literals(pattern) for p in re.split(r'["\\]', r) if p]
+    return max(pieces, key=len) if pieces else None
+
+
+def anchor_of(logline):
+    if getattr(logline, "field", None) is not None:
+        return field_anchor(logline.pattern)
+    return anchor_for(logline.pattern)
+
+
+class PatternMatcher:
+    def __init__(self, loglines: list):
+        self.entries = [(anchor_of(l), l) for l in loglines]
+        self.unanchored = [(a, l) for a, l in self.entries if a is None]
+        anchors = sorted({a for a, _ in self.entries if a is not None}, key=len, reverse=True)
+        self.prefilter = None
+        if anchors:
+            self.prefilter = re.compile("|".join(re.escape(a) for a in anchors))
+
+    def match(self, line: str) -> list:
+        """LogLines whose pattern matches line, in MasterFile.patterns order."""
+        candidates = self.entries
+        if self.prefilter is not None and not self.prefilter.search(line):
+            candidates = self.unanchored
+        return [l for a, l in candidates
+                if (a is None or a in line) and l.search(line)]
@@ -1,45 +1,337 @@
 # -*- coding: utf-8 -*-
 
+import argparse
+import bundle
+import checkpoint
+import columns
+import concurrent.futures
+import fingerprints
+import json
 import masterfile
 import os
+import profiling
+import queue
+import search
+import store
 import sys
+import threading
+import time
+
+# Files bigger than this are split into byte ranges parsed by separate workers
+CHUNK_SIZE = 64 * 1024 * 1024
+# Default ceiling for the buffered table rows, in MB
+MEMORY_LIMIT_MB = 1024
+# --follow: seconds between two appends to the tables, lines read ahead at most
+FOLLOW_INTERVAL = 0.5
+FOLLOW_QUEUE_LINES = 10000
+# --follow: lines stamped up to this many seconds ahead of the clock keep the current year
+FOLLOW_CLOCK_SLACK = 86400
+
+_worker_master = None
+
+
+def parse_range(master, logfile: str, start: int, end: int, pattern_ids=None) -> None:
+    if bundle.is_compressed(logfile):
+        # Compressed logs are never split nor resumed (see split_range and
+        # Checkpoint.plan), their range always covers the whole file
+        parse_file(master, logfile, pattern_ids)
+        return
+    master.use_logfile(logfile)
+    # The journal header on the first line anchors the year of the timestamps,
+    # also when parsing a chunk from the middle of the file
+    with open(logfile, "r") as f:
+        master.timestamps.set_header(f.readline(), os.path.getmtime(logfile))
+    with bundle.open_range(logfile, start, end) as stream:
+        for line in stream:
+            master.check_if_exists(line, pattern_ids)
+
+
+def parse_file(master, logfile: str, pattern_ids=None) -> None:
+    with bundle.open_file(logfile) as (name, stream):
+        master.use_logfile(name)
+        header = stream.readline()
+        master.timestamps.set_header(header, os.path.getmtime(logfile))
+        master.check_if_exists(header, pattern_ids)
+        for line in stream:
+            master.check_if_exists(line, pattern_ids)
+
+
+def load_fingerprints(fingerprint_dir) -> list:
+    if fingerprint_dir is None:
+        return []
+    return fingerprints.load_fingerprints(fingerprint_dir)
+
+
+def init_worker(subsecond: bool, profile: bool, fingerprint_dir, mine_templates: bool) -> None:
+    # Runs once in every worker process, each one keeps its own LogLine buffers
+    global _worker_master
+    _worker_master = masterfile.MasterFile(None, subsecond=subsecond, profile=profile,
+                                           fingerprints=load_fingerprints(fingerprint_dir),
+                                           mine_templates=mine_templates)
+
+
+def parse_chunk(logfile: str, start: int, end: int, pattern_ids=None) -> tuple:
+    parse_range(_worker_master, logfile, start, end, pattern_ids)
+    return (_worker_master.take_tables(), _worker_master.take_stats(), _worker_master.take_fingerprints(),
+            _worker_master.take_templates())
+
+
+def read_lines(stream, lines: queue.Queue) -> None:
+    # Reader thread of --follow, None marks the end of the input
+    for line in stream:
+        lines.put(line)
+    lines.put(None)
+
+
+def split_range(logfile: str, start: int, end: int, pattern_ids=None, chunk_size: int = CHUNK_SIZE) -> list:
+    # Splits [start, end) of logfile into ranges that each end right after a newline
+    if bundle.is_compressed(logfile):
+        return [(logfile, start, end, pattern_ids)]
+    ranges = []
+    with open(logfile, "rb") as f:
+        while start < end:
+            chunk_end = start + chunk_size
+            if chunk_end < end:
+                f.seek(chunk_end)
+                f.readline()
+                chunk_end = min(f.tell(), end)
+            else:
+                chunk_end = end
+            ranges.append((logfile, start, chunk_end, pattern_ids))
+            start = chunk_end
+    return ranges
+
 
 class Parser:
-    def __init__(self, root_dir):
+    def __init__(self, root_dir, jobs=1, full=False, storage=store.CSV, subsecond=False,
+                 memory_limit_mb=MEMORY_LIMIT_MB, profile=False, fingerprint_dir=fingerprints.DEFAULT_DIR,
+                 mine_templates=False, search_index=False):
         self.ROOT_DIR = root_dir
-        self.DB_DIR = os.path.join(self.ROOT_DIR, "database")
+        self.jobs = jobs
+        self.full = full
+        self.subsecond = subsecond
+        self.storage = storage
+        self.profile = profile
+        self.fingerprint_dir = fingerprint_dir
+        self.mine_templates = mine_templates
+        self.search_index = search_index
+        self.DB_DIR = os.path.join(bundle.output_dir(self.ROOT_DIR), "database")
         if not os.path.exists(self.DB_DIR):
             os.mkdir(self.DB_DIR, 0o777)
-        self.master = masterfile.MasterFile(self.DB_DIR)
+        self.master = masterfile.MasterFile(self.DB_DIR, storage, subsecond, memory_limit_mb * 1024 * 1024, profile,
+                                            load_fingerprints(fingerprint_dir), mine_templates)
+
+    def checkpoint_options(self) -> dict:
+        # A new storage backend has none of the rows of the previous runs
+        options = {"subsecond": self.subsecond, "storage": self.storage}
+        if self.mine_templates:
+            # Turning the miner on re-parses the logs parsed without it
+            options["templates"] = True
+        return options
 
     def start(self):
+        ckpt = checkpoint.Checkpoint(self.DB_DIR, self.checkpoint_options())
+        if ckpt.followed and not self.full:
+            raise RuntimeError(self.DB_DIR + " holds rows parsed by --follow, which a parse of the logs would "
+                               "overwrite. Parse into another directory, or pass --full to replace them.")
+        if bundle.is_archive(self.ROOT_DIR):
+            # Archives are always parsed in full, there is nothing to resume from
+            if self.jobs > 1:
+                print("--jobs is ignored for archives, their members are streamed in order by a single process")
+            checkpoint.Checkpoint(self.DB_DIR).remove()
+            self.parse_archive()
+            self.save()
+            if self.search_index:
+                print("--search-index seeks into the log files, extract the bundle to index it")
+            return
+
+        # Same members as an archive of the directory would give, .gz/.zst included
         files_to_parse = []
-        for path, subdirs, files in os.walk(self.ROOT_DIR):
-            for name in files:
-                if name.endswith(self.master.PX_LOG):
-                    filename = os.path.join(path, name)
-                    files_to_parse.append(filename)
-
-                # Check if the kubelet log is not empty
-                if name.endswith(self.master.KUBECTL_LOG):
-                    filename = os.path.join(path, name)
-                    if open(filename, "r").read().find("-- No entries --") == -1:
-                        files_to_parse.append(filename)
+        logs = bundle.DirBundle(self.ROOT_DIR).iter_paths((self.master.PX_LOG, self.master.KUBECTL_LOG))
+        for filename in logs:
+            # Check if the kubelet log is not empty
+            if bundle.plain_name(filename).endswith(self.master.KUBECTL_LOG):
+                with bundle.open_file(filename) as (name, stream):
+                    if stream.read().find("-- No entries --") != -1:
+                        continue
+            files_to_parse.append(filename)
 
         print(files_to_parse)
-        for logfile in files_to_parse:
-            for line in open(logfile, "r"):
-                self.master.check_if_exists(line)
+        tasks, self.master.append_patterns = ckpt.plan(files_to_parse, self.master.matchables, self.full,
+                                                       self.master.stale_tables())
+        if self.mine_templates and not ckpt.rebuild:
+            self.master.miner.load(self.DB_DIR)
+        if self.jobs > 1:
+            self.parse_parallel(tasks)
+        else:
+            for task in tasks:
+                parse_range(self.master, *task)
+        self.save()
+        ckpt.save(self.master.matchables)
+        if self.search_index:
+            seekable = [f for f in files_to_parse if not bundle.is_compressed(f)]
+            if len(seekable) < len(files_to_parse):
+                print("--search-index seeks into the log files, decompress the .gz/.zst logs to index them")
+            search.build_index(self.DB_DIR, seekable, ckpt.rebuild)
+
+    def save(self) -> None:
         self.master.save_db_files()
+        if self.master.fingerprints:
+            fingerprints.save_results(self.DB_DIR, self.master.fingerprints, self.master.append_patterns)
+
+    def follow(self, source: str, interval: float = FOLLOW_INTERVAL, out=sys.stdout) -> None:
+        """
+        Parses journal lines from stdin ("-") or a FIFO as they arrive. Every
+        interval the rows matched since the last batch are printed to out as
+        JSON lines and appended to the tables, so memory stays bounded
+        however long it runs. The index and fingerprint results are written
+        at the end of the input or on Ctrl-C. The checkpoint records that the
+        tables hold streamed rows, see checkpoint.py.
+        """
+        stream = sys.stdin if source == "-" else open(source, "r")
+        if source != "-":
+            self.master.use_logfile(source)
+        lines = queue.Queue(FOLLOW_QUEUE_LINES)
+        threading.Thread(target=read_lines, args=(stream, lines), daemon=True).start()
+        # Tables with another layout than the patterns write now start over
+        self.master.append_patterns = set(self.master.patterns) - self.master.stale_tables()
+        ckpt = checkpoint.Checkpoint(self.DB_DIR, self.checkpoint_options())
+        if self.mine_templates:
+            self.master.miner.load(self.DB_DIR)
+        # A batch is also cut when its rows reach the memory limit
+        memory_limit, self.master.memory_limit = self.master.memory_limit, None
+        self.master.timestamps.begin_year = None
+        seen = {}
+        done = False
+        try:
+            while not done:
+                self.master.timestamps.set_end(time.gmtime(time.time() + FOLLOW_CLOCK_SLACK))
+                deadline = time.monotonic() + interval
+                while self.master.buffered_bytes <= memory_limit:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        line = lines.get(timeout=timeout)
+                    except queue.Empty:
+                        break
+                    if line is None:
+                        done = True
+                        break
+                    self.master.check_if_exists(line)
+                if self.emit_batch(out, seen):
+                    ckpt.save_follow(self.master.matchables)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.master.memory_limit = memory_limit
+            self.save()
+            ckpt.save_follow(self.master.matchables)
+
+    def emit_batch(self, out, seen: dict) -> bool:
+        # seen is (fingerprint, node) -> matches already reported. Returns
+        # whether rows were written to the tables.
+        for logline_obj in self.master.patterns:
+            if len(logline_obj.df) == 0:
+                continue
+            cols = list(logline_obj.df)
+            for values in zip(*(columns.as_data(logline_obj.df[col]) for col in cols)):
+                record = {"pattern_name": logline_obj.pattern_name}
+                record.update(zip(cols, values))
+                out.write(json.dumps(record) + "\n")
+        for fp in self.master.fingerprints:
+            for node_name, (count, first, last) in fp.hits.items():
+                if count > seen.get((fp, node_name), 0):
+                    out.write(json.dumps({"fingerprint": fp.pattern_name, "failure_on_match": fp.failure_on_match,
+                                          "node_name": node_name, "new_matches": count - seen.get((fp, node_name), 0),
+                                          "last_timestamp": last}) + "\n")
+                    seen[(fp, node_name)] = count
+        if self.mine_templates:
+            for template, node_name in self.master.miner.take_new():
+                out.write(json.dumps({"new_template": template.template_id, "template": " ".join(template.tokens),
+                                      "node_name": node_name, "timestamp": template.nodes[node_name][1]}) + "\n")
+        out.flush()
+        if self.master.buffered_bytes == 0:
+            # No row or template line since the last batch
+            return False
+        flushed = len(self.master.flushed)
+        self.master.flush_tables()
+        if len(self.master.flushed) > flushed and self.master.storage in (store.CSV, store.BOTH):
+            # A new table, list it in index.csv right away
+            self.master.save_csv_index()
+        return True
+
+    def parse_archive(self) -> None:
+        # Members are streamed straight out of the archive, in archive order.
+        # Empty kubelet logs only contain "-- No entries --" and match nothing.
+        members = bundle.open_bundle(self.ROOT_DIR).iter_members((self.master.PX_LOG, self.master.KUBECTL_LOG))
+        for name, stream in members:
+            print(name)
+            self.master.use_logfile(name)
+            header = stream.readline()
+            self.master.timestamps.set_header(header)
+            self.master.check_if_exists(header)
+            for line in stream:
+                self.master.check_if_exists(line)
+
+    def parse_parallel(self, tasks: list) -> None:
+        chunks = []
+        for task in tasks:
+            chunks.extend(split_range(*task))
+        if not chunks:
+            return
+        # map() yields results in submission order, so merging them gives the
+        # same row order as a serial run
+        with concurrent.futures.ProcessPoolExecutor(max_workers=self.jobs, initializer=init_worker,
+                                                    initargs=(self.subsecond, self.profile,
+                                                              self.fingerprint_dir, self.mine_templates)) as pool:
+            for tables, stats, fingerprint_hits, template_state in pool.map(parse_chunk, *zip(*chunks)):
+                self.master.merge_templates(template_state)
+                self.master.merge_tables(tables)
+                profiling.merge_stats(self.master.stats, stats)
+                self.master.merge_fingerprints(fingerprint_hits)
 
 
 def main():
-    if len(sys.argv) != 2:
-        print("Error: Specify the directory to parse")
-        exit(1)
-    root_dir = sys.argv[1]
-    parser = Parser(root_dir)
-    parser.start()
+    arg_parser = argparse.ArgumentParser(description="Parse diags to build the database")
+    arg_parser.add_argument("root_dir", help="Directory or diag bundle (.tar, .tar.gz, .gz, .zst) to parse")
+    arg_parser.add_argument("-j", "--jobs", type=int, default=1,
+                            help="Number of worker processes (default: 1)")
+    arg_parser.add_argument("--full", action="store_true",
+                            help="Ignore the checkpoint and re-parse every file from the start")
+    arg_parser.add_argument("--storage", choices=store.STORAGE_CHOICES, default=store.CSV,
+                            help="csv tables (default), a typed sqlite database (" + store.DB_FILE + ") or both")
+    arg_parser.add_argument("--subsecond", action="store_true",
+                            help="Add the sub-second part of time=\"...\"/klog times to the timestamps")
+    arg_parser.add_argument("--memory-limit", type=int, default=MEMORY_LIMIT_MB, metavar="MB",
+                            help="Flush buffered rows to the tables above this size (default: %(default)s)")
+    arg_parser.add_argument("--profile", action="store_true",
+                            help="Time every pattern and write " + profiling.STATS_FILE + " next to index.csv")
+    arg_parser.add_argument("--fingerprints", default=fingerprints.DEFAULT_DIR, metavar="DIR",
+                            help="Directory of fingerprint *.json files evaluated in the same pass (default: %(default)s)")
+    arg_parser.add_argument("--no-fingerprints", dest="fingerprints", action="store_const", const=None,
+                            help="Do not evaluate fingerprints")
+    arg_parser.add_argument("--templates", action="store_true",
+                            help="Mine the lines no pattern matches into templates, see parser/templates.py. "
+                                 "Parsing takes about 3x as long")
+    arg_parser.add_argument("--search-index", action="store_true",
+                            help="Index every line of the logs for parser/search.py")
+    arg_parser.add_argument("--follow", nargs="?", const="-", metavar="FIFO",
+                            help="Parse journalctl -f style lines from stdin (or FIFO) as they arrive, print the "
+                                 "matched records as JSON lines and append them to root_dir/database")
+    arg_parser.add_argument("--interval", type=float, default=FOLLOW_INTERVAL, metavar="SECONDS",
+                            help="--follow: seconds between two batches (default: %(default)s)")
+    args = arg_parser.parse_args()
+    parser = Parser(args.root_dir, args.jobs, args.full, args.storage, args.subsecond, args.memory_limit,
+                    args.profile, args.fingerprints, args.templates, args.search_index)
+    if args.follow is not None:
+        parser.follow(args.follow, args.interval)
+    else:
+        try:
+            parser.start()
+        except RuntimeError as e:
+            print("Error: " + str(e))
+            exit(1)
 
 
 
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+Opt-in cost instrumentation for the MasterFile patterns (parser.py --profile).
+
+ProfilingMatcher times every regex the matching engine runs and the group
+extraction of every hit. Per LogLine it records the lines tested, the hits,
+the cumulative time, the slowest lines and the time per line length bucket.
+From the buckets we fit time ~ length^k; k well above 1 means the pattern
+backtracks, its cost grows super-linearly with the line length.
+
+The results are written next to index.csv:
+- pattern_stats.csv          one row per pattern, most expensive first
+- pattern_slowest_lines.csv  the slowest lines of every pattern
+"""
+
+import csv
+import heapq
+import math
+import os
+import time
+
+import matcher
+
+STATS_FILE = "pattern_stats.csv"
+SLOWEST_LINES_FILE = "pattern_slowest_lines.csv"
+PREFILTER = "(prefilter)"
+SLOWEST_LINES = 5
+SLOW_LINE_CHARS = 500
+# Exponent of time vs line length above which a pattern is flagged
+SUPERLINEAR_EXPONENT = 1.5
+# Line length buckets need this many lines to take part in the fit
+MIN_BUCKET_LINES = 5
+
+
+class PatternStats:
+    def __init__(self, name: str):
+        self.name = name
+        self.tested = 0
+        self.hits = 0
+        self.match_ns = 0
+        self.extract_ns = 0
+        self.max_ns = 0
+        self.slowest = []
+        # line length bit_length -> [lines, total length, total ns]
+        self.buckets = {}
+
+    def add(self, ns: int, line: str, hit: bool) -> None:
+        self.tested += 1
+        self.match_ns += ns
+        if hit:
+            self.hits += 1
+        if ns > self.max_ns:
+            self.max_ns = ns
+        if len(self.slowest) < SLOWEST_LINES:
+            heapq.heappush(self.slowest, (ns, len(line), line[:SLOW_LINE_CHARS]))
+        elif ns > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, (ns, len(line), line[:SLOW_LINE_CHARS]))
+        bucket = self.buckets.get(len(line).bit_length())
+        if bucket is None:
+            bucket = self.buckets[len(line).bit_length()] = [0, 0, 0]
+        bucket[0] += 1
+        bucket[1] += len(line)
+        bucket[2] += ns
+
+    def merge(self, other: "PatternStats") -> None:
+        self.tested += other.tested
+        self.hits += other.hits
+        self.match_ns += other.match_ns
+        self.extract_ns += other.extract_ns
+        self.max_ns = max(self.max_ns, other.max_ns)
+        for entry in other.slowest:
+            if len(self.slowest) < SLOWEST_LINES:
+                heapq.heappush(self.slowest, entry)
+            elif entry[0] > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, entry)
+        for key, (lines, length, ns) in other.buckets.items():
+            bucket = self.buckets.setdefault(key, [0, 0, 0])
+            bucket[0] += lines
+            bucket[1] += length
+            bucket[2] += ns
+
+    def length_exponent(self):
+        # Least squares slope of log(mean ns) over log(mean line length)
+        points = [(math.log(length / lines), math.log(max(ns, 1) / lines))
+                  for lines, length, ns in self.buckets.values()
+                  if lines >= MIN_BUCKET_LINES and length > 0]
+        if len(points) < 2:
+            return None
+        mx = sum(x for x, _ in points) / len(points)
+        my = sum(y for _, y in points) / len(points)
+        var = sum((x - mx) ** 2 for x, _ in points)
+        if var == 0:
+            return None
+        return sum((x - mx) * (y - my) for x, y in points) / var
+
+    def row(self, anchor) -> dict:
+        exponent = self.length_exponent()
+        total_ns = self.match_ns + self.extract_ns
+        return {
+            "pattern_name": self.name,
+            "anchor": anchor if anchor is not None else "",
+            "lines_tested": self.tested,
+            "hits": self.hits,
+            "total_ms": round(total_ns / 1e6, 3),
+            "match_ms": round(self.match_ns / 1e6, 3),
+            "extract_ms": round(self.extract_ns / 1e6, 3),
+            "mean_us": round(self.match_ns / self.tested / 1e3, 3) if self.tested else 0,
+            "max_us": round(self.max_ns / 1e3, 3),
+            "length_exponent": "" if exponent is None else round(exponent, 2),
+            "superlinear": exponent is not None and exponent > SUPERLINEAR_EXPONENT,
+        }
+
+
+def get_stats(stats: dict, name: str) -> PatternStats:
+    entry = stats.get(name)
+    if entry is None:
+        entry = stats[name] = PatternStats(name)
+    return entry
+
+
+def merge_stats(stats: dict, other: dict) -> None:
+    for name, entry in other.items():
+        get_stats(stats, name).merge(entry)
+
+
+class ProfilingMatcher(matcher.PatternMatcher):
+    def __init__(self, loglines: list, stats: dict):
+        super().__init__(loglines)
+        self.stats = stats
+
+    def match(self, line: str) -> list:
+        candidates = self.entries
+        if self.prefilter is not None:
+            start = time.perf_counter_ns()
+            hit = self.prefilter.search(line) is not None
+            get_stats(self.stats, PREFILTER).add(time.perf_counter_ns() - start, line, hit)
+            if not hit:
+                candidates = self.unanchored
+        hits = []
+        for a, l in candidates:
+            if a is not None and a not in line:
+                continue
+            start = time.perf_counter_ns()
+            m = l.search(line)
+            get_stats(self.stats, l.pattern_name).add(time.perf_counter_ns() - start, line, m is not None)
+            if m is not None:
+                hits.append(l)
+        return hits
+
+
+def save_stats(db_dir: str, stats: dict, patterns: list) -> None:
+    anchors = {l.pattern_name: matcher.anchor_of(l) for l in patterns}
+    rows = [entry.row(anchors.get(name)) for name, entry in stats.items()]
+    rows.sort(key=lambda row: row["total_ms"], reverse=True)
+    if not rows:
+        return
+    with open(os.path.join(db_dir, STATS_FILE), "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+    with open(os.path.join(db_dir, SLOWEST_LINES_FILE), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["pattern_name", "us", "length", "line"])
+        for row in rows:
+            for ns, length, line in sorted(stats[row["pattern_name"]].slowest, reverse=True):
+                writer.writerow([row["pattern_name"], round(ns / 1e3, 3), length, line.rstrip("\n")])
+
+    print("%-45s %10s %8s %10s %8s %s" % ("pattern", "tested", "hits", "total ms", "exp", "superlinear"))
+    for row in rows:
+        print("%-45s %10d %8d %10.1f %8s %s" % (row["pattern_name"][:45], row["lines_tested"], row["hits"],
+                                              row["total_ms"], row["length_exponent"],
+                                              "YES" if row["superlinear"] else ""))
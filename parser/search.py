@@ -0,0 +1,426 @@
+# -*- coding: utf-8 -*-
+"""
+Full-text index over the raw docker.out/kubelet.out lines (parser.py --search-index).
+
+Every line of the logs gets an id. The line table keeps, per line id, its
+file, byte offset, timestamp and node. The words (\\w+ runs) of every line
+are the terms of an inverted index: per term the sorted ids of the lines
+holding it, stored as the first id followed by the gaps between ids, each
+in a varint (7 bits per byte, the high bit set on all but the last byte).
+Encoding and decoding run on numpy arrays of all the gaps at once.
+
+A query is a literal string, matched like grep -F. Its words must all be
+terms of the line, the first one may be the end of a term and the last one
+the start of a term. Whole terms and term prefixes are binary searched in
+the sorted term list, the first word (and every word with -i) needs a regex
+scan of it. Their postings are intersected, the node and time filters
+run on the line table, and only the candidate lines are read back, with a
+seek to their offset, to check the whole string.
+
+The index lives in DB_DIR/search and is memory mapped by the queries:
+- terms.txt            the terms in sorted order, one per line
+- term_offsets.npy     offset of every term in terms.txt
+- postings.bin         varint gaps of every term
+- posting_offsets.npy  offset of every term in postings.bin
+- line_*.npy           file, offset, timestamp and node of every line
+- meta.json            files with the size indexed so far, node names
+
+    $ python3 parser/search.py test_data/PWX-26783/database "TargetPath: /var/lib/kubelet" --start 1662386894
+"""
+
+import argparse
+import array
+import bisect
+import json
+import mmap
+import os
+import re
+import shutil
+import sys
+import time
+
+import numpy as np
+
+import timestamps
+
+INDEX_DIR = "search"
+INDEX_VERSION = 2
+META_FILE = "meta.json"
+TERMS_FILE = "terms.txt"
+POSTINGS_FILE = "postings.bin"
+TOKEN_RE = re.compile(rb"\w+")
+NEWLINE = b"\n"
+# The bytes \w matches. Blanking the others out lets bytes.split() cut a
+# whole block into its terms, several times faster than TOKEN_RE.findall().
+WORD_BYTES = np.array([TOKEN_RE.match(bytes([c])) is not None for c in range(256)])
+BLANK_NON_WORD = bytes(c if WORD_BYTES[c] else ord(" ") for c in range(256))
+# "Mon DD HH:MM:SS node " at the start of every line, empty on lines without it
+LINE_RE = re.compile(rb"(?m)^(?:(\w{3} \d{2} \d{2}:\d{2}:\d{2}) (\S+) )?")
+# Bytes of a log tokenized at once
+BLOCK_SIZE = 8 * 1024 * 1024
+# Per line: file id, byte offset, epoch seconds, node id
+LINE_ARRAYS = {"line_files": "H", "line_offsets": "q", "line_times": "I", "line_nodes": "H"}
+# Bytes of the varint of a line id, at most
+VARINT_BYTES = 5
+# Postings varint encoded and written at a time
+ENCODE_CHUNK = 1 << 22
+# Results printed by the command line unless --limit says otherwise
+DEFAULT_LIMIT = 1000
+
+
+def sorted_unique(values: np.ndarray) -> np.ndarray:
+    # np.unique hashes in numpy 2, sorting is several times faster on line ids
+    values = np.sort(values)
+    return values[np.concatenate([[True], values[1:] != values[:-1]])] if len(values) else values
+
+
+def varint_sizes(values: np.ndarray) -> np.ndarray:
+    sizes = np.ones(len(values), dtype="uint8")
+    for k in range(1, VARINT_BYTES):
+        sizes += values >= 1 << (7 * k)
+    return sizes
+
+
+def encode_varints(values: np.ndarray) -> np.ndarray:
+    sizes = varint_sizes(values)
+    positions = np.cumsum(sizes, dtype="int64") - sizes
+    packed = np.zeros(int(sizes.sum()), dtype="uint8")
+    for k in range(VARINT_BYTES):
+        sel = sizes > k
+        more = (sizes[sel] > k + 1) << 7
+        packed[positions[sel] + k] = ((values[sel] >> (7 * k)) & 0x7F) | more
+    return packed
+
+
+def decode_varints(packed: np.ndarray) -> np.ndarray:
+    last = packed < 0x80
+    starts = np.flatnonzero(np.concatenate([[True], last[:-1]]))
+    # Byte position within its varint
+    index = np.arange(len(packed))
+    shift = 7 * (index - starts[np.cumsum(np.concatenate([[True], last[:-1]])) - 1])
+    return np.add.reduceat((packed & 0x7F).astype("int64") << shift, starts)
+
+
+def open_mmap(path: str):
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class IndexBuilder:
+    def __init__(self):
+        # term -> term id, in the order terms were first seen
+        self.vocab = {}
+        # (term id, line id) pairs, a pair per distinct term of a line
+        self.pair_terms = array.array("I")
+        self.pair_lines = array.array("I")
+        self.lines = {name: array.array(typecode) for name, typecode in LINE_ARRAYS.items()}
+        # absolute path -> [file id, bytes indexed]
+        self.files = {}
+        # node name -> node id
+        self.nodes = {}
+
+    def load(self, index) -> None:
+        """Starts from a previous index, new lines are appended to it."""
+        for term_id in range(index.term_count):
+            lines = index.postings(term_id).astype("uint32")
+            self.vocab[index.term(term_id)] = term_id
+            self.pair_terms.frombytes(np.full(len(lines), term_id, dtype="uint32").tobytes())
+            self.pair_lines.frombytes(lines.tobytes())
+        for name in LINE_ARRAYS:
+            self.lines[name].frombytes(np.ascontiguousarray(index.lines[name]).tobytes())
+        for file_id, entry in enumerate(index.meta["files"]):
+            self.files[entry["path"]] = [file_id, entry["size"]]
+        self.nodes = {name: node_id for node_id, name in enumerate(index.meta["nodes"])}
+
+    def node_id(self, name: bytes) -> int:
+        node_id = self.nodes.get(name.decode())
+        if node_id is None:
+            node_id = self.nodes[name.decode()] = len(self.nodes)
+        return node_id
+
+    def add_file(self, path: str) -> None:
+        # Indexes the lines of path after the bytes indexed by a previous run.
+        # A last line without its newline yet is left for the next run.
+        path = os.path.abspath(path)
+        entry = self.files.setdefault(path, [len(self.files), 0])
+        file_id, offset = entry
+        end = os.path.getsize(path)
+        decoder = timestamps.TimestampDecoder()
+        previous = (0, self.node_id(b""))
+        with open(path, "rb") as f:
+            decoder.set_header(f.readline().decode(errors="replace"), os.path.getmtime(path))
+            f.seek(offset)
+            while offset < end:
+                block = f.read(min(BLOCK_SIZE, end - offset))
+                cut = block.rfind(NEWLINE) + 1
+                if cut == 0:
+                    if len(block) < BLOCK_SIZE:
+                        break
+                    # A line longer than a block
+                    block += f.readline()
+                    cut = len(block)
+                    if not block.endswith(NEWLINE):
+                        break
+                block = block[:cut]
+                f.seek(offset + cut)
+                previous = self.add_block(block, file_id, offset, decoder, previous)
+                offset += cut
+        entry[1] = offset
+
+    def add_block(self, block: bytes, file_id: int, offset: int, decoder, previous: tuple) -> tuple:
+        # block holds whole lines. Lines without a journal prefix keep the
+        # (timestamp, node id) of the line before, returned for the next block.
+        first_line = len(self.lines["line_offsets"])
+        data = np.frombuffer(block, dtype="uint8")
+        ends = np.flatnonzero(data == ord(NEWLINE)) + 1
+        starts = np.concatenate([[0], ends[:-1]]) + offset
+        times = array.array("I")
+        node_ids = array.array("H")
+        decoded = {}
+        for prefix in LINE_RE.findall(block)[:len(ends)]:
+            if prefix[0]:
+                previous = decoded.get(prefix)
+                if previous is None:
+                    previous = decoded[prefix] = (decoder.decode(prefix[0].decode()), self.node_id(prefix[1]))
+            times.append(previous[0])
+            node_ids.append(previous[1])
+        self.lines["line_files"].frombytes(np.full(len(ends), file_id, dtype="uint16").tobytes())
+        self.lines["line_offsets"].frombytes(starts.astype("int64").tobytes())
+        self.lines["line_times"].extend(times)
+        self.lines["line_nodes"].extend(node_ids)
+
+        # Terms to ids without a Python loop per term, only per new term. The
+        # line of a term is the number of line ends before its first byte.
+        tokens = block.translate(BLANK_NON_WORD).split()
+        for term in set(tokens).difference(self.vocab):
+            self.vocab[term] = len(self.vocab)
+        term_ids = np.fromiter(map(self.vocab.__getitem__, tokens), dtype="int64", count=len(tokens))
+        is_word = WORD_BYTES[data]
+        token_starts = np.flatnonzero(is_word & ~np.concatenate([[False], is_word[:-1]]))
+        line_ids = first_line + np.searchsorted(ends, token_starts, "right")
+        pairs = sorted_unique((term_ids << 32) | line_ids)
+        self.pair_terms.frombytes((pairs >> 32).astype("uint32").tobytes())
+        self.pair_lines.frombytes((pairs & 0xFFFFFFFF).astype("uint32").tobytes())
+
+    def save(self, index_dir: str, db_dir: str) -> None:
+        os.makedirs(index_dir)
+        terms = list(self.vocab)
+        order = sorted(range(len(terms)), key=terms.__getitem__)
+        # Term id -> position in terms.txt
+        rank = np.empty(len(terms), dtype="uint32")
+        rank[order] = np.arange(len(terms), dtype="uint32")
+
+        with open(os.path.join(index_dir, TERMS_FILE), "wb") as f:
+            f.write(b"".join(terms[i] + b"\n" for i in order))
+        term_offsets = np.zeros(len(terms) + 1, dtype="int64")
+        term_offsets[1:] = np.cumsum([len(terms[i]) + 1 for i in order])
+        np.save(os.path.join(index_dir, "term_offsets.npy"), term_offsets)
+
+        # Pairs by term, the line ids of a term stay ascending. Every term has
+        # at least one line.
+        pair_terms = rank[np.frombuffer(self.pair_terms, dtype="uint32")]
+        perm = np.argsort(pair_terms, kind="stable")
+        pair_terms = pair_terms[perm]
+        pair_lines = np.frombuffer(self.pair_lines, dtype="uint32")[perm]
+        del perm
+        starts = np.zeros(len(terms) + 1, dtype="int64")
+        starts[1:] = np.cumsum(np.bincount(pair_terms, minlength=len(terms)))
+        del pair_terms
+        gaps = pair_lines.copy()
+        gaps[1:] -= pair_lines[:-1]
+        gaps[starts[:-1]] = pair_lines[starts[:-1]]
+        del pair_lines
+        # Offset of the first varint of every term
+        posting_offsets = np.zeros(len(terms) + 1, dtype="int64")
+        posting_offsets[1:] = np.cumsum(varint_sizes(gaps), dtype="int64")[starts[1:] - 1]
+        np.save(os.path.join(index_dir, "posting_offsets.npy"), posting_offsets)
+        with open(os.path.join(index_dir, POSTINGS_FILE), "wb") as f:
+            for i in range(0, len(gaps), ENCODE_CHUNK):
+                encode_varints(gaps[i:i + ENCODE_CHUNK]).tofile(f)
+
+        for name, values in self.lines.items():
+            np.save(os.path.join(index_dir, name + ".npy"), np.frombuffer(values, dtype=values.typecode))
+        meta = {
+            "version": INDEX_VERSION,
+            # Relative to db_dir, so the index works from any directory and
+            # after moving the case
+            "files": [{"path": os.path.relpath(path, db_dir), "size": size}
+                      for path, (_, size) in sorted(self.files.items(), key=lambda e: e[1][0])],
+            "nodes": sorted(self.nodes, key=self.nodes.get),
+        }
+        with open(os.path.join(index_dir, META_FILE), "w") as f:
+            json.dump(meta, f, indent=2)
+
+
+def read_meta(db_dir: str):
+    path = os.path.join(db_dir, INDEX_DIR, META_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        meta = json.load(f)
+    if meta.get("version") != INDEX_VERSION:
+        return None
+    for entry in meta["files"]:
+        entry["path"] = os.path.normpath(os.path.join(os.path.abspath(db_dir), entry["path"]))
+    return meta
+
+
+def build_index(db_dir: str, logfiles: list, rebuild: bool = False) -> None:
+    """
+    Indexes logfiles into db_dir/search. Unless rebuild, files indexed
+    before only get the lines appended since. The new index is written next
+    to the old one and swapped in, so running queries keep their mappings.
+    """
+    index_dir = os.path.join(db_dir, INDEX_DIR)
+    builder = IndexBuilder()
+    meta = read_meta(db_dir)
+    if meta is not None and not rebuild:
+        indexed = {entry["path"]: entry["size"] for entry in meta["files"]}
+        if all(os.path.exists(path) and os.path.getsize(path) >= size for path, size in indexed.items()):
+            index = SearchIndex(db_dir)
+            builder.load(index)
+            index.close()
+    for logfile in logfiles:
+        builder.add_file(logfile)
+    new_dir = index_dir + ".new"
+    shutil.rmtree(new_dir, ignore_errors=True)
+    builder.save(new_dir, db_dir)
+    shutil.rmtree(index_dir, ignore_errors=True)
+    os.rename(new_dir, index_dir)
+
+
+class SearchIndex:
+    """Reader for db_dir/search, see the module docstring."""
+
+    def __init__(self, db_dir: str):
+        self.meta = read_meta(db_dir)
+        if self.meta is None:
+            raise FileNotFoundError("No search index in " + db_dir + ", run parser.py --search-index first")
+        index_dir = os.path.join(db_dir, INDEX_DIR)
+        self.terms = open_mmap(os.path.join(index_dir, TERMS_FILE))
+        self.packed = open_mmap(os.path.join(index_dir, POSTINGS_FILE))
+
+        def load(name):
+            return np.load(os.path.join(index_dir, name + ".npy"), mmap_mode="r")
+
+        self.term_offsets = load("term_offsets")
+        self.posting_offsets = load("posting_offsets")
+        self.lines = {name: load(name) for name in LINE_ARRAYS}
+        self.term_count = len(self.term_offsets) - 1
+
+    def close(self) -> None:
+        for m in (self.terms, self.packed):
+            if isinstance(m, mmap.mmap):
+                m.close()
+
+    def term(self, term_id: int) -> bytes:
+        return bytes(self.terms[self.term_offsets[term_id]:self.term_offsets[term_id + 1] - 1])
+
+    def postings(self, term_id: int) -> np.ndarray:
+        """Sorted ids of the lines holding a term."""
+        start, end = int(self.posting_offsets[term_id]), int(self.posting_offsets[term_id + 1])
+        return np.cumsum(decode_varints(np.frombuffer(self.packed, dtype="uint8", count=end - start, offset=start)))
+
+    def term_ids(self, word: bytes, starts_term: bool, ends_term: bool, ignore_case: bool = False) -> np.ndarray:
+        # Terms containing word, or starting/ending with it. Whole terms and
+        # prefixes are binary searched in the sorted terms, the others need
+        # a scan of terms.txt.
+        if starts_term and not ignore_case:
+            count = len(self.term_offsets) - 1
+            low = bisect.bisect_left(range(count), word, key=self.term)
+            if ends_term:
+                high = low + (low < count and self.term(low) == word)
+            else:
+                # Terms are word bytes, all below 0xff
+                high = bisect.bisect_left(range(count), word + b"\xff", lo=low, key=self.term)
+            return np.arange(low, high, dtype="int64")
+        pattern = (b"^" if starts_term else b"") + re.escape(word) + (b"$" if ends_term else b"")
+        regex = re.compile(pattern, re.MULTILINE | (re.IGNORECASE if ignore_case else 0))
+        starts = np.fromiter((m.start() for m in regex.finditer(self.terms)), dtype="int64")
+        return sorted_unique(np.searchsorted(self.term_offsets, starts, "right") - 1)
+
+    def candidates(self, query: bytes, ignore_case: bool = False) -> np.ndarray:
+        """Ids of the lines holding every word of query, a superset of the matching lines."""
+        lines = None
+        for m in TOKEN_RE.finditer(query):
+            term_ids = self.term_ids(m.group(), m.start() > 0, m.end() < len(query), ignore_case)
+            postings = [self.postings(term_id) for term_id in term_ids]
+            word_lines = sorted_unique(np.concatenate(postings)) if postings else np.empty(0, dtype="int64")
+            lines = word_lines if lines is None else np.intersect1d(lines, word_lines, assume_unique=True)
+            if len(lines) == 0:
+                break
+        if lines is None:
+            # No word to look up, every line is a candidate
+            lines = np.arange(len(self.lines["line_offsets"]))
+        return lines
+
+    def search(self, query: str, nodes: list = None, start=None, end=None, limit: int = None,
+               ignore_case: bool = False):
+        """
+        (timestamp, node, path, line) of the lines containing query, by time,
+        on one of nodes with start <= timestamp < end.
+        """
+        needle = query.encode()
+        if ignore_case:
+            needle = needle.lower()
+        lines = self.candidates(needle, ignore_case)
+        times = self.lines["line_times"][lines]
+        keep = np.ones(len(lines), dtype=bool)
+        if nodes:
+            node_ids = [i for i, name in enumerate(self.meta["nodes"]) if name in nodes]
+            keep &= np.isin(self.lines["line_nodes"][lines], node_ids)
+        if start is not None:
+            keep &= times >= start
+        if end is not None:
+            keep &= times < end
+        lines, times = lines[keep], times[keep]
+        lines = lines[np.argsort(times, kind="stable")]
+
+        files = {}
+        found = 0
+        try:
+            for line_id in lines:
+                if limit is not None and found >= limit:
+                    break
+                file_id = int(self.lines["line_files"][line_id])
+                f = files.get(file_id)
+                if f is None:
+                    f = files[file_id] = open(self.meta["files"][file_id]["path"], "rb")
+                f.seek(int(self.lines["line_offsets"][line_id]))
+                line = f.readline()
+                if needle not in (line.lower() if ignore_case else line):
+                    continue
+                found += 1
+                yield (int(self.lines["line_times"][line_id]), self.meta["nodes"][self.lines["line_nodes"][line_id]],
+                       self.meta["files"][file_id]["path"], line.decode(errors="replace").rstrip("\n"))
+        finally:
+            for f in files.values():
+                f.close()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Search the raw logs with the index built by parser.py "
+                                                     "--search-index")
+    arg_parser.add_argument("db_dir", help="database directory written by parser.py")
+    arg_parser.add_argument("query", help="String to look for, as grep -F")
+    arg_parser.add_argument("--node", action="append", help="Only lines of this node, can be repeated")
+    arg_parser.add_argument("--start", type=float, help="Only lines at or after this epoch time")
+    arg_parser.add_argument("--end", type=float, help="Only lines before this epoch time")
+    arg_parser.add_argument("-i", "--ignore-case", action="store_true")
+    arg_parser.add_argument("--limit", type=int, default=DEFAULT_LIMIT,
+                            help="Lines printed at most, 0 for all (default: %(default)s)")
+    args = arg_parser.parse_args()
+
+    index = SearchIndex(args.db_dir)
+    start = time.perf_counter()
+    results = index.search(args.query, args.node, args.start, args.end, args.limit or None, args.ignore_case)
+    for timestamp, node, path, line in results:
+        print(time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(timestamp)), node, os.path.basename(path) + ":",
+              line)
+    print("%.3fs" % (time.perf_counter() - start), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
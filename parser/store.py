@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""
+Typed, single-file SQLite database written alongside (or instead of) the
+table_*.csv files.
+
+- timestamps are stored as int64, as REAL with --subsecond
+- column types come from the pattern: groups that only match digits are
+  INTEGER, except object ids (e.g. vol_id) that may not fit in 64 bits
+- node/pod/pv names are dictionary encoded through the strings table
+- rows are inserted sorted by timestamp and every table is indexed on
+  timestamp and on node_name and the other object columns
+- the index.csv metadata lives in the db_index table
+
+Database is the reader API: it filters by node, time range and column values
+in SQL, so only the matching rows are ever loaded.
+"""
+
+import os
+import sqlite3
+
+import pandas as pd
+
+import columns
+import focus
+import matcher
+
+DB_FILE = "hawkeye.db"
+
+# Storage backends selectable from parser.py
+CSV = "csv"
+SQLITE = "sqlite"
+BOTH = "both"
+STORAGE_CHOICES = [CSV, SQLITE, BOTH]
+
+TIMESTAMP = "timestamp"
+NODE_NAME = "node_name"
+# Columns holding object names, stored as ids into the strings table
+DICT_COLUMNS = columns.NAME_COLUMNS
+INT64_MIN, INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+
+def sql_table_name(logline_obj) -> str:
+    return logline_obj.get_table_name()[:-len(".csv")]
+
+
+def quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def column_type(logline_obj, col: str, subsecond: bool = False) -> str:
+    if col in DICT_COLUMNS:
+        return "dict"
+    if col == TIMESTAMP:
+        return "REAL" if subsecond else "INTEGER"
+    if col not in focus.FOCUS_COLUMNS and col in matcher.digit_groups(logline_obj.pattern):
+        return "INTEGER"
+    return "TEXT"
+
+
+class SQLiteStore:
+    def __init__(self, db_dir: str, subsecond: bool = False):
+        self.subsecond = subsecond
+        self.conn = sqlite3.connect(os.path.join(db_dir, DB_FILE))
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS strings (id INTEGER PRIMARY KEY, value TEXT UNIQUE NOT NULL);
+            CREATE TABLE IF NOT EXISTS db_index (logfile TEXT, pattern TEXT, filename TEXT,
+                                                 table_name TEXT PRIMARY KEY, pattern_name TEXT);
+            CREATE TABLE IF NOT EXISTS db_columns (table_name TEXT, position INTEGER, name TEXT, type TEXT,
+                                                   PRIMARY KEY (table_name, position));
+        """)
+        self.string_ids = dict(self.conn.execute("SELECT value, id FROM strings"))
+
+    def string_id(self, value):
+        if value is None:
+            return None
+        sid = self.string_ids.get(value)
+        if sid is None:
+            sid = self.conn.execute("INSERT INTO strings (value) VALUES (?)", (value,)).lastrowid
+            self.string_ids[value] = sid
+        return sid
+
+    def table_exists(self, table: str) -> bool:
+        return self.conn.execute("SELECT 1 FROM db_index WHERE table_name = ?", (table,)).fetchone() is not None
+
+    def drop_table(self, table: str) -> None:
+        self.conn.execute("DROP TABLE IF EXISTS " + quote(table))
+        self.conn.execute("DELETE FROM db_index WHERE table_name = ?", (table,))
+        self.conn.execute("DELETE FROM db_columns WHERE table_name = ?", (table,))
+
+    def create_table(self, logline_obj, table: str, df: dict) -> list:
+        types = [(col, column_type(logline_obj, col, self.subsecond)) for col in df]
+        cols = ", ".join(quote(c) + (" INTEGER" if t == "dict" else " " + t) for c, t in types)
+        self.conn.execute("CREATE TABLE " + quote(table) + " (" + cols + ")")
+        self.conn.execute("CREATE INDEX " + quote(table + "_ts") + " ON " + quote(table) + " (timestamp)")
+        for col in df:
+            # node_name and the other focus.FOCUS_COLUMNS: pods, PVs, volumes
+            if col in focus.FOCUS_COLUMNS:
+                self.conn.execute("CREATE INDEX " + quote(table + "_" + col) + " ON " + quote(table) +
+                                  " (" + quote(col) + ", timestamp)")
+        self.conn.executemany("INSERT INTO db_columns VALUES (?, ?, ?, ?)",
+                              [(table, i, c, t) for i, (c, t) in enumerate(types)])
+        self.conn.execute("INSERT INTO db_index VALUES (?, ?, ?, ?, ?)",
+                          (logline_obj.logfile, logline_obj.pattern, logline_obj.get_table_name(),
+                           table, logline_obj.pattern_name))
+        return types
+
+    def table_types(self, table: str) -> list:
+        return list(self.conn.execute(
+            "SELECT name, type FROM db_columns WHERE table_name = ? ORDER BY position", (table,)))
+
+    def insert_rows(self, table: str, types: list, df: dict) -> None:
+        columns = []
+        for col, typ in types:
+            vals = df.get(col, [])
+            if typ == "dict":
+                vals = [self.string_id(v) for v in vals]
+            elif typ == "INTEGER":
+                vals = [int(v) if isinstance(v, str) and v.isdigit() and int(v) <= INT64_MAX else v for v in vals]
+            columns.append(vals)
+        rows = list(zip(*columns))
+        # Stable sort, rows with the same timestamp keep their log order
+        ts = [c for c, _ in types].index(TIMESTAMP)
+        rows.sort(key=lambda row: row[ts] if row[ts] is not None else INT64_MIN)
+        placeholders = ", ".join("?" for _ in types)
+        self.conn.executemany("INSERT INTO " + quote(table) + " VALUES (" + placeholders + ")", rows)
+
+    def write(self, logline_obj, append: bool) -> None:
+        # One batch of buffered rows. The first batch of a run (re)creates the
+        # table unless it is appended to the table of a previous run.
+        table = sql_table_name(logline_obj)
+        if append:
+            types = self.table_types(table)
+        else:
+            self.drop_table(table)
+            types = self.create_table(logline_obj, table, logline_obj.df)
+        self.insert_rows(table, types, logline_obj.df)
+        self.conn.commit()
+
+    def finish(self, patterns: list, written: set, append_patterns=()) -> None:
+        # Tables of a previous run that got no rows this time are stale
+        for logline_obj in patterns:
+            if logline_obj not in written and logline_obj not in append_patterns:
+                self.drop_table(sql_table_name(logline_obj))
+        self.conn.commit()
+        self.close()
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+class Database:
+    """Reader for the SQLite database of a parsed case."""
+
+    def __init__(self, db_dir: str):
+        path = os.path.join(db_dir, DB_FILE)
+        if not os.path.exists(path):
+            raise FileNotFoundError("No " + DB_FILE + " in " + db_dir + ", parse with --storage sqlite")
+        self.conn = sqlite3.connect(path)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def index(self) -> pd.DataFrame:
+        return pd.read_sql_query("SELECT logfile, pattern, filename, table_name, pattern_name FROM db_index",
+                                 self.conn)
+
+    def resolve_table(self, name: str) -> str:
+        # Accepts a pattern name ("PX Daemon Ready"), a table name or a csv filename
+        row = self.conn.execute(
+            "SELECT table_name FROM db_index WHERE pattern_name = ? OR table_name = ? OR filename = ?",
+            (name, name, name)).fetchone()
+        if row is None:
+            raise KeyError("No table for " + name)
+        return row[0]
+
+    def lookup_id(self, value: str):
+        row = self.conn.execute("SELECT id FROM strings WHERE value = ?", (value,)).fetchone()
+        return None if row is None else row[0]
+
+    def row_count(self, name: str) -> int:
+        table = self.resolve_table(name)
+        return self.conn.execute("SELECT COUNT(*) FROM " + quote(table)).fetchone()[0]
+
+    def query(self, name: str, node: str = None, start: int = None, end: int = None,
+              columns: list = None, **filters) -> pd.DataFrame:
+        """
+        Rows of a table, optionally restricted to a node, to start <= timestamp
+        < end and to columns equal to the given values, ordered by timestamp.
+        """
+        table = self.resolve_table(name)
+        types = dict(self.conn.execute("SELECT name, type FROM db_columns WHERE table_name = ?", (table,)))
+        if node is not None:
+            filters[NODE_NAME] = node
+        where = []
+        params = []
+        for col, value in filters.items():
+            if col not in types:
+                raise KeyError("No column " + col + " in " + table)
+            if hasattr(value, "item"):
+                # numpy scalars, e.g. a value taken from a previous query
+                value = value.item()
+            if types[col] == "dict":
+                value = self.lookup_id(value)
+                if value is None:
+                    return pd.DataFrame(columns=columns or list(types))
+            where.append(quote(col) + " = ?")
+            params.append(value)
+        if start is not None:
+            where.append("timestamp >= ?")
+            params.append(float(start))
+        if end is not None:
+            where.append("timestamp < ?")
+            params.append(float(end))
+
+        selected = columns or [c for c, _ in self.conn.execute(
+            "SELECT name, position FROM db_columns WHERE table_name = ? ORDER BY position", (table,))]
+        sql = "SELECT " + ", ".join(quote(c) for c in selected) + " FROM " + quote(table)
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY timestamp, rowid"
+        df = pd.read_sql_query(sql, self.conn, params=params)
+        for col in selected:
+            if types.get(col) == "dict":
+                df[col] = self.decode(df[col])
+        return df
+
+    def decode(self, ids: pd.Series) -> pd.Series:
+        # Only the ids present in the result are looked up
+        unique = [int(i) for i in ids.dropna().unique()]
+        names = {}
+        for i in range(0, len(unique), 500):
+            batch = unique[i:i + 500]
+            names.update(self.conn.execute(
+                "SELECT id, value FROM strings WHERE id IN (" + ", ".join("?" for _ in batch) + ")", batch))
+        return ids.map(names)
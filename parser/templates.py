@@ -0,0 +1,337 @@
+# -*- coding: utf-8 -*-
+"""
+Drain-style template miner for the lines no pattern matches (parser.py --templates).
+
+Every unmatched journal line is split on whitespace after its timestamp and
+node. Lines with the same number of tokens and the same first DEPTH tokens,
+digits removed, form a group. Within a group the line joins the template it
+shares the most tokens with, if at least SIM_THRESHOLD of them, and the
+positions where they differ become parameters (<*>). Otherwise the line
+starts a new template.
+
+A template keeps the tokens of its first line (example) and its parameter
+positions in the order they appeared (slots). A line is stored as its
+template id and the tokens at the slots of the template at that time. Slots
+added later held the example token on the earlier lines, so every line can
+be rebuilt from the final template.
+
+The store, in DB_DIR:
+- templates.csv           one row per template, with the total count
+- template_nodes.csv      count, first and last time per template and node
+- template_lines.csv.gz   timestamp, node, template id and parameters per line
+
+The first two are small and answer "which templates are new or rare on a
+node" without reading the lines:
+
+    $ python3 parser/templates.py test_data/PWX-26783/database --new --top 5
+    $ python3 parser/templates.py test_data/PWX-26783/database --rare --node ip-10-13-112-170.pwx.dev.purestorage.com
+    $ python3 parser/templates.py test_data/PWX-26783/database --lines 42
+"""
+
+import argparse
+import csv
+import gzip
+import heapq
+import operator
+import os
+import re
+import time
+
+import columns
+
+TEMPLATES_FILE = "templates.csv"
+NODES_FILE = "template_nodes.csv"
+LINES_FILE = "template_lines.csv.gz"
+TEMPLATE_COLUMNS = ["template_id", "count", "template", "slots", "example"]
+NODE_COLUMNS = ["template_id", "node_name", "count", "first_timestamp", "last_timestamp"]
+LINE_COLUMNS = ["timestamp", "node_name", "template_id", "params"]
+
+WILDCARD = "<*>"
+# Leading tokens that pick the group of a line
+DEPTH = 5
+# Share of the tokens a line must have in common with a template to join it
+SIM_THRESHOLD = 0.4
+DIGITS = b"0123456789"
+# Compression level of LINES_FILE, 9 costs twice the time for a few % less
+COMPRESS_LEVEL = 6
+# "Mon DD HH:MM:SS node " in front of the message
+LINE_RE = re.compile(r"(?P<timestamp>\w{3} \d{2} \d{2}:\d{2}:\d{2}) (?P<node_name>\S+) (?P<message>.*)")
+
+
+def group_key(tokens: list) -> tuple:
+    # bytes.translate() drops the digits several times faster than str/re
+    return len(tokens), " ".join(tokens[:DEPTH]).encode().translate(None, DIGITS)
+
+
+def new_rows() -> dict:
+    return {col: columns.new_column(col) for col in LINE_COLUMNS}
+
+
+class Template:
+    __slots__ = ("template_id", "tokens", "example", "slots", "nodes")
+
+    def __init__(self, template_id: int, tokens: list, example: list = None, slots: list = None):
+        self.template_id = template_id
+        self.tokens = tokens
+        self.example = example if example is not None else list(tokens)
+        self.slots = slots if slots is not None else []
+        # node_name -> [count, first timestamp, last timestamp]
+        self.nodes = {}
+
+    @property
+    def count(self) -> int:
+        return sum(stats[0] for stats in self.nodes.values())
+
+    def similarity(self, tokens: list) -> tuple:
+        # (equal tokens, parameters), the best template has the highest.
+        # Every <*> is a slot and never equal to a token.
+        return sum(map(operator.eq, self.tokens, tokens)), len(self.slots)
+
+    def generalize(self, tokens: list) -> None:
+        for i, (mine, theirs) in enumerate(zip(self.tokens, tokens)):
+            if mine != theirs and mine != WILDCARD:
+                self.tokens[i] = WILDCARD
+                self.slots.append(i)
+
+    def params(self, tokens: list) -> list:
+        return [tokens[i] for i in self.slots]
+
+    def expand(self, params: list) -> list:
+        # Tokens of a line from its stored params, slots past them keep the example token
+        tokens = list(self.example)
+        for i, value in zip(self.slots, params):
+            tokens[i] = value
+        return tokens
+
+    def add_hit(self, node_name: str, count: int, first, last) -> bool:
+        # Returns whether it is the first hit on node_name
+        stats = self.nodes.get(node_name)
+        if stats is None:
+            self.nodes[node_name] = [count, first, last]
+            return True
+        stats[0] += count
+        if first < stats[1]:
+            stats[1] = first
+        if last > stats[2]:
+            stats[2] = last
+        return False
+
+
+class TemplateMiner:
+    def __init__(self, threshold: float = SIM_THRESHOLD):
+        self.threshold = threshold
+        self.templates = []
+        # group_key() -> [Template]
+        self.groups = {}
+        self.rows = new_rows()
+        # Lines are appended to the LINES_FILE of a previous run
+        self.append = False
+        # (template, node_name) seen for the first time, see take_new()
+        self.new = []
+
+    def place(self, tokens: list, key_tokens: list = None, example: list = None, slots: list = None) -> Template:
+        """The template tokens belong to, generalized to them or created for them."""
+        group = self.groups.setdefault(group_key(key_tokens or tokens), [])
+        best = None
+        # The templates of a group have as many tokens as the line
+        best_score = (self.threshold * len(tokens), -1)
+        for template in group:
+            score = template.similarity(tokens)
+            if score > best_score:
+                best, best_score = template, score
+        if best is None:
+            best = Template(len(self.templates), list(tokens), example, slots)
+            self.templates.append(best)
+            group.append(best)
+        elif sum(best_score) < len(tokens) or key_tokens is not None:
+            # A line equal to the template but for its slots leaves it as is.
+            # Worker templates have <*> too and are always compared in full.
+            best.generalize(tokens)
+        return best
+
+    def add_line(self, line: str, decoder) -> int:
+        # Returns roughly how many bytes the new row takes in the column buffers
+        grp = LINE_RE.match(line)
+        if grp is None:
+            return 0
+        timestamp, node_name, message = grp.groups()
+        tokens = message.split()
+        if not tokens:
+            return 0
+        timestamp = decoder.decode(timestamp, message)
+        template = self.place(tokens)
+        if template.add_hit(node_name, 1, timestamp, timestamp):
+            self.new.append((template, node_name))
+        return self.add_row(timestamp, node_name, template, template.params(tokens))
+
+    def add_row(self, timestamp, node_name: str, template: Template, params: list) -> int:
+        params = " ".join(params)
+        rows = self.rows
+        rows["timestamp"].append(timestamp)
+        rows["node_name"].append(node_name)
+        rows["template_id"].append(template.template_id)
+        rows["params"].append(params)
+        return 3 * columns.POINTER_SIZE + columns.value_size(params)
+
+    def take(self) -> tuple:
+        # Templates and rows mined so far, for a worker to hand to the main
+        # process. The miner starts over for the next chunk.
+        state = (self.templates, self.rows)
+        self.templates, self.groups, self.rows, self.new = [], {}, new_rows(), []
+        return state
+
+    def merge(self, state: tuple) -> int:
+        """Adds the templates and rows a worker took, returns the bytes buffered."""
+        templates, rows = state
+        mapping = []
+        for theirs in templates:
+            mine = self.place(theirs.tokens, theirs.example, list(theirs.example), list(theirs.slots))
+            for node_name, (count, first, last) in theirs.nodes.items():
+                if mine.add_hit(node_name, count, first, last):
+                    self.new.append((mine, node_name))
+            mapping.append(mine)
+        size = 0
+        for timestamp, node_name, template_id, params in zip(*(columns.as_data(rows[col]) for col in LINE_COLUMNS)):
+            theirs = templates[template_id]
+            mine = mapping[template_id]
+            size += self.add_row(timestamp, node_name, mine, mine.params(theirs.expand(params.split())))
+        return size
+
+    def take_new(self) -> list:
+        new, self.new = self.new, []
+        return new
+
+    def flush(self, db_dir: str) -> None:
+        # Appends the buffered rows to LINES_FILE and frees them
+        if not len(self.rows["timestamp"]):
+            return
+        with gzip.open(os.path.join(db_dir, LINES_FILE), "at" if self.append else "wt", COMPRESS_LEVEL,
+                       newline="") as f:
+            writer = csv.writer(f)
+            if not self.append:
+                writer.writerow(LINE_COLUMNS)
+            writer.writerows(zip(*(columns.as_data(self.rows[col]) for col in LINE_COLUMNS)))
+        self.append = True
+        self.rows = new_rows()
+
+    def save(self, db_dir: str) -> None:
+        self.flush(db_dir)
+        lines_path = os.path.join(db_dir, LINES_FILE)
+        if not self.append and os.path.exists(lines_path):
+            # Nothing was mined in this rebuild, the lines of the previous run are stale
+            os.remove(lines_path)
+        with open(os.path.join(db_dir, TEMPLATES_FILE), "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(TEMPLATE_COLUMNS)
+            for t in self.templates:
+                writer.writerow([t.template_id, t.count, " ".join(t.tokens), " ".join(map(str, t.slots)),
+                                 " ".join(t.example)])
+        with open(os.path.join(db_dir, NODES_FILE), "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(NODE_COLUMNS)
+            for t in self.templates:
+                for node_name, (count, first, last) in sorted(t.nodes.items()):
+                    writer.writerow([t.template_id, node_name, count, first, last])
+
+    def load(self, db_dir: str) -> None:
+        """Resumes from the store of a previous run in db_dir, if there is one."""
+        store = TemplateStore(db_dir)
+        if not store.exists():
+            return
+        for t in store.templates:
+            self.templates.append(t)
+            self.groups.setdefault(group_key(t.example), []).append(t)
+        self.append = os.path.exists(os.path.join(db_dir, LINES_FILE))
+
+
+def to_number(value: str):
+    return float(value) if "." in value else int(value)
+
+
+class TemplateStore:
+    """Reader for the template store of a database directory."""
+
+    def __init__(self, db_dir: str):
+        self.db_dir = db_dir
+        self.templates = []
+        if not self.exists():
+            return
+        with open(os.path.join(db_dir, TEMPLATES_FILE), "r", newline="") as f:
+            for row in csv.DictReader(f):
+                slots = [int(i) for i in row["slots"].split()]
+                self.templates.append(Template(int(row["template_id"]), row["template"].split(),
+                                               row["example"].split(), slots))
+        with open(os.path.join(db_dir, NODES_FILE), "r", newline="") as f:
+            for row in csv.DictReader(f):
+                self.templates[int(row["template_id"])].nodes[row["node_name"]] = [
+                    int(row["count"]), to_number(row["first_timestamp"]), to_number(row["last_timestamp"])]
+
+    def exists(self) -> bool:
+        return os.path.exists(os.path.join(self.db_dir, TEMPLATES_FILE))
+
+    def node_names(self) -> list:
+        return sorted({node_name for t in self.templates for node_name in t.nodes})
+
+    def top(self, node_name: str, by: str = "new", n: int = 10, since=None) -> list:
+        """
+        [(template, count, first, last)] of node_name, the n templates first
+        seen last ("new") or with the fewest lines ("rare"), first seen at or
+        after since.
+        """
+        entries = [(t,) + tuple(t.nodes[node_name]) for t in self.templates if node_name in t.nodes]
+        if since is not None:
+            entries = [e for e in entries if e[2] >= since]
+        if by == "new":
+            return heapq.nlargest(n, entries, key=lambda e: (e[2], -e[1]))
+        return heapq.nsmallest(n, entries, key=lambda e: (e[1], -e[2]))
+
+    def lines(self, template_id: int = None):
+        """(timestamp, node_name, template, message) of the stored lines, in parse order."""
+        path = os.path.join(self.db_dir, LINES_FILE)
+        if not os.path.exists(path):
+            return
+        wanted = str(template_id)
+        with gzip.open(path, "rt", newline="") as f:
+            reader = csv.reader(f)
+            next(reader)
+            for timestamp, node_name, row_template_id, params in reader:
+                if template_id is not None and row_template_id != wanted:
+                    continue
+                template = self.templates[int(row_template_id)]
+                yield to_number(timestamp), node_name, template, " ".join(template.expand(params.split()))
+
+
+def format_time(timestamp) -> str:
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(timestamp))
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Query the log templates mined by parser.py --templates")
+    arg_parser.add_argument("db_dir", help="database directory written by parser.py")
+    arg_parser.add_argument("--new", dest="by", action="store_const", const="new", default="new",
+                            help="Templates first seen last on every node (default)")
+    arg_parser.add_argument("--rare", dest="by", action="store_const", const="rare",
+                            help="Templates with the fewest lines on every node")
+    arg_parser.add_argument("--node", action="append", help="Only this node, can be repeated")
+    arg_parser.add_argument("--top", type=int, default=10, help="Templates per node (default: %(default)s)")
+    arg_parser.add_argument("--since", type=float, help="Only templates first seen on the node at or after this epoch time")
+    arg_parser.add_argument("--lines", type=int, metavar="TEMPLATE_ID", help="Print the lines of a template")
+    args = arg_parser.parse_args()
+
+    store = TemplateStore(args.db_dir)
+    if not store.exists():
+        print("No " + TEMPLATES_FILE + " in " + args.db_dir + ", run parser.py --templates first")
+        exit(1)
+    if args.lines is not None:
+        for timestamp, node_name, _, message in store.lines(args.lines):
+            print(format_time(timestamp), node_name, message)
+        return
+    for node_name in args.node or store.node_names():
+        print(node_name)
+        print("  %6s %8s %-19s  %s" % ("id", "lines", "first seen", "template"))
+        for template, count, first, _ in store.top(node_name, args.by, args.top, args.since):
+            print("  %6d %8d %-19s  %s" % (template.template_id, count, format_time(first), " ".join(template.tokens)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Decoder for the "Mon DD HH:MM:SS" syslog prefix of journal lines.
+
+The prefix has no year. It is inferred from the "-- Logs begin at ... end at
+... --" header journalctl writes at the top of docker.out/kubelet.out: every
+line gets the latest year that does not put it after the end of the journal,
+so a journal that crosses new year gets December lines in the previous year.
+Without a header the modification time of the log (or now) is used as the end.
+
+Epoch seconds are memoized per minute, which replaces a strptime() per
+matched line with a dict lookup and a few int() calls.
+"""
+
+import calendar
+import re
+import time
+
+MONTHS = {m: i for i, m in enumerate(calendar.month_abbr) if m}
+
+HEADER_RE = re.compile(r"^-- (?:Logs begin|Journal begins) at \w+ (?P<begin>\d{4}-\d\d-\d\d \d\d:\d\d:\d\d)"
+                       r".*?, ends? at \w+ (?P<end>\d{4}-\d\d-\d\d \d\d:\d\d:\d\d)")
+
+# Sub-second time embedded in the message, with the HH:MM:SS it belongs to:
+#   time="2022-09-05T15:11:40.123456Z"      (logrus)
+#   I0905 14:08:40.126274                   (klog)
+#   2022-09-01 21:41:31,402                 (supervisord)
+SUBSECOND_RE = re.compile(r"""(?:time="\d{4}-\d\d-\d\dT|[IWEF]\d{4} |\d{4}-\d\d-\d\d )"""
+                          r"""(?P<hms>\d\d:\d\d:\d\d)[.,](?P<frac>\d+)""")
+
+MEMO_LIMIT = 100000
+
+
+def is_header(line: str) -> bool:
+    return line.startswith("-- ")
+
+
+class TimestampDecoder:
+    def __init__(self, subsecond: bool = False):
+        self.subsecond = subsecond
+        self.memo = {}
+        self.set_end(time.gmtime())
+        self.begin_year = None
+
+    def set_end(self, end: time.struct_time) -> None:
+        self.end_year = end.tm_year
+        self.end_key = (end.tm_mon, end.tm_mday, end.tm_hour, end.tm_min)
+        self.memo = {}
+
+    def set_header(self, line: str, fallback_mtime: float = None) -> None:
+        """Anchors the year inference on a journal header or, failing that, a file mtime."""
+        m = HEADER_RE.match(line)
+        if m is not None:
+            self.begin_year = int(m.group("begin")[:4])
+            self.set_end(time.strptime(m.group("end"), "%Y-%m-%d %H:%M:%S"))
+        else:
+            self.begin_year = None
+            self.set_end(time.gmtime(fallback_mtime))
+
+    def minute_epoch(self, prefix: str) -> int:
+        # prefix is "Mon DD HH:MM"
+        epoch = self.memo.get(prefix)
+        if epoch is None:
+            mon, day = MONTHS[prefix[:3]], int(prefix[4:6])
+            hour, minute = int(prefix[7:9]), int(prefix[10:12])
+            year = self.end_year
+            if (mon, day, hour, minute) > self.end_key:
+                year -= 1
+            if self.begin_year is not None and year < self.begin_year:
+                year = self.begin_year
+            epoch = calendar.timegm((year, mon, day, hour, minute, 0, 0, 0, 0))
+            if len(self.memo) >= MEMO_LIMIT:
+                self.memo = {}
+            self.memo[prefix] = epoch
+        return epoch
+
+    def decode(self, timestamp: str, rest: str = ""):
+        """Epoch seconds of "Mon DD HH:MM:SS", a float when sub-second precision was found in rest."""
+        seconds = self.minute_epoch(timestamp[:12]) + int(timestamp[13:15])
+        if self.subsecond:
+            m = SUBSECOND_RE.search(rest)
+            if m is not None and m.group("hms") == timestamp[7:15]:
+                return seconds + float("0." + m.group("frac"))
+        return seconds
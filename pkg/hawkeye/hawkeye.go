@@ -160,7 +160,8 @@ func NewNodePublishVolumeRec(vals []string) (record, error) {
 	}
 
 	// strip /mount from the pvName if needed (TODO: fix this in a better way)
-	pvName := strings.TrimSuffix(matches[2], "/mount\"")
+	// the trailing quote is only in databases parsed before the msg field was used
+	pvName := strings.TrimSuffix(strings.TrimSuffix(matches[2], "\""), "/mount")
 
 	return &nodePublishVolumeRec{
 		commonRec: &commonRec{
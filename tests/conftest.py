@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+Shared fixtures: the parser/ and display/ scripts import each other by bare
+name, so both directories go on sys.path like the scripts do themselves.
+
+tests/data/baseline/<case> holds the tables the parser wrote for
+test_data/<case> before the backlog changes (commit 71b919e).
+"""
+
+import calendar
+import os
+import shutil
+import sys
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "parser"))
+sys.path.insert(0, os.path.join(ROOT_DIR, "display"))
+
+import masterfile  # noqa: E402
+import parser  # noqa: E402
+
+TEST_DATA = os.path.join(ROOT_DIR, "test_data")
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "baseline")
+HAWKEYE_GO = os.path.join(ROOT_DIR, "pkg", "hawkeye", "hawkeye.go")
+LOGS = ("docker.out", "kubelet.out")
+# The baseline dated every line in 2022. The logs of test_data/sim have no
+# journal header, their year comes from the file mtime.
+LOG_MTIME = calendar.timegm((2022, 12, 31, 0, 0, 0))
+
+
+def copy_case(case: str, dest: str) -> str:
+    os.makedirs(dest)
+    for name in LOGS:
+        src = os.path.join(TEST_DATA, case, name)
+        if os.path.exists(src):
+            shutil.copyfile(src, os.path.join(dest, name))
+            os.utime(os.path.join(dest, name), (LOG_MTIME, LOG_MTIME))
+    return dest
+
+
+def parse_case(case_dir: str, **options) -> str:
+    case_parser = parser.Parser(case_dir, **options)
+    case_parser.start()
+    return case_parser.DB_DIR
+
+
+@pytest.fixture(scope="session")
+def parsed_case(tmp_path_factory):
+    """case name -> database directory of test_data/<case> parsed once per session."""
+    db_dirs = {}
+
+    def parse(case: str) -> str:
+        if case not in db_dirs:
+            case_dir = copy_case(case, str(tmp_path_factory.mktemp("parsed") / case))
+            db_dirs[case] = parse_case(case_dir)
+        return db_dirs[case]
+    return parse
+
+
+@pytest.fixture(autouse=True)
+def reset_patterns():
+    # The LogLines of MasterFile.patterns are shared by every MasterFile,
+    # rows a test leaves in them would end up in the tables of the next one
+    yield
+    for logline_obj in masterfile.MasterFile.patterns:
+        logline_obj.df = {}
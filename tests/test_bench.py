@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""Tests of the synthetic journals of the benchmark suite."""
+
+import os
+import sys
+
+import pytest
+
+from conftest import ROOT_DIR, parse_case
+from test_tables import go_readers, read_rows
+
+sys.path.insert(0, os.path.join(ROOT_DIR, "bench"))
+import journal_generator  # noqa: E402
+
+START = 1662336000.0
+
+
+@pytest.fixture(scope="module")
+def generated(tmp_path_factory):
+    out_dir = str(tmp_path_factory.mktemp("bench"))
+    written = journal_generator.generate(out_dir, nodes=2, size_mb=0.2, density=0.3, seed=1, start=START)
+    return out_dir, written
+
+
+def test_same_seed_same_journals(generated, tmp_path):
+    out_dir, written = generated
+    again = journal_generator.generate(str(tmp_path), nodes=2, size_mb=0.2, density=0.3, seed=1, start=START)
+    assert [v for _, v in sorted(again.items())] == [v for _, v in sorted(written.items())]
+    for path in written:
+        with open(path, "rb") as f, open(os.path.join(str(tmp_path), os.path.relpath(path, out_dir)), "rb") as g:
+            assert f.read() == g.read()
+
+
+def test_journals_fill_the_go_tables(generated):
+    out_dir, _ = generated
+    db_dir = parse_case(os.path.join(out_dir, "node-0"))
+    for table, (reader, expected) in go_readers().items():
+        rows = read_rows(os.path.join(db_dir, table))
+        assert len(rows) > 1, table
+        assert {len(row) for row in rows} == {expected}, reader
+        ts_col = rows[0].index("timestamp")
+        assert all(START <= float(row[ts_col]) < START + journal_generator.JOURNAL_END_DAYS * 86400
+                   for row in rows[1:])
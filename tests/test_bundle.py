@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""Tests of parsing diag bundles straight from their archives."""
+
+import gzip
+import os
+import shutil
+import tarfile
+
+import bundle
+from conftest import LOGS, copy_case, parse_case
+from test_checkpoint import assert_same_tables
+
+CASE = "PWX-26783"
+
+
+def test_output_dir(tmp_path):
+    case_dir = str(tmp_path / "case")
+    os.mkdir(case_dir)
+    assert bundle.output_dir(case_dir) == case_dir
+    archive = str(tmp_path / "case.tar.gz")
+    open(archive, "wb").close()
+    assert bundle.output_dir(archive) == case_dir
+    log = str(tmp_path / "docker.out.gz")
+    open(log, "wb").close()
+    # Next to the uncompressed log, not on top of it
+    open(str(tmp_path / "docker.out"), "wb").close()
+    assert bundle.output_dir(log) == str(tmp_path / "docker.out.d")
+    assert os.path.isdir(str(tmp_path / "docker.out.d"))
+
+
+def test_tar_gz(parsed_case, tmp_path):
+    case_dir = copy_case(CASE, str(tmp_path / "files" / CASE))
+    archive = str(tmp_path / (CASE + ".tar.gz"))
+    with tarfile.open(archive, "w:gz") as tar:
+        for name in LOGS:
+            tar.add(os.path.join(case_dir, name), arcname=os.path.join("diags", name))
+    assert_same_tables(parse_case(archive), parsed_case(CASE))
+    assert os.path.isdir(str(tmp_path / CASE / "database"))
+
+
+def test_gz_next_to_the_log(parsed_case, tmp_path):
+    case_dir = copy_case(CASE, str(tmp_path / CASE))
+    docker = os.path.join(case_dir, "docker.out")
+    with open(docker, "rb") as src, gzip.open(docker + ".gz", "wb") as dest:
+        shutil.copyfileobj(src, dest)
+    db_dir = parse_case(docker + ".gz")
+    assert db_dir == docker + ".d/database"
+    assert_same_tables(db_dir, parsed_case(CASE))
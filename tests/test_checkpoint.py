@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""Tests of the incremental re-parses resumed from checkpoint.json."""
+
+import json
+import os
+import shutil
+
+import checkpoint
+import masterfile
+import timestamps
+from conftest import LOG_MTIME, copy_case, parse_case
+from test_tables import read_rows
+
+CASE = "PWX-26783"
+
+
+def assert_same_tables(db_dir: str, expected_dir: str) -> None:
+    tables = sorted(f for f in os.listdir(expected_dir) if f.startswith("table_"))
+    assert sorted(f for f in os.listdir(db_dir) if f.startswith("table_")) == tables
+    for filename in tables + ["index.csv"]:
+        assert read_rows(os.path.join(db_dir, filename)) == read_rows(os.path.join(expected_dir, filename)), filename
+
+
+def write_truncated(src: str, dest: str, size: int) -> None:
+    with open(src, "rb") as f:
+        data = f.read(size)
+    with open(dest, "wb") as f:
+        f.write(data)
+    os.utime(dest, (LOG_MTIME, LOG_MTIME))
+
+
+def test_lines_end(tmp_path):
+    path = str(tmp_path / "log")
+    for data, end in [(b"", 0), (b"no newline", 0), (b"a\n", 2), (b"a\nbb\nccc", 5),
+                      (b"x" * 10000 + b"\n" + b"y" * 10000, 10001)]:
+        with open(path, "wb") as f:
+            f.write(data)
+        assert checkpoint.lines_end(path, len(data)) == end
+
+
+def test_resume_after_partial_line(tmp_path, parsed_case):
+    case_dir = copy_case(CASE, str(tmp_path / CASE))
+    docker = os.path.join(case_dir, "docker.out")
+    full_size = os.path.getsize(docker)
+    # Mid-line, as a log still being written
+    shutil.copyfile(docker, str(tmp_path / "docker.out"))
+    write_truncated(str(tmp_path / "docker.out"), docker, full_size // 2 + 17)
+    db_dir = parse_case(case_dir)
+    with open(os.path.join(db_dir, checkpoint.CHECKPOINT_FILE)) as f:
+        offset = json.load(f)["files"]["../docker.out"]["offset"]
+    with open(docker, "rb") as f:
+        assert f.read()[offset - 1:offset] == b"\n"
+
+    write_truncated(str(tmp_path / "docker.out"), docker, full_size)
+    ckpt = checkpoint.Checkpoint(db_dir, {"subsecond": False, "storage": "csv"})
+    kubelet = os.path.join(case_dir, "kubelet.out")
+    tasks, _ = ckpt.plan([docker, kubelet], masterfile.MasterFile.patterns)
+    assert not ckpt.rebuild
+    assert tasks == [(docker, offset, full_size, None)]
+    parse_case(case_dir)
+    assert_same_tables(db_dir, parsed_case(CASE))
+
+
+def test_resume_from_another_directory(tmp_path, monkeypatch, parsed_case):
+    case_dir = copy_case(CASE, str(tmp_path / CASE))
+    monkeypatch.chdir(str(tmp_path))
+    parse_case(CASE)
+    monkeypatch.chdir(case_dir)
+    ckpt = checkpoint.Checkpoint("database", {"subsecond": False, "storage": "csv"})
+    tasks, _ = ckpt.plan(["docker.out", "kubelet.out"], masterfile.MasterFile.patterns)
+    assert not ckpt.rebuild
+    assert tasks == []
+    parse_case(".")
+    assert_same_tables(os.path.join(case_dir, "database"), parsed_case(CASE))
+
+
+def test_rewritten_file_rebuilds(tmp_path):
+    case_dir = copy_case(CASE, str(tmp_path / CASE))
+    db_dir = parse_case(case_dir)
+    docker = os.path.join(case_dir, "docker.out")
+    write_truncated(docker, docker, os.path.getsize(docker) // 2)
+    ckpt = checkpoint.Checkpoint(db_dir, {"subsecond": False, "storage": "csv"})
+    kubelet = os.path.join(case_dir, "kubelet.out")
+    tasks, _ = ckpt.plan([docker, kubelet], masterfile.MasterFile.patterns)
+    assert ckpt.rebuild
+    assert (docker, 0, checkpoint.lines_end(docker, os.path.getsize(docker)), None) in tasks
+
+
+def test_line_without_header_is_skipped():
+    # What a resume in the middle of a line used to see
+    logline = masterfile.LogLine("Storage is ready", r"Storage is ready", "docker.out")
+    assert logline.found_a_pattern('ready" msg="Storage is ready"\n', timestamps.TimestampDecoder()) == 0
+    assert logline.df == {}
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""Tests of the cluster database merged from the bundles of several nodes."""
+
+import os
+
+import pytest
+
+import cluster
+from conftest import copy_case
+from test_tables import go_readers, read_rows
+
+CASES = ["PWX-26783", "sim"]
+
+
+@pytest.fixture(scope="module")
+def cluster_db(tmp_path_factory):
+    root = tmp_path_factory.mktemp("cluster")
+    bundles = [copy_case(case, str(root / case)) for case in CASES]
+    cluster.Cluster(str(root / "cluster"), bundles).start()
+    return str(root / "cluster" / "database"), [os.path.join(b, "database") for b in bundles]
+
+
+def tables_of(db_dir: str) -> set:
+    return {f for f in os.listdir(db_dir) if f.startswith("table_")}
+
+
+def test_partition_names():
+    assert cluster.partition_names(["a/node1.tar.gz", "b/node2/"]) == ["node1", "node2"]
+    assert cluster.partition_names(["a/diags.tar.gz", "b/diags.tar.gz"]) == ["diags_0", "diags_1"]
+
+
+def test_merged_tables_keep_node_rows(cluster_db):
+    db_dir, node_dbs = cluster_db
+    assert tables_of(db_dir) == set.union(*(tables_of(d) for d in node_dbs))
+    for filename in tables_of(db_dir):
+        merged = read_rows(os.path.join(db_dir, filename))
+        bundles = cluster.row_bundles(db_dir, filename)
+        assert len(bundles) == len(merged) - 1
+        for case, node_db in zip(CASES, node_dbs):
+            path = os.path.join(node_db, filename)
+            if not os.path.exists(path):
+                assert case not in bundles
+                continue
+            node_rows = read_rows(path)
+            assert merged[0] == node_rows[0]
+            assert [row for row, b in zip(merged[1:], bundles) if b == case] == node_rows[1:]
+
+
+def test_merged_tables_are_in_time_order(cluster_db):
+    db_dir, _ = cluster_db
+    for filename in tables_of(db_dir):
+        rows = read_rows(os.path.join(db_dir, filename))
+        ts_col = rows[0].index(cluster.TIMESTAMP)
+        timestamps = [float(row[ts_col]) for row in rows[1:]]
+        assert timestamps == sorted(timestamps), filename
+
+
+def test_merged_tables_match_go_readers(cluster_db):
+    db_dir, _ = cluster_db
+    for table, (reader, expected) in go_readers().items():
+        path = os.path.join(db_dir, table)
+        if os.path.exists(path):
+            assert {len(row) for row in read_rows(path)} == {expected}, reader
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""Tests of the live collector, run against live/fake-kubectl."""
+
+import asyncio
+import csv
+import os
+import shutil
+import sys
+
+import pytest
+
+from conftest import ROOT_DIR
+
+LIVE_DIR = os.path.join(ROOT_DIR, "live")
+sys.path.insert(0, LIVE_DIR)
+import collector  # noqa: E402
+
+FAKE_KUBECTL = os.path.join(LIVE_DIR, "fake-kubectl")
+SAMPLE_DIR = os.path.join(LIVE_DIR, "9f3b2d86-0ddd-446b-87e9-8338e2507f96")
+
+
+@pytest.fixture
+def cluster(tmp_path, monkeypatch):
+    # Two pods of the sample collection
+    root = str(tmp_path / "cluster")
+    pods = sorted(p for p in os.listdir(SAMPLE_DIR) if os.path.isdir(os.path.join(SAMPLE_DIR, p)))[:2]
+    for pod in pods:
+        shutil.copytree(os.path.join(SAMPLE_DIR, pod), os.path.join(root, pod))
+    monkeypatch.setenv("FAKE_KUBECTL_DIR", root)
+    return root, pods
+
+
+def collect(out_dir: str, **options) -> list:
+    c = collector.Collector(out_dir, FAKE_KUBECTL, **options)
+    results = asyncio.run(c.collect())
+    c.save_stats(results)
+    return results
+
+
+def test_collects_every_output(cluster, tmp_path):
+    root, pods = cluster
+    out_dir = str(tmp_path / "out")
+    results = collect(out_dir, concurrency=4)
+    assert len(results) == 2 * len(collector.NODE_COMMANDS) + len(collector.CLUSTER_COMMANDS)
+    for r in results:
+        assert (r.returncode, r.attempts, r.error) == (0, 1, "")
+        with open(os.path.join(out_dir, r.pod, r.filename), "rb") as f, \
+                open(os.path.join(root, r.pod, r.filename), "rb") as expected:
+            assert f.read() == expected.read()
+    cluster_files = {filename for filename, _ in collector.CLUSTER_COMMANDS}
+    assert {r.pod for r in results if r.filename in cluster_files} == {pods[0]}
+    with open(os.path.join(out_dir, collector.STATS_FILE), newline="") as f:
+        assert len(list(csv.DictReader(f))) == len(results)
+
+
+def test_retries_failures(cluster, tmp_path, monkeypatch):
+    monkeypatch.setenv("FAKE_KUBECTL_FAIL_RATE", "1")
+    sleep = asyncio.sleep
+    # No backoff, the retries are what is tested
+    monkeypatch.setattr(collector.asyncio, "sleep", lambda seconds: sleep(0))
+    out_dir = str(tmp_path / "out")
+    results = collect(out_dir, retries=1, concurrency=32)
+    for r in results:
+        assert (r.returncode, r.attempts, r.error) == (1, 2, "exit code 1")
+        assert len(r.attempt_seconds) == 2
+        # Written even when the command failed, as the shell redirect did
+        assert os.path.getsize(os.path.join(out_dir, r.pod, r.filename)) == 0
+
+
+def test_kills_hung_commands(cluster, tmp_path, monkeypatch):
+    monkeypatch.setenv("FAKE_KUBECTL_HANG_RATE", "1")
+    results = collect(str(tmp_path / "out"), retries=0, timeout=1, concurrency=32)
+    for r in results:
+        assert (r.returncode, r.attempts, r.error) == (None, 1, "timeout after 1s")
+        assert r.seconds < 5
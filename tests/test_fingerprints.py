@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""Tests of the fingerprints evaluated in the parse pass."""
+
+import glob
+import json
+import os
+import re
+
+import pytest
+
+import fingerprints
+import masterfile
+from conftest import LOG_MTIME, LOGS, copy_case, parse_case
+
+CASE = "PWX-26783"
+
+
+def expected_counts(case_dir: str) -> dict:
+    # Lines of its Logfile (of every log without one) each fingerprint matches
+    counts = {}
+    for fp in fingerprints.load_fingerprints():
+        for name in LOGS:
+            if fp.logfile and fp.logfile != name:
+                continue
+            with open(os.path.join(case_dir, name), errors="replace") as f:
+                n = sum(1 for line in f if masterfile.HEADER_RE.match(line) and fp.regex.search(line))
+            if n:
+                counts[fp.pattern_name] = counts.get(fp.pattern_name, 0) + n
+    return counts
+
+
+@pytest.mark.parametrize("path", sorted(glob.glob(os.path.join(fingerprints.DEFAULT_DIR, "*.json"))))
+def test_examples_match(path):
+    with open(path) as f:
+        data = json.load(f)
+    assert data["Logfile"] in LOGS
+    assert re.search(data["Regex"], data["Example"])
+
+
+def test_logfile_dispatch(tmp_path):
+    case_dir = copy_case(CASE, str(tmp_path / CASE))
+    # A kubelet line in docker.out is not a kubelet fingerprint hit
+    with open(os.path.join(case_dir, "kubelet.out"), errors="replace") as f:
+        kubelet_lines = [line for line in f if "csi.sock: connect: connection refused" in line]
+    assert kubelet_lines
+    with open(os.path.join(case_dir, "docker.out"), "a") as f:
+        f.writelines(kubelet_lines[:3])
+    os.utime(os.path.join(case_dir, "docker.out"), (LOG_MTIME, LOG_MTIME))
+    expected = expected_counts(case_dir)
+    assert len(expected) == 2
+
+    for jobs in [1, 2]:
+        db_dir = parse_case(case_dir, jobs=jobs, full=True)
+        counts = {}
+        for row in fingerprints.read_results(db_dir):
+            counts[row["title"]] = counts.get(row["title"], 0) + int(row["count"])
+        assert counts == expected
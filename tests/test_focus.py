@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""Tests of focus_index.npz and its lookups."""
+
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+import focus
+from conftest import LOG_MTIME, copy_case, parse_case
+
+CASE = "PWX-26783"
+PUBLISH_TABLE = "table_NodePublishVolume_Request.csv"
+
+
+def read_table(db_dir: str, filename: str) -> pd.DataFrame:
+    df = pd.read_csv(os.path.join(db_dir, filename), dtype=str, keep_default_na=False)
+    df[focus.TIMESTAMP] = pd.to_numeric(df[focus.TIMESTAMP])
+    return df
+
+
+def test_target_path_objects():
+    path = ("/var/lib/kubelet/pods/6552d0e5-606f-41d1-bf7f-478d7e7e60c1/volumes/kubernetes.io~csi/"
+            "pvc-05b19920-4646-470a-a4c8-19aa5247fe89/mount")
+    expected = [("6552d0e5-606f-41d1-bf7f-478d7e7e60c1", "pod_uid"), ("pvc-05b19920-4646-470a-a4c8-19aa5247fe89", "pv")]
+    assert focus.target_path_objects(path) == expected
+    # As kept by the tables parsed from the raw line
+    assert focus.target_path_objects(path + '"') == expected
+    assert focus.target_path_objects("/mnt/other") == []
+
+
+def test_pod_uid_gives_the_focus_rows(parsed_case):
+    db_dir = parsed_case(CASE)
+    index = focus.FocusIndex(db_dir)
+    table = read_table(db_dir, PUBLISH_TABLE)
+    uids = table["target_path"].str.extract(focus.TARGET_PATH_RE.pattern)[0]
+    assert set(index.list_objects("pod_uid")) == set(uids)
+    for uid in set(uids):
+        records = index.records(uid)
+        expected = table[uids == uid].reset_index(drop=True)
+        assert set(records["table"]) == {PUBLISH_TABLE}
+        pd.testing.assert_frame_equal(records.drop(columns="table"), expected)
+
+
+def test_lookup_in_time_range(parsed_case):
+    db_dir = parsed_case(CASE)
+    index = focus.FocusIndex(db_dir)
+    table = read_table(db_dir, PUBLISH_TABLE)
+    vol_id = table["vol_id"].iloc[0]
+    start, end = 1662386894, 1662387300
+    records = index.records(vol_id, start, end)
+    expected = table[(table["vol_id"] == vol_id) & (table[focus.TIMESTAMP] >= start) &
+                     (table[focus.TIMESTAMP] < end)]
+    assert len(records) == len(expected) > 0
+    assert records[focus.TIMESTAMP].between(start, end, inclusive="left").all()
+
+
+def test_index_holds_no_objects(parsed_case):
+    with np.load(os.path.join(parsed_case(CASE), focus.INDEX_FILE), allow_pickle=False) as npz:
+        assert all(npz[name].dtype != object for name in npz.files)
+
+
+def test_incremental_index_matches_full_build(tmp_path):
+    case_dir = copy_case(CASE, str(tmp_path / CASE))
+    docker = os.path.join(case_dir, "docker.out")
+    shutil.copyfile(docker, str(tmp_path / "docker.out"))
+    with open(str(tmp_path / "docker.out"), "rb") as f:
+        data = f.read()
+    half = data.rfind(b"\n", 0, len(data) // 2) + 1
+    with open(docker, "wb") as f:
+        f.write(data[:half])
+    db_dir = parse_case(case_dir)
+    with open(docker, "ab") as f:
+        f.write(data[half:])
+    os.utime(docker, (LOG_MTIME, LOG_MTIME))
+    parse_case(case_dir)
+
+    incremental = focus.read_index(db_dir)
+    os.remove(os.path.join(db_dir, focus.INDEX_FILE))
+    focus.build_index(db_dir, list(incremental["tables"]))
+    full = focus.read_index(db_dir)
+    assert incremental["tables"] == full["tables"]
+    assert incremental["kinds"] == full["kinds"]
+    for value, by_table in full["objects"].items():
+        assert by_table.keys() == incremental["objects"][value].keys()
+        for filename, (ts, offsets) in by_table.items():
+            np.testing.assert_array_equal(incremental["objects"][value][filename][0], ts)
+            np.testing.assert_array_equal(incremental["objects"][value][filename][1], offsets)
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""Tests of parser.py --follow, fed from a file and from a FIFO."""
+
+import io
+import json
+import os
+import shutil
+import threading
+import time
+
+import pytest
+
+import masterfile
+import parser
+from conftest import LOG_MTIME, TEST_DATA, parse_case
+from test_checkpoint import assert_same_tables
+from test_tables import read_rows
+
+CASE = "PWX-26783"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Years are inferred from the clock when following, pin it to the year of the logs
+    monkeypatch.setattr(parser.time, "time", lambda: LOG_MTIME)
+
+
+def follow(root_dir: str, source: str, interval: float) -> list:
+    out = io.StringIO()
+    parser.Parser(root_dir).follow(source, interval, out)
+    return [json.loads(line) for line in out.getvalue().splitlines()]
+
+
+def feed(fifo: str, path: str) -> None:
+    # Writes path in a few bursts, so that --follow cuts several batches
+    with open(path) as f:
+        lines = f.readlines()
+    with open(fifo, "w") as f:
+        step = len(lines) // 4 + 1
+        for i in range(0, len(lines), step):
+            f.writelines(lines[i:i + step])
+            f.flush()
+            time.sleep(0.2)
+
+
+def test_follow_matches_parse(tmp_path, clock, parsed_case):
+    records = follow(str(tmp_path), os.path.join(TEST_DATA, CASE, "docker.out"), 0.05)
+    db_dir = str(tmp_path / "database")
+    assert_same_tables(db_dir, parsed_case(CASE))
+    rows = sum(len(read_rows(os.path.join(db_dir, f))) - 1 for f in os.listdir(db_dir) if f.startswith("table_"))
+    assert len([r for r in records if "pattern_name" in r]) == rows
+
+
+def test_follow_appends_batches(tmp_path, monkeypatch, clock, parsed_case):
+    fifo = str(tmp_path / "docker.out")
+    os.mkfifo(fifo)
+    writer = threading.Thread(target=feed, args=(fifo, os.path.join(TEST_DATA, CASE, "docker.out")))
+    writer.start()
+    flushes = []
+    flush_tables = masterfile.MasterFile.flush_tables
+    monkeypatch.setattr(masterfile.MasterFile, "flush_tables",
+                        lambda self: flushes.append(flush_tables(self)))
+    follow(str(tmp_path), fifo, 0.05)
+    writer.join()
+    assert len(flushes) > 1
+    assert_same_tables(str(tmp_path / "database"), parsed_case(CASE))
+
+
+def test_parse_refuses_followed_tables(tmp_path, clock):
+    follow(str(tmp_path), os.path.join(TEST_DATA, CASE, "docker.out"), 0.05)
+    shutil.copyfile(os.path.join(TEST_DATA, CASE, "docker.out"), str(tmp_path / "docker.out"))
+    with pytest.raises(RuntimeError):
+        parse_case(str(tmp_path))
+    parse_case(str(tmp_path), full=True)
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""Tests of the per node and pattern heatmap."""
+
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+import focus
+import heatmap
+
+CASE = "PWX-26783"
+
+
+def test_counts_match_the_tables(parsed_case):
+    db_dir = parsed_case(CASE)
+    result = heatmap.compute(db_dir)
+    index = pd.read_csv(os.path.join(db_dir, "index.csv"), dtype=str)
+    expected = {}
+    for filename, name in zip(index["filename"], index["pattern_name"]):
+        table = pd.read_csv(os.path.join(db_dir, filename), dtype={"node_name": str})
+        for node, count in table["node_name"].value_counts().items():
+            expected[(node, name)] = count
+    assert {tuple(row): int(n) for row, n in zip(result["rows"], result["counts"].sum(axis=1))} == expected
+    assert result["counts"].shape[1] <= heatmap.MAX_BUCKETS
+
+
+def test_builds_a_missing_index(parsed_case, tmp_path):
+    db_dir = str(tmp_path / "database")
+    shutil.copytree(parsed_case(CASE), db_dir)
+    expected = heatmap.compute(db_dir)
+    os.remove(os.path.join(db_dir, focus.INDEX_FILE))
+    result = heatmap.compute(db_dir)
+    assert os.path.exists(os.path.join(db_dir, focus.INDEX_FILE))
+    assert result["rows"] == expected["rows"]
+    np.testing.assert_array_equal(result["counts"], expected["counts"])
+
+
+def test_rebuilds_a_stale_index(parsed_case, tmp_path):
+    db_dir = str(tmp_path / "database")
+    shutil.copytree(parsed_case(CASE), db_dir)
+    expected = heatmap.compute(db_dir)
+    path = os.path.join(db_dir, "table_PX_Daemon_Ready.csv")
+    with open(path) as f:
+        last = f.readlines()[-1]
+    with open(path, "a") as f:
+        f.write(last)
+    result = heatmap.compute(db_dir)
+    assert result["counts"].sum() == expected["counts"].sum() + 1
+
+
+def test_kinds_filter(parsed_case):
+    db_dir = parsed_case(CASE)
+    full = focus.read_index(db_dir)
+    nodes = focus.read_index(db_dir, kinds={"node"})
+    assert set(nodes["kinds"].values()) == {"node"}
+    assert nodes["kinds"] == {v: k for v, k in full["kinds"].items() if k == "node"}
+    for node in nodes["objects"]:
+        assert nodes["objects"][node].keys() == full["objects"][node].keys()
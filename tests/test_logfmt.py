@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+"""Tests of the logfmt tokenizer of the portworx lines."""
+
+import logfmt
+
+LINE = ('Sep 05 15:11:25 node1 portworx[3250]: time="2022-09-05T15:11:25Z" level=info msg="Storage is ready" '
+        'file="driver.go:2150" component=porx/storage/driver/volume')
+
+
+def test_fields():
+    assert logfmt.parse(LINE) == {"time": "2022-09-05T15:11:25Z", "level": "info", "msg": "Storage is ready",
+                                  "file": "driver.go:2150", "component": "porx/storage/driver/volume"}
+
+
+def test_escapes_are_removed():
+    fields = logfmt.parse(r'level=info msg="Mount \"pvc-1\" at C:\\mnt" error=')
+    assert fields == {"level": "info", "msg": r'Mount "pvc-1" at C:\mnt', "error": ""}
+
+
+def test_first_value_of_a_key_wins():
+    assert logfmt.parse('msg="a=1 b=2" a=3')["a"] == "3"
+    assert logfmt.parse("level=info level=error")["level"] == "info"
+
+
+def test_unterminated_quote_runs_to_end_of_line():
+    fields = logfmt.parse('level=info msg="NodePublishVolume request TargetPath: /var/lib/kubelet x=1\n')
+    assert fields == {"level": "info", "msg": "NodePublishVolume request TargetPath: /var/lib/kubelet x=1"}
+
+
+def test_fields_of_the_last_line_are_reused():
+    line = 'level=info msg="x"'
+    assert logfmt.fields(line) is logfmt.fields(line)
+    assert logfmt.fields('level=error msg="y"')["level"] == "error"
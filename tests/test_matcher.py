@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""Tests of the anchored single-pass matcher."""
+
+import os
+
+import pytest
+
+import fingerprints
+import masterfile
+import matcher
+from conftest import LOGS, TEST_DATA
+
+
+def test_required_literals():
+    assert matcher.required_literals(r"Started px with pid (?P<pid>\d+)") == ["Started px with pid "]
+    assert matcher.required_literals(r"exit status (?P<code>\d+) (?:now)") == ["exit status ", " now"]
+    # Optional or alternative parts are not required
+    assert matcher.required_literals(r"a(?:bc)?d|e") == []
+    assert matcher.required_literals(r"(?i)Storage is ready") == []
+    assert matcher.required_literals(r"(") == []
+
+
+def test_anchors():
+    assert matcher.anchor_for(r"PX is ready on Node: (?P<node_id>\S+)\. CLI accessible") == "PX is ready on Node: "
+    # A msg pattern is found unescaped in the raw line only up to a quote
+    assert matcher.field_anchor(r'drive "(?P<drive_id>\S+)" attached on host') == " attached on host"
+
+
+def test_digit_groups():
+    assert matcher.digit_groups(r"pid (?P<pid>\d+) code (?P<code>[0-9]+) (?P<name>\S+) (?P<opt>\d*)") == \
+        {"pid", "code"}
+
+
+@pytest.mark.parametrize("case", ["PWX-26783", "sim"])
+def test_matches_every_pattern(case):
+    loglines = list(masterfile.MasterFile.patterns) + fingerprints.load_fingerprints()
+    pattern_matcher = matcher.PatternMatcher(loglines)
+    matched = 0
+    for name in LOGS:
+        with open(os.path.join(TEST_DATA, case, name), errors="replace") as f:
+            for line in f:
+                expected = [l for l in loglines if l.search(line)]
+                assert pattern_matcher.match(line) == expected, line
+                matched += len(expected)
+    assert matched > 0
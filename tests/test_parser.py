@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""Tests of parser.py runs with other options than the defaults."""
+
+import os
+
+import pytest
+
+import masterfile
+import parser
+from conftest import copy_case, parse_case
+from test_checkpoint import assert_same_tables
+
+CASES = ["PWX-26783", "sim"]
+
+
+def table_lists(tables: list) -> list:
+    return [{col: list(vals) for col, vals in df.items()} for df in tables]
+
+
+def test_split_range_ends_at_newlines(tmp_path):
+    path = str(tmp_path / "log")
+    with open(path, "wb") as f:
+        f.write(b"".join(b"line %d %s\n" % (i, b"x" * (i % 50)) for i in range(2000)))
+    size = os.path.getsize(path)
+    ranges = parser.split_range(path, 0, size, chunk_size=1000)
+    assert len(ranges) > 1
+    assert ranges[0][1] == 0 and ranges[-1][2] == size
+    with open(path, "rb") as f:
+        data = f.read()
+    for (_, start, end, _), (_, next_start, _, _) in zip(ranges, ranges[1:]):
+        assert end == next_start
+        assert data[end - 1:end] == b"\n"
+
+
+def test_chunks_give_the_rows_of_one_pass(tmp_path):
+    case_dir = copy_case("PWX-26783", str(tmp_path / "case"))
+    docker = os.path.join(case_dir, "docker.out")
+    master = masterfile.MasterFile(str(tmp_path))
+    for task in parser.split_range(docker, 0, os.path.getsize(docker), chunk_size=256 * 1024):
+        parser.parse_range(master, *task)
+    chunked = table_lists(master.take_tables())
+    parser.parse_file(master, docker)
+    one_pass = table_lists(master.take_tables())
+    assert any(one_pass)
+    assert chunked == one_pass
+
+
+@pytest.mark.parametrize("case", CASES)
+def test_jobs(parsed_case, tmp_path, case):
+    case_dir = copy_case(case, str(tmp_path / case))
+    assert_same_tables(parse_case(case_dir, jobs=2), parsed_case(case))
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_memory_limit_spills(parsed_case, tmp_path, jobs):
+    # Every buffered row goes over the limit and is flushed on its own
+    case_dir = copy_case("PWX-26783", str(tmp_path / "case"))
+    assert_same_tables(parse_case(case_dir, jobs=jobs, memory_limit_mb=0), parsed_case("PWX-26783"))
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""Tests of the per pattern profiling of parser.py --profile."""
+
+import os
+
+import pandas as pd
+import pytest
+
+import profiling
+from conftest import copy_case, parse_case
+from test_checkpoint import assert_same_tables
+
+CASE = "PWX-26783"
+
+
+def stats_of(ns_of_length) -> profiling.PatternStats:
+    stats = profiling.PatternStats("p")
+    for length in [10, 100, 1000, 10000]:
+        for _ in range(profiling.MIN_BUCKET_LINES):
+            stats.add(ns_of_length(length), "x" * length, False)
+    return stats
+
+
+def test_length_exponent():
+    assert stats_of(lambda n: 7 * n).length_exponent() == pytest.approx(1.0)
+    assert stats_of(lambda n: n * n).length_exponent() == pytest.approx(2.0)
+    assert stats_of(lambda n: n * n).row(None)["superlinear"]
+    # Too few lines per bucket to fit
+    stats = profiling.PatternStats("p")
+    stats.add(10, "short", True)
+    assert stats.length_exponent() is None
+
+
+def test_merge():
+    merged = stats_of(lambda n: n)
+    merged.merge(stats_of(lambda n: 2 * n))
+    assert merged.tested == 8 * profiling.MIN_BUCKET_LINES
+    assert merged.max_ns == 20000
+    assert len(merged.slowest) == profiling.SLOWEST_LINES
+    assert max(merged.slowest)[0] == 20000
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_profile(parsed_case, tmp_path, jobs):
+    case_dir = copy_case(CASE, str(tmp_path / CASE))
+    db_dir = parse_case(case_dir, jobs=jobs, profile=True)
+    assert_same_tables(db_dir, parsed_case(CASE))
+    stats = pd.read_csv(os.path.join(db_dir, profiling.STATS_FILE), keep_default_na=False).set_index("pattern_name")
+    index = pd.read_csv(os.path.join(db_dir, "index.csv"))
+    for filename, name in zip(index["filename"], index["pattern_name"]):
+        rows = len(pd.read_csv(os.path.join(db_dir, filename)))
+        assert stats.loc[name, "hits"] == rows, name
+        assert stats.loc[name, "lines_tested"] >= rows
+    assert os.path.exists(os.path.join(db_dir, profiling.SLOWEST_LINES_FILE))
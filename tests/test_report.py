@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""Tests of the HTML report built from a diag bundle."""
+
+import os
+import tarfile
+
+import pytest
+
+import hawkeye_report
+from conftest import copy_case, parse_case
+
+NODES = {"node-1": "ip-10-13-0-1", "node-2": "ip-10-13-0-2"}
+BIG = "x" * (hawkeye_report.MAX_OUTPUT_CHARS + 100) + "<end>"
+
+
+def write(path: str, content: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(content)
+
+
+@pytest.fixture(params=["dir", "tar.gz"])
+def case(request, tmp_path):
+    case_dir = copy_case("PWX-26783", str(tmp_path / "case"))
+    for node, hostname in NODES.items():
+        write(os.path.join(case_dir, node, "uname.out"), "Linux " + hostname + " 5.4.0 x86_64\n")
+        write(os.path.join(case_dir, node, "pxctl_status.out"), "Status: PX is operational on " + node + "\n")
+    write(os.path.join(case_dir, "node-2", "lsblk.out"), BIG)
+    if request.param == "dir":
+        parse_case(case_dir)
+        return case_dir
+    archive = str(tmp_path / "bundle.tar.gz")
+    with tarfile.open(archive, "w:gz") as tar:
+        tar.add(case_dir, arcname="case")
+    parse_case(archive)
+    return archive
+
+
+def test_one_cluster_section_per_title(case):
+    report = hawkeye_report.Report(case)
+    output = report.get_cluster_command_output()
+    assert output.count("<h1>pxctl status</h1>") == 1
+    assert output.count("PX is operational") == 1
+
+
+def test_node_sections(case):
+    report = hawkeye_report.Report(case)
+    nodes = dict(report.get_nodes_command_output())
+    assert set(nodes) == set(NODES.values())
+    assert nodes["ip-10-13-0-1"].count("<h1>Node name</h1>") == 1
+    assert "<h1>lsblk</h1>" not in nodes["ip-10-13-0-1"]
+    assert "&lt;end&gt;" not in nodes["ip-10-13-0-2"]
+    assert "Truncated, show full output" in nodes["ip-10-13-0-2"]
+
+
+def test_full_output_link(case):
+    report = hawkeye_report.Report(case)
+    links = [link for name, _, link in report.scan() if link is not None]
+    assert len(links) == 1
+    with open(os.path.join(report.out_dir, links[0])) as f:
+        assert f.read() == BIG
+
+
+def test_page(case):
+    report = hawkeye_report.Report(case)
+    path = os.path.join(report.out_dir, "index.html")
+    report.write_page(path)
+    with open(path) as f:
+        page = f.read()
+    assert page == report.get_page()
+    assert page.count('data-role="header"') == 3
+    assert "<canvas" in page
+    assert "Sharedv4 export path fails to unmount" in page
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""Tests of the full-text index written by parser.py --search-index."""
+
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+import search
+from conftest import LOG_MTIME, LOGS, copy_case, parse_case
+
+CASE = "PWX-26783"
+QUERIES = ["TargetPath: /var/lib/kubelet", "NodePublishVolume", "ublishVolu", "level=info", "px-storage exited",
+           "Storage is ready", "no such line in the logs", "kubelet"]
+
+
+@pytest.fixture(scope="module")
+def indexed(tmp_path_factory):
+    case_dir = copy_case(CASE, str(tmp_path_factory.mktemp("search") / CASE))
+    return case_dir, parse_case(case_dir, search_index=True)
+
+
+def grep(case_dir: str, query: str, ignore_case: bool = False) -> list:
+    """Sorted (path, line) of the lines of the logs containing query, as grep -F finds them."""
+    found = []
+    for name in LOGS:
+        path = os.path.join(case_dir, name)
+        with open(path, "rb") as f:
+            for line in f:
+                text = line.decode(errors="replace").rstrip("\n")
+                if (query.lower() in text.lower()) if ignore_case else (query in text):
+                    found.append((path, text))
+    return sorted(found)
+
+
+def results(db_dir: str, query: str, **options) -> list:
+    index = search.SearchIndex(db_dir)
+    try:
+        return list(index.search(query, **options))
+    finally:
+        index.close()
+
+
+def test_varints_round_trip():
+    values = np.array([0, 1, 127, 128, 16383, 16384, 2 ** 28 - 1, 2 ** 28, 2 ** 32 - 1], dtype="int64")
+    packed = search.encode_varints(values)
+    assert len(packed) == int(search.varint_sizes(values).sum()) == 1 + 1 + 1 + 2 + 2 + 3 + 4 + 5 + 5
+    np.testing.assert_array_equal(search.decode_varints(packed), values)
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_search_equals_grep(indexed, query):
+    case_dir, db_dir = indexed
+    found = results(db_dir, query)
+    assert sorted((path, line) for _, _, path, line in found) == grep(case_dir, query)
+    times = [timestamp for timestamp, _, _, _ in found]
+    assert times == sorted(times)
+
+
+def test_search_ignore_case(indexed):
+    case_dir, db_dir = indexed
+    found = results(db_dir, "STORAGE IS READY", ignore_case=True)
+    assert len(found) > 0
+    assert sorted((path, line) for _, _, path, line in found) == grep(case_dir, "STORAGE IS READY", True)
+
+
+def test_search_filters(indexed):
+    _, db_dir = indexed
+    found = results(db_dir, "NodePublishVolume")
+    start, end = found[len(found) // 4][0], found[3 * len(found) // 4][0]
+    assert results(db_dir, "NodePublishVolume", start=start, end=end) == \
+        [r for r in found if start <= r[0] < end]
+    node = found[0][1]
+    assert results(db_dir, "NodePublishVolume", nodes=[node]) == [r for r in found if r[1] == node]
+    assert results(db_dir, "NodePublishVolume", nodes=["no-such-node"]) == []
+    assert results(db_dir, "NodePublishVolume", limit=3) == found[:3]
+
+
+def test_moved_database_finds_its_logs(tmp_path, indexed):
+    case_dir, db_dir = indexed
+    moved = str(tmp_path / "moved")
+    shutil.copytree(case_dir, moved)
+    for query in QUERIES:
+        assert [(t, n, line) for t, n, _, line in results(os.path.join(moved, "database"), query)] == \
+            [(t, n, line) for t, n, _, line in results(db_dir, query)]
+
+
+def test_incremental_index_equals_full_build(tmp_path, indexed):
+    _, db_dir = indexed
+    case_dir = copy_case(CASE, str(tmp_path / CASE))
+    docker = os.path.join(case_dir, "docker.out")
+    with open(docker, "rb") as f:
+        data = f.read()
+    half = data.rfind(b"\n", 0, len(data) // 2) + 1
+    with open(docker, "wb") as f:
+        f.write(data[:half])
+    parse_case(case_dir, search_index=True)
+    with open(docker, "ab") as f:
+        f.write(data[half:])
+    os.utime(docker, (LOG_MTIME, LOG_MTIME))
+    resumed_db = parse_case(case_dir, search_index=True)
+    for query in QUERIES:
+        assert [(t, n, line) for t, n, _, line in results(resumed_db, query)] == \
+            [(t, n, line) for t, n, _, line in results(db_dir, query)]
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""Tests of the SQLite storage backend."""
+
+import os
+
+import pandas as pd
+import pytest
+
+import store
+from conftest import copy_case, parse_case
+
+CASE = "PWX-26783"
+
+
+@pytest.fixture(scope="module")
+def both_db(tmp_path_factory):
+    case_dir = copy_case(CASE, str(tmp_path_factory.mktemp("store") / CASE))
+    db_dir = parse_case(case_dir, storage=store.BOTH)
+    db = store.Database(db_dir)
+    yield db_dir, db
+    db.close()
+
+
+def read_csv(db_dir: str, filename: str) -> pd.DataFrame:
+    return pd.read_csv(os.path.join(db_dir, filename), dtype=str, keep_default_na=False)
+
+
+def test_tables_match_csv(both_db):
+    db_dir, db = both_db
+    index = db.index()
+    assert sorted(index["filename"]) == sorted(read_csv(db_dir, "index.csv")["filename"])
+    for filename in index["filename"]:
+        expected = read_csv(db_dir, filename)
+        df = db.query(filename)
+        assert list(df.columns) == list(expected.columns)
+        pd.testing.assert_frame_equal(df.astype(str), expected, check_dtype=False)
+
+
+def test_column_types(both_db):
+    _, db = both_db
+    types = dict(db.conn.execute("SELECT name, type FROM db_columns WHERE table_name = ?",
+                                 (db.resolve_table("NodePublishVolume Request"),)))
+    assert types == {"timestamp": "INTEGER", "node_name": "dict", "vol_id": "TEXT", "target_path": "TEXT"}
+    types = dict(db.conn.execute("SELECT name, type FROM db_columns WHERE table_name = ?",
+                                 (db.resolve_table("PX Started"),)))
+    assert types["pid"] == "INTEGER"
+
+
+def test_query_filters(both_db):
+    db_dir, db = both_db
+    expected = read_csv(db_dir, "table_NodePublishVolume_Request.csv")
+    expected["timestamp"] = expected["timestamp"].astype(int)
+    vol_id = expected["vol_id"].iloc[0]
+    node = expected["node_name"].iloc[0]
+    start, end = expected["timestamp"].iloc[0], expected["timestamp"].iloc[-1]
+    df = db.query("NodePublishVolume Request", node=node, start=start, end=end, vol_id=vol_id)
+    rows = expected[(expected["node_name"] == node) & (expected["vol_id"] == vol_id) &
+                    (expected["timestamp"] >= start) & (expected["timestamp"] < end)]
+    assert len(df) == len(rows) > 0
+    assert db.query("NodePublishVolume Request", node="no-such-node").empty
+    with pytest.raises(KeyError):
+        db.query("No Such Table")
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+Regression tests of the tables written by parser.py: same rows as the
+baseline, and the column count every pkg/hawkeye reader checks.
+"""
+
+import csv
+import os
+import re
+
+import pytest
+
+import masterfile
+from conftest import BASELINE_DIR, HAWKEYE_GO
+
+CASES = ["PWX-26783", "sim"]
+# Tables the baseline patterns never matched, fixed by matching msg (user-018)
+NEW_TABLES = {"table_Cloud_Drive_Created.csv", "table_Mounting_KVDB_Device.csv"}
+
+
+def read_rows(path: str) -> list:
+    with open(path, newline="") as f:
+        return list(csv.reader(f))
+
+
+def baseline_rows(path: str) -> list:
+    rows = read_rows(path)
+    if "target_path" in rows[0]:
+        # The baseline kept the closing quote of msg="..." in target_path
+        col = rows[0].index("target_path")
+        for row in rows[1:]:
+            row[col] = row[col].rstrip('"')
+    return rows
+
+
+def go_readers() -> dict:
+    """{table filename: (reader, expected column count)} of pkg/hawkeye/hawkeye.go."""
+    with open(HAWKEYE_GO) as f:
+        source = f.read()
+    expected = dict(re.findall(r"func (New\w+Rec)\(vals \[\]string\) \(record, error\) \{.*?expected := (\d+)",
+                               source, re.S))
+    tables = re.findall(r'filepath\.Join\(path, "(table_\w+\.csv)"\)\s+\w+, err :?= getRecs\(fPath, [^,]+, (New\w+Rec)\)',
+                        source)
+    return {table: (reader, int(expected[reader])) for table, reader in tables}
+
+
+@pytest.mark.parametrize("case", CASES)
+def test_tables_match_baseline(parsed_case, case):
+    db_dir = parsed_case(case)
+    baseline_dir = os.path.join(BASELINE_DIR, case)
+    baseline_tables = {f for f in os.listdir(baseline_dir) if f.startswith("table_")}
+    tables = {f for f in os.listdir(db_dir) if f.startswith("table_")}
+    assert baseline_tables <= tables
+    assert tables - baseline_tables <= NEW_TABLES
+    for filename in sorted(baseline_tables):
+        assert read_rows(os.path.join(db_dir, filename)) == baseline_rows(os.path.join(baseline_dir, filename)), \
+            filename
+
+
+@pytest.mark.parametrize("case", CASES)
+def test_index_lists_the_tables(parsed_case, case):
+    db_dir = parsed_case(case)
+    baseline = {row[2]: row[0] for row in read_rows(os.path.join(BASELINE_DIR, case, "index.csv"))[1:]}
+    index = read_rows(os.path.join(db_dir, "index.csv"))
+    assert index[0] == ["logfile", "pattern", "filename", "pattern_name"]
+    logfiles = {row[2]: row[0] for row in index[1:]}
+    assert set(logfiles) == {f for f in os.listdir(db_dir) if f.startswith("table_")}
+    assert {f: logfiles[f] for f in baseline} == baseline
+
+
+def test_go_readers_found():
+    readers = go_readers()
+    assert set(readers) == {"table_PX_Daemon_Exited.csv", "table_PX_Daemon_Ready.csv",
+                            "table_NodePublishVolume_Request.csv", "table_MountDevice_Succeeded.csv",
+                            "table_MountVolume_Failed.csv"}
+
+
+@pytest.mark.parametrize("table", sorted(go_readers()))
+def test_pattern_columns_match_go_reader(table):
+    reader, expected = go_readers()[table]
+    loglines = [l for l in masterfile.MasterFile.patterns if l.get_table_name() == table]
+    assert len(loglines) == 1
+    assert len(loglines[0].table_columns()) == expected, reader
+
+
+@pytest.mark.parametrize("case", CASES)
+def test_parsed_tables_match_go_readers(parsed_case, case):
+    db_dir = parsed_case(case)
+    for table, (reader, expected) in go_readers().items():
+        path = os.path.join(db_dir, table)
+        if not os.path.exists(path):
+            continue
+        for row in read_rows(path):
+            assert len(row) == expected, reader
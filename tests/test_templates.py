@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""Tests of the template store mined by parser.py --templates."""
+
+import os
+
+import pytest
+
+import bundle
+import masterfile
+import templates
+import timestamps
+from conftest import copy_case, parse_case
+
+CASE = "PWX-26783"
+
+
+def unmatched_lines(case_dir: str) -> list:
+    """(node_name, message tokens) of the lines no table pattern matches, in parse order."""
+    lines = []
+    logs = (masterfile.MasterFile.PX_LOG, masterfile.MasterFile.KUBECTL_LOG)
+    for path in bundle.DirBundle(case_dir).iter_paths(logs):
+        with open(path) as f:
+            for line in f:
+                grp = templates.LINE_RE.match(line)
+                if grp is None or not grp.group("message").split():
+                    continue
+                if any(l.search(line) for l in masterfile.MasterFile.patterns):
+                    continue
+                lines.append((grp.group("node_name"), grp.group("message").split()))
+    return lines
+
+
+def stored_lines(db_dir: str) -> list:
+    return [(node_name, message.split()) for _, node_name, _, message in templates.TemplateStore(db_dir).lines()]
+
+
+@pytest.fixture(scope="module")
+def mined(tmp_path_factory):
+    case_dir = copy_case(CASE, str(tmp_path_factory.mktemp("templates") / CASE))
+    return case_dir, parse_case(case_dir, mine_templates=True)
+
+
+def test_lines_join_their_template():
+    miner = templates.TemplateMiner()
+    decoder = timestamps.TimestampDecoder()
+    for line in ["Sep 05 14:01:50 node1 px[1]: Mounted the volume 12 on /mnt/a",
+                 "Sep 05 14:01:51 node2 px[2]: Mounted the volume 13 on /mnt/b",
+                 "Sep 05 14:01:52 node1 px[1]: Mounted the volume 13 on /mnt/b",
+                 "Sep 05 14:01:53 node1 px[1]: Unmounted the volume 13 from /mnt/b"]:
+        miner.add_line(line, decoder)
+    assert [" ".join(t.tokens) for t in miner.templates] == ["<*> Mounted the volume <*> on <*>",
+                                                            "px[1]: Unmounted the volume 13 from /mnt/b"]
+    assert [t.count for t in miner.templates] == [3, 1]
+    assert [(t.template_id, node_name) for t, node_name in miner.take_new()] == [(0, "node1"), (0, "node2"),
+                                                                               (1, "node1")]
+    # Slots in the order they appeared, the example keeps the first line
+    assert miner.templates[0].slots == [0, 4, 6]
+    assert miner.templates[0].expand(["px[9]:", "14"]) == "px[9]: Mounted the volume 14 on /mnt/a".split()
+
+
+def test_store_rebuilds_unmatched_lines(mined):
+    case_dir, db_dir = mined
+    expected = unmatched_lines(case_dir)
+    assert len(expected) > 0
+    assert stored_lines(db_dir) == expected
+    store = templates.TemplateStore(db_dir)
+    assert sum(t.count for t in store.templates) == len(expected)
+    for t in store.templates[:20]:
+        assert len(list(store.lines(t.template_id))) == t.count
+
+
+def test_parallel_store_rebuilds_the_same_lines(tmp_path, mined):
+    _, db_dir = mined
+    case_dir = copy_case(CASE, str(tmp_path / CASE))
+    assert stored_lines(parse_case(case_dir, jobs=2, mine_templates=True)) == stored_lines(db_dir)
+
+
+def test_resumed_store_rebuilds_the_same_lines(tmp_path, mined):
+    _, db_dir = mined
+    case_dir = copy_case(CASE, str(tmp_path / CASE))
+    docker = os.path.join(case_dir, "docker.out")
+    with open(docker, "rb") as f:
+        data = f.read()
+    stat = os.stat(docker)
+    half = data.rfind(b"\n", 0, len(data) // 2) + 1
+    with open(docker, "wb") as f:
+        f.write(data[:half])
+    parse_case(case_dir, mine_templates=True)
+    with open(docker, "ab") as f:
+        f.write(data[half:])
+    os.utime(docker, (stat.st_atime, stat.st_mtime))
+    assert stored_lines(parse_case(case_dir, mine_templates=True)) == stored_lines(db_dir)
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""Tests of the timeline built from the events of hawk-eye events."""
+
+import os
+
+import pandas as pd
+import pytest
+
+import timeline_generator
+from conftest import ROOT_DIR
+
+EVENTS = os.path.join(ROOT_DIR, "display", "events.out")
+
+
+def event(node: str, start: int, name: str = "PX Down", severity: str = "error") -> dict:
+    return {"eventName": name, "start": start, "finish": start + 5, "eventSeverity": severity,
+            "objects": [{"objectFullName": node, "objectType": "node", "objectName": node},
+                        {"objectFullName": "Portworx", "objectType": "Portworx", "objectName": "Portworx"}]}
+
+
+def test_build_frame():
+    events = timeline_generator.load_events(EVENTS)
+    df = timeline_generator.build_frame(events)
+    assert len(df) == len(events)
+    assert list(df["eventName"]) == [e["eventName"] for e in events]
+    assert list(df["start"]) == list(pd.to_datetime([e["start"] for e in events], unit="s"))
+    assert (df["count"] == 1).all()
+    assert df.loc[0, "Event Source"] == " Portworx:Portworx"
+
+
+def test_downsample_keeps_small_nodes():
+    df = timeline_generator.build_frame([event("a", t) for t in range(0, 100, 10)])
+    pd.testing.assert_frame_equal(timeline_generator.downsample(df, max_events=10), df)
+
+
+def test_downsample_merges_in_buckets():
+    events = [event("big", t) for t in range(0, 10000, 2)] + [event("small", t) for t in range(5)]
+    df = timeline_generator.build_frame(events)
+    merged = timeline_generator.downsample(df, max_events=100)
+    big = merged[merged["node"] == "big"]
+    assert len(big) <= 100
+    assert big["count"].sum() == 5000
+    assert big["start"].min() == df["start"].min()
+    assert big["finish"].max() == df[df["node"] == "big"]["finish"].max()
+    assert len(merged[merged["node"] == "small"]) == 5
+
+
+def test_render(tmp_path):
+    pytest.importorskip("plotly")
+    df = timeline_generator.build_frame(timeline_generator.load_events(EVENTS))
+    path = str(tmp_path / "timeline.html")
+    timeline_generator.render(df, path)
+    assert os.path.getsize(path) > 0
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""Tests of the journal timestamp decoder."""
+
+import calendar
+import datetime
+
+import timestamps
+
+HEADER = "-- Logs begin at Thu 2019-10-24 16:54:34 UTC, end at Mon 2022-09-05 18:38:37 UTC. --\n"
+
+
+def epoch(*args) -> int:
+    return calendar.timegm(datetime.datetime(*args).timetuple())
+
+
+def test_matches_strptime():
+    decoder = timestamps.TimestampDecoder()
+    decoder.set_header(HEADER)
+    for stamp in ["Sep 05 14:08:40", "Jan 01 00:00:00", "Feb 28 23:59:59", "Sep 05 18:38:37"]:
+        expected = calendar.timegm(datetime.datetime.strptime("2022 " + stamp, "%Y %b %d %H:%M:%S").timetuple())
+        assert decoder.decode(stamp) == expected
+        # Memoized per minute
+        assert decoder.decode(stamp) == expected
+
+
+def test_year_from_the_journal_end():
+    decoder = timestamps.TimestampDecoder()
+    decoder.set_header("-- Journal begins at Mon 2021-12-20 10:00:00 UTC, ends at Tue 2022-01-04 09:00:00 UTC. --")
+    assert decoder.decode("Dec 31 23:59:59") == epoch(2021, 12, 31, 23, 59, 59)
+    assert decoder.decode("Jan 04 08:59:00") == epoch(2022, 1, 4, 8, 59)
+    # Never before the journal begins
+    decoder.set_header("-- Logs begin at Sat 2022-01-01 00:00:00 UTC, end at Sun 2022-01-02 00:00:00 UTC. --")
+    assert decoder.decode("Mar 01 00:00:00") == epoch(2022, 3, 1)
+
+
+def test_year_from_the_mtime():
+    decoder = timestamps.TimestampDecoder()
+    decoder.set_header("Sep 12 09:56:50 node portworx[9180]: Started px\n", epoch(2023, 3, 1))
+    assert decoder.decode("Sep 12 09:56:50") == epoch(2022, 9, 12, 9, 56, 50)
+    assert decoder.decode("Feb 28 10:00:00") == epoch(2023, 2, 28, 10)
+
+
+def test_subsecond():
+    decoder = timestamps.TimestampDecoder(subsecond=True)
+    decoder.set_header(HEADER)
+    seconds = epoch(2022, 9, 5, 14, 8, 40)
+    assert decoder.decode("Sep 05 14:08:40", 'time="2022-09-05T14:08:40.25Z" level=info') == seconds + 0.25
+    assert decoder.decode("Sep 05 14:08:40", "I0905 14:08:40.126274   6839 operation_generator.go") == \
+        seconds + 0.126274
+    # Another second than the journal prefix: ignored
+    assert decoder.decode("Sep 05 14:08:40", 'time="2022-09-05T14:08:41.5Z"') == seconds
+    decoder = timestamps.TimestampDecoder()
+    decoder.set_header(HEADER)
+    assert decoder.decode("Sep 05 14:08:40", 'time="2022-09-05T14:08:40.25Z"') == seconds